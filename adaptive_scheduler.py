@@ -0,0 +1,121 @@
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+
+class ByteBucket:
+    # Token bucket theo byte, dùng cho giới hạn --max-bandwidth
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, amount):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount or self.tokens >= self.capacity:
+                    self.tokens -= amount
+                    return
+                wait = (min(amount, self.capacity) - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class Transfer:
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+        self.bytes = 0
+        self.success = False
+        self.error = False
+        self.start = time.monotonic()
+
+    def add_bytes(self, amount):
+        self.bytes += amount
+        self.scheduler.add_bytes(amount)
+
+    def mark_error(self):
+        # Lỗi tạm thời (mạng, timeout, 408/429/5xx): dấu hiệu CDN đang chặn hoặc quá tải
+        self.error = True
+
+
+class AdaptiveScheduler:
+    # Điều chỉnh số lượt tải đồng thời theo kiểu AIMD: tăng 1 khi thông lượng còn tăng,
+    # giảm một nửa khi tỉ lệ lỗi cao (CDN đang chặn hoặc quá tải). Chỉ lỗi tạm thời (Transfer.mark_error)
+    # mới tính vào tỉ lệ lỗi; 404 hay MP3 không hợp lệ không liên quan tới mức tải của CDN.
+    def __init__(self, min_workers=1, max_workers=16, initial_workers=4, interval=5.0,
+                 max_bandwidth=None, error_threshold=0.2):
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.limit = max(min_workers, min(initial_workers, max_workers))
+        self.interval = interval
+        self.error_threshold = error_threshold
+        self.bandwidth = ByteBucket(max_bandwidth) if max_bandwidth else None
+        self.max_bandwidth = max_bandwidth
+        self.active = 0
+        self.cond = threading.Condition()
+        self.last_throughput = 0.0
+        self._reset_window()
+
+    def _reset_window(self):
+        self.window_start = time.monotonic()
+        self.window_bytes = 0
+        self.window_done = 0
+        self.window_errors = 0
+        self.window_peak = self.active
+
+    @contextmanager
+    def slot(self):
+        with self.cond:
+            while self.active >= self.limit:
+                self.cond.wait()
+            self.active += 1
+            self.window_peak = max(self.window_peak, self.active)
+        transfer = Transfer(self)
+        try:
+            yield transfer
+        finally:
+            with self.cond:
+                self.active -= 1
+                if transfer.success:
+                    self.window_done += 1
+                elif transfer.error:
+                    self.window_errors += 1
+                self._maybe_adjust()
+                self.cond.notify_all()
+
+    def add_bytes(self, amount):
+        if self.bandwidth is not None:
+            self.bandwidth.consume(amount)
+        with self.cond:
+            self.window_bytes += amount
+
+    def _maybe_adjust(self):
+        elapsed = time.monotonic() - self.window_start
+        if elapsed < self.interval:
+            return
+        throughput = self.window_bytes / elapsed
+        finished = self.window_done + self.window_errors
+        error_rate = self.window_errors / finished if finished else 0.0
+        previous = self.limit
+        if error_rate > self.error_threshold:
+            self.limit = max(self.min_workers, self.limit // 2)
+        elif self.max_bandwidth and throughput >= 0.95 * self.max_bandwidth:
+            pass
+        elif throughput > self.last_throughput * 1.05 and self.window_peak >= self.limit:
+            self.limit = min(self.max_workers, self.limit + 1)
+        elif throughput < self.last_throughput * 0.8:
+            self.limit = max(self.min_workers, self.limit - 1)
+        if self.limit != previous:
+            logging.info(f"Điều chỉnh số luồng tải: {previous} -> {self.limit} "
+                         f"({throughput / 1024 / 1024:.2f} MB/s, lỗi {error_rate:.0%})")
+        self.last_throughput = throughput
+        self._reset_window()
+
+    def get_stats(self):
+        with self.cond:
+            return self.limit, self.active, self.last_throughput
@@ -0,0 +1,183 @@
+import os
+import time
+import random
+import asyncio
+import logging
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+from metrics import REGISTRY
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class AdaptiveBackoff:
+    # Mỗi lần bị 429/5xx thì nhân đôi thời gian chờ chung cho cả host,
+    # mỗi lần thành công thì giảm một nửa cho tới khi về 0.
+    def __init__(self, base=1.0, maximum=120.0):
+        self.base = base
+        self.maximum = maximum
+        self.delay = 0.0
+        self.until = 0.0
+
+    def on_throttle(self, retry_after=None):
+        self.delay = min(self.maximum, max(self.base, self.delay * 2, retry_after or 0))
+        self.until = max(self.until, time.monotonic() + self.delay * random.uniform(0.8, 1.2))
+
+    def on_success(self):
+        self.delay = self.delay / 2 if self.delay > self.base else 0.0
+
+    async def wait(self):
+        remaining = self.until - time.monotonic()
+        if remaining > 0:
+            await asyncio.sleep(remaining)
+
+
+class HostLimiter:
+    def __init__(self, rps, max_in_flight):
+        self.bucket = TokenBucket(rps)
+        self.semaphore = asyncio.Semaphore(max_in_flight)
+        self.backoff = AdaptiveBackoff()
+
+
+def parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class AsyncFetcher:
+    def __init__(self, session, rps, max_in_flight, retries=5):
+        self.session = session
+        self.rps = rps
+        self.max_in_flight = max_in_flight
+        self.retries = retries
+        self.hosts = {}
+
+    def limiter(self, url):
+        host = urlparse(url).netloc
+        if host not in self.hosts:
+            self.hosts[host] = HostLimiter(self.rps, self.max_in_flight)
+        return self.hosts[host]
+
+    async def get(self, url):
+        limiter = self.limiter(url)
+        for attempt in range(self.retries + 1):
+            await limiter.backoff.wait()
+            await limiter.bucket.acquire()
+            try:
+                async with limiter.semaphore:
+                    async with self.session.get(url) as response:
+                        REGISTRY.counter('http_responses_total', 'Responses by status code',
+                                         status=str(response.status)).inc()
+                        if response.status in RETRY_STATUSES:
+                            REGISTRY.counter('http_retries_total', 'Requests retried by the HTTP client').inc()
+                            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                            limiter.backoff.on_throttle(retry_after)
+                            logging.warning(f"HTTP {response.status} từ {url}, thử lại sau {limiter.backoff.delay:.1f}s")
+                            continue
+                        response.raise_for_status()
+                        content = await response.read()
+                REGISTRY.counter('bytes_fetched_total', 'Response body bytes received').inc(len(content))
+                limiter.backoff.on_success()
+                return content
+            except aiohttp.ClientResponseError:
+                raise
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == self.retries:
+                    raise
+                limiter.backoff.on_throttle()
+                logging.warning(f"Lỗi kết nối {url}: {str(e)}, thử lại lần {attempt + 1}")
+        raise aiohttp.ClientError(f"Hết số lần thử lại cho {url}")
+
+
+async def _process_url(fetcher, url_info, output_dir, tracker, parse, save):
+    url, year, number = url_info
+    if tracker.is_done(year, number):
+        return False, None
+    filename = os.path.join(output_dir, year, f"{number}.txt")
+    tracker.update_current_url(url)
+    try:
+        with REGISTRY.span('fetch'):
+            content = await fetcher.get(url)
+        with REGISTRY.span('parse'):
+            text = await asyncio.to_thread(parse, content)
+        if text:
+            with REGISTRY.span('save'):
+                await asyncio.to_thread(save, filename, text)
+            tracker.increment_downloads(year, number)
+            logging.info(f"Đã lưu thành công: {url}")
+            return True, filename
+        logging.warning(f"Không tìm thấy nội dung cho URL: {url}")
+    except aiohttp.ClientError as e:
+        logging.error(f"Lỗi khi truy cập URL {url}: {str(e)}")
+    except Exception as e:
+        logging.error(f"Lỗi không xác định khi xử lý URL {url}: {str(e)}")
+    REGISTRY.counter('items_failed_total', 'Transcripts that could not be fetched or parsed').inc()
+    if os.path.exists(filename):
+        os.remove(filename)
+    return False, filename
+
+
+async def _scrape(urls, output_dir, tracker, parse, save, rps, max_in_flight, retries):
+    queue = asyncio.Queue()
+    for url_info in urls:
+        queue.put_nowait(url_info)
+    # Chỉ đếm số item thành công, không giữ kết quả của từng URL
+    completed = 0
+
+    timeout = aiohttp.ClientTimeout(total=120)
+    connector = aiohttp.TCPConnector(limit=max_in_flight)
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        fetcher = AsyncFetcher(session, rps, max_in_flight, retries)
+
+        async def worker():
+            nonlocal completed
+            while True:
+                try:
+                    url_info = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                success, _ = await _process_url(fetcher, url_info, output_dir, tracker, parse, save)
+                completed += success
+
+        await asyncio.gather(*(worker() for _ in range(max_in_flight)))
+    return completed
+
+
+def scrape_async(urls, output_dir, tracker, parse, save, rps=2.0, max_in_flight=4, retries=5):
+    if aiohttp is None:
+        raise RuntimeError("Engine async cần thư viện aiohttp: pip install aiohttp")
+    return asyncio.run(_scrape(urls, output_dir, tracker, parse, save, rps, max_in_flight, retries))
@@ -0,0 +1,368 @@
+import os
+import sys
+import json
+import mmap
+import time
+import sqlite3
+import logging
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+INDEX_FILE = "gty_audio_index.sqlite"
+# Tỉ lệ byte rác (không thuộc frame nào) tối đa trước khi coi file là hỏng
+MAX_JUNK_RATIO = 0.01
+
+# Bảng bitrate (kbps) theo (MPEG version, layer); version 1 = MPEG-1, 2 = MPEG-2 và MPEG-2.5
+BITRATES = {
+    (1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (2, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+_HEADERS = {}
+
+
+def parse_header(header):
+    # header: 4 byte đầu frame. Trả về (độ dài frame, số sample, sample rate, bitrate kbps) hoặc None.
+    # Kết quả chỉ phụ thuộc 3 byte đầu nên được cache; một file thường chỉ có vài kiểu header.
+    key = header[:3]
+    info = _HEADERS.get(key)
+    if info is not None or key in _HEADERS:
+        return info
+    info = None
+    if len(key) == 3 and key[0] == 0xFF and key[1] & 0xE0 == 0xE0:
+        version_bits = (key[1] >> 3) & 3
+        layer = 4 - ((key[1] >> 1) & 3)
+        bitrate_index = key[2] >> 4
+        rate_index = (key[2] >> 2) & 3
+        if version_bits != 1 and layer != 4 and 0 < bitrate_index < 15 and rate_index != 3:
+            version = 1 if version_bits == 3 else 2
+            bitrate = BITRATES[(version, layer)][bitrate_index]
+            sample_rate = SAMPLE_RATES[version_bits][rate_index]
+            padding = (key[2] >> 1) & 1
+            if layer == 1:
+                samples = 384
+                length = (12 * bitrate * 1000 // sample_rate + padding) * 4
+            else:
+                samples = 576 if layer == 3 and version == 2 else 1152
+                length = samples // 8 * bitrate * 1000 // sample_rate + padding
+            info = (length, samples, sample_rate, bitrate)
+    _HEADERS[key] = info
+    return info
+
+
+def _id3v2_size(data):
+    if len(data) >= 10 and data[:3] == b'ID3':
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        return size + 10 + (10 if data[5] & 0x10 else 0)
+    return 0
+
+
+def _audio_end(data):
+    # Bỏ tag ID3v1 ("TAG", 128 byte) và APEv2 ("APETAGEX") ở cuối file
+    end = len(data)
+    if end >= 128 and data[end - 128:end - 125] == b'TAG':
+        end -= 128
+    if end >= 32 and data[end - 32:end - 24] == b'APETAGEX':
+        tag_size = int.from_bytes(data[end - 20:end - 16], 'little')
+        has_header = int.from_bytes(data[end - 12:end - 8], 'little') & 0x80000000
+        end -= tag_size + (32 if has_header else 0)
+    return max(end, 0)
+
+
+def _synced(data, pos, end):
+    # Một header hợp lệ chỉ được tin nếu frame kế tiếp cũng bắt đầu bằng header hợp lệ (hoặc hết file)
+    info = parse_header(data[pos:pos + 4])
+    if info is None:
+        return None
+    following = pos + info[0]
+    if following + 4 <= end and parse_header(data[following:following + 4]) is None:
+        return None
+    return info
+
+
+def _xing_frames(frame):
+    for tag in (b'Xing', b'Info'):
+        index = frame.find(tag, 4, 64)
+        if index != -1:
+            flags = int.from_bytes(frame[index + 4:index + 8], 'big')
+            if flags & 1:
+                return int.from_bytes(frame[index + 8:index + 12], 'big')
+    return None
+
+
+def scan_data(data):
+    # Đọc lần lượt header của từng frame (không giải mã audio) để đếm frame, tính thời lượng,
+    # bitrate trung bình và phát hiện file bị cắt cụt, trang HTML lỗi hoặc dữ liệu rác.
+    result = {'status': 'ok', 'reason': '', 'frames': 0, 'duration': 0.0, 'bitrate': 0, 'sample_rate': 0,
+              'junk_bytes': 0}
+    head = bytes(data[:512]).lstrip().lower()
+    if head.startswith((b'<!doctype', b'<html', b'<?xml', b'{')):
+        result.update(status='invalid', reason='html')
+        return result
+    end = _audio_end(data)
+    pos = _id3v2_size(data)
+    samples = 0
+    audio_bytes = 0
+    junk = 0
+    xing_frames = None
+    truncated = False
+    while pos + 4 <= end:
+        info = parse_header(data[pos:pos + 4])
+        if info is None or (result['frames'] == 0 and _synced(data, pos, end) is None):
+            # Mất đồng bộ: tìm byte 0xFF kế tiếp có header hợp lệ theo sau bởi frame hợp lệ
+            next_pos = data.find(b'\xff', pos + 1, end)
+            while next_pos != -1 and _synced(data, next_pos, end) is None:
+                next_pos = data.find(b'\xff', next_pos + 1, end)
+            if next_pos == -1:
+                junk += end - pos
+                pos = end
+                break
+            junk += next_pos - pos
+            pos = next_pos
+            continue
+        length, frame_samples, sample_rate, _ = info
+        if pos + length > end:
+            truncated = True
+            junk += end - pos
+            pos = end
+            break
+        if result['frames'] == 0:
+            result['sample_rate'] = sample_rate
+            xing_frames = _xing_frames(data[pos:pos + length])
+        result['frames'] += 1
+        samples += frame_samples
+        audio_bytes += length
+        pos += length
+    junk += max(0, end - pos)
+
+    result['junk_bytes'] = junk
+    if result['frames'] == 0:
+        result.update(status='invalid', reason='no_frames' if len(data) else 'empty')
+        return result
+    if result['sample_rate']:
+        result['duration'] = round(samples / result['sample_rate'], 3)
+    if result['duration']:
+        result['bitrate'] = int(round(audio_bytes * 8 / result['duration'] / 1000))
+    audio_frames = result['frames'] - (1 if xing_frames is not None else 0)
+    if truncated:
+        result.update(status='truncated', reason='last_frame')
+    elif xing_frames is not None and audio_frames < xing_frames:
+        result.update(status='truncated', reason=f'xing:{audio_frames}/{xing_frames}')
+    elif junk > max(4096, MAX_JUNK_RATIO * len(data)):
+        result.update(status='corrupt', reason='junk')
+    return result
+
+
+def scan_file(path):
+    try:
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return scan_data(b'')
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return scan_data(data)
+    except OSError as e:
+        return {'status': 'invalid', 'reason': f'io: {e}', 'frames': 0, 'duration': 0.0, 'bitrate': 0,
+                'sample_rate': 0, 'junk_bytes': 0}
+
+
+def _scan_job(job):
+    key, path = job
+    return key, path, scan_file(path)
+
+
+class AudioIndex:
+    # Kết quả kiểm tra từng file MP3 theo (year, item); cache theo size + mtime
+    # nên lần chạy sau chỉ quét lại file mới hoặc đã thay đổi.
+    COLUMNS = ('status', 'reason', 'frames', 'duration', 'bitrate', 'sample_rate', 'junk_bytes')
+
+    def __init__(self, db_file=INDEX_FILE):
+        self.db_file = db_file
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS audio (
+                year TEXT NOT NULL,
+                item TEXT NOT NULL,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                reason TEXT NOT NULL,
+                frames INTEGER NOT NULL,
+                duration REAL NOT NULL,
+                bitrate INTEGER NOT NULL,
+                sample_rate INTEGER NOT NULL,
+                junk_bytes INTEGER NOT NULL,
+                verified_at REAL NOT NULL,
+                PRIMARY KEY (year, item)
+            ) WITHOUT ROWID;
+        """)
+
+    def cached(self, year, item, size, mtime_ns):
+        with self.lock:
+            row = self.conn.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM audio WHERE year = ? AND item = ? AND size = ? AND mtime_ns = ?",
+                (year, item, size, mtime_ns)).fetchone()
+        return dict(zip(self.COLUMNS, row)) if row else None
+
+    def record(self, year, item, path, size, mtime_ns, result):
+        with self.lock:
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO audio (year, item, path, size, mtime_ns, {', '.join(self.COLUMNS)}, verified_at) "
+                f"VALUES (?, ?, ?, ?, ?, {', '.join('?' * len(self.COLUMNS))}, ?)",
+                (year, item, path, size, mtime_ns) + tuple(result[column] for column in self.COLUMNS) + (time.time(),))
+
+    def check(self, year, item, path):
+        # Kiểm tra một file ngay trong thread hiện tại (dùng khi tải xong từng file)
+        stat = os.stat(path)
+        result = self.cached(year, item, stat.st_size, stat.st_mtime_ns)
+        if result is None:
+            result = scan_file(path)
+            self.record(year, item, path, stat.st_size, stat.st_mtime_ns, result)
+            self.commit()
+        return result
+
+    def verify(self, files, workers=None):
+        # files: {(year, item): path}. File chưa có trong cache được quét song song bằng process pool.
+        # Trả về {(year, item): kết quả} cho toàn bộ files.
+        results = {}
+        jobs = []
+        stats = {}
+        for key, path in files.items():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            stats[key] = stat
+            result = self.cached(key[0], key[1], stat.st_size, stat.st_mtime_ns)
+            if result is None:
+                jobs.append((key, path))
+            else:
+                results[key] = result
+        if jobs:
+            logging.info(f"Quét {len(jobs)} file MP3 ({len(results)} file dùng kết quả đã lưu)")
+            workers = workers or os.cpu_count() or 1
+            chunksize = max(1, min(16, len(jobs) // (workers * 4)))
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                for count, (key, path, result) in enumerate(executor.map(_scan_job, jobs, chunksize=chunksize), 1):
+                    stat = stats[key]
+                    self.record(key[0], key[1], path, stat.st_size, stat.st_mtime_ns, result)
+                    results[key] = result
+                    if count % 500 == 0:
+                        self.commit()
+            self.commit()
+        return results
+
+    def bad(self):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT year, item, path, status, reason FROM audio WHERE status != 'ok' ORDER BY year, item").fetchall()
+
+    def summary(self):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT status, COUNT(*), SUM(duration), SUM(size) FROM audio GROUP BY status ORDER BY status").fetchall()
+
+    def commit(self):
+        with self.lock:
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
+
+
+def audio_files_in(audio_dir):
+    from manifest import DirectoryManifest
+    manifest = DirectoryManifest(audio_dir, '.mp3')
+    manifest.refresh()
+    files = manifest.items()
+    manifest.close()
+    return files
+
+
+def requeue(bad, progress_file=None, redownload_file=None, delete=True):
+    # Đưa file hỏng trở lại hàng đợi tải: xoá khỏi progress (download_audio.py sẽ tải lại)
+    # và/hoặc ghi ra catalog riêng để chạy: download_audio.py --catalog <redownload_file>
+    keys = [(year, item) for year, item, _, _, _ in bad]
+    removed = 0
+    if progress_file and (os.path.exists(progress_file) or os.path.exists(progress_file + '.journal')):
+        from progress_store import ProgressJournal
+        journal = ProgressJournal(progress_file)
+        journal.load()
+        removed = journal.discard(keys)
+        journal.close()
+    if redownload_file:
+        catalog = {}
+        for year, item in keys:
+            catalog.setdefault(year, {'total_items': 0, 'items': []})['items'].append(item)
+        for entry in catalog.values():
+            entry['total_items'] = len(entry['items'])
+        with open(redownload_file, 'w', encoding='utf-8') as f:
+            json.dump({year: catalog[year] for year in sorted(catalog, key=int)}, f, indent=2, ensure_ascii=False)
+    if delete:
+        for _, _, path, _, _ in bad:
+            if os.path.exists(path):
+                os.remove(path)
+    return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify downloaded MP3s by scanning frame headers")
+    parser.add_argument("--index", default=INDEX_FILE, help="Verification index database")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    scan = subparsers.add_parser("scan", help="Verify every MP3 under a directory (only new or changed files are rescanned)")
+    scan.add_argument("audio_dir", nargs="?", default="gty_audio_sermons")
+    scan.add_argument("--workers", type=int, help="Scanner processes (default: CPU count)")
+    scan.add_argument("--requeue", action="store_true",
+                      help="Delete bad files and remove them from the progress file so they are downloaded again")
+    scan.add_argument("--progress", default="audio_progress.json", help="Progress file used with --requeue")
+    scan.add_argument("--redownload", default="audio_redownload.json",
+                      help="Catalog of bad items written with --requeue (usable with download_audio.py --catalog)")
+
+    subparsers.add_parser("report", help="Summary and list of bad files")
+
+    file_parser = subparsers.add_parser("file", help="Scan one file and print the result")
+    file_parser.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "file":
+        print(json.dumps(scan_file(args.path), indent=2))
+        return 0
+
+    logging.basicConfig(filename="gty_audio_verifier.log", level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    index = AudioIndex(args.index)
+    try:
+        if args.command == "scan":
+            start = time.time()
+            files = audio_files_in(args.audio_dir)
+            results = index.verify(files, args.workers)
+            bad_keys = {key for key, result in results.items() if result['status'] != 'ok'}
+            print(f"Đã kiểm tra {len(results)} file trong {time.time() - start:.1f}s, {len(bad_keys)} file lỗi")
+            bad = [row for row in index.bad() if (row[0], row[1]) in bad_keys]
+            for year, item, path, status, reason in bad:
+                print(f"  {year}/{item}: {status} ({reason})")
+            if args.requeue and bad:
+                removed = requeue(bad, args.progress, args.redownload)
+                print(f"Đã xoá {len(bad)} file lỗi, bỏ {removed} mục khỏi {args.progress}, danh sách tải lại: {args.redownload}")
+        else:
+            for status, count, duration, size in index.summary():
+                print(f"{status}: {count} file, {(duration or 0) / 3600:.1f} giờ, {(size or 0) / 1024 / 1024:.1f} MB")
+            for year, item, path, status, reason in index.bad():
+                print(f"  {year}/{item}: {status} ({reason}) {path}")
+    finally:
+        index.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
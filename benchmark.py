@@ -0,0 +1,278 @@
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import subprocess
+
+from bounded_scheduler import BoundedScheduler
+from mock_gty_server import MockGTYServer, add_server_arguments, config_from_args
+
+SCENARIOS = ["scrape", "download", "pair"]
+FIRST_YEAR = 1969
+ITEMS_PER_YEAR = 60
+
+
+def synthetic_catalog(count):
+    # Cùng hình dạng với combined_gty_sermons.json: khoảng 60 bài mỗi năm, mã bài kiểu "1316A"
+    return [(str(FIRST_YEAR + i // ITEMS_PER_YEAR), f"{1000 + i}{'AB'[i % 2]}") for i in range(count)]
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    try:
+        result = func(*args)
+    except Exception as e:
+        logging.error(f"Lỗi benchmark: {str(e)}")
+        result = False
+    return time.perf_counter() - start, result
+
+
+def _bytes_written():
+    try:
+        import psutil
+        counters = psutil.Process().io_counters()
+        return getattr(counters, 'write_chars', counters.write_bytes)
+    except (ImportError, AttributeError, OSError):
+        return None
+
+
+def _directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for file in files:
+            total += os.path.getsize(os.path.join(root, file))
+    return total
+
+
+def _schedule(func, urls, workers):
+    # Cùng đường gửi việc với main() của main.py / download_audio.py: BoundedScheduler theo cửa sổ
+    results = []
+    with BoundedScheduler(workers) as scheduler:
+        for _, future in scheduler.map(func, urls):
+            results.append(future.result())
+    return results
+
+
+def run_scrape(base_url, items, workers):
+    import main as scraper
+    from http_session import create_session
+    from http_cache import HttpMetadataCache
+    from manifest import DirectoryManifest
+
+    output_dir = "gty_sermons"
+    urls = [(f"{base_url}/library/sermons-library/{item}", year, item) for year, item in items]
+    tracker = scraper.ProgressTracker("progress.json", len(urls))
+    cache = HttpMetadataCache("http_cache.json")
+    manifest = DirectoryManifest(output_dir, '.txt')
+    session = create_session(pool_size=workers)
+    try:
+        # delay=0: đo bản thân scraper, không đo khoảng nghỉ lịch sự giữa các request
+        results = _schedule(lambda url_info: _timed(
+            scraper.process_url, url_info, output_dir, tracker, session, cache, False, manifest, None, (), 0),
+            urls, workers)
+    finally:
+        session.close()
+        cache.close()
+        manifest.close()
+        tracker.close()
+    return [elapsed for elapsed, _ in results], sum(1 for _, result in results if result and result[0]), output_dir
+
+
+def run_download(base_url, items, workers):
+    import download_audio
+    from http_session import create_session
+    from adaptive_scheduler import AdaptiveScheduler
+    from manifest import DirectoryManifest
+
+    output_dir = "gty_audio_sermons"
+    urls = [(f"{base_url}/sermons/High/{item}.mp3", year, item) for year, item in items]
+    tracker = download_audio.ProgressTracker("audio_progress.json", len(urls))
+    scheduler = AdaptiveScheduler(min_workers=1, max_workers=workers)
+    session = create_session(pool_size=workers)
+    manifest = DirectoryManifest(output_dir, '.mp3')
+    try:
+        results = _schedule(lambda url_info: _timed(
+            download_audio.process_url, url_info, output_dir, tracker, session, 1, scheduler, manifest), urls, workers)
+    finally:
+        session.close()
+        manifest.close()
+        tracker.close()
+    return [elapsed for elapsed, _ in results], sum(1 for _, result in results if result and result[0]), output_dir
+
+
+def prepare_pair(items, audio_size, page_size):
+    from mock_gty_server import audio_payload, sermon_page
+
+    for year, item in items:
+        for directory, name, data in (("gty_sermons_audio", f"{item}.mp3", audio_payload(item, audio_size)),
+                                      ("gty_sermons_text", f"{item}.txt", sermon_page(item, page_size))):
+            os.makedirs(os.path.join(directory, year), exist_ok=True)
+            with open(os.path.join(directory, year, name), 'wb') as f:
+                f.write(data)
+
+
+def run_pair(workers):
+    import pair_audio_text
+
+    audio_files, text_files = pair_audio_text.find_matching_files("gty_sermons_audio", "gty_sermons_text")
+
+    latencies = []
+    pair_single_file = pair_audio_text.pair_single_file
+
+    def timed_pair(args):
+        elapsed, result = _timed(pair_single_file, args)
+        latencies.append(elapsed)
+        return result
+
+    pair_audio_text.pair_single_file = timed_pair
+    try:
+        paired = pair_audio_text.pair_audio_text(audio_files, text_files, "gty_sermons_paired", "pairing_progress.json",
+                                                 os.environ.get('BENCH_LINK_MODE', 'copy'), workers=workers)
+    finally:
+        pair_audio_text.pair_single_file = pair_single_file
+    return latencies, paired, "gty_sermons_paired"
+
+
+def run_child(args):
+    os.chdir(args.workdir)
+    logging.basicConfig(filename="benchmark.log", level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    items = synthetic_catalog(args.items)
+    if args.child == "pair":
+        # Dữ liệu đầu vào được tạo trước khi đo, chỉ tính phần ghép
+        prepare_pair(items, int(args.audio_kb * 1024), int(args.page_kb * 1024))
+    written_before = _bytes_written()
+    start = time.perf_counter()
+    if args.child == "scrape":
+        latencies, ok, output_dir = run_scrape(args.base_url, items, args.workers)
+    elif args.child == "download":
+        latencies, ok, output_dir = run_download(args.base_url, items, args.workers)
+    else:
+        latencies, ok, output_dir = run_pair(args.workers)
+    elapsed = time.perf_counter() - start
+    written_after = _bytes_written()
+    written = written_after - written_before if written_before is not None else _directory_size(output_dir)
+    with open(args.result, 'w') as f:
+        json.dump({'items': len(items), 'ok': ok, 'seconds': elapsed, 'latencies': latencies,
+                   'bytes_written': written}, f)
+
+
+def run_scenario(scenario, items, server, args):
+    workdir = tempfile.mkdtemp(prefix=f"gty_bench_{scenario}_")
+    result_file = os.path.join(workdir, "result.json")
+    command = [sys.executable, os.path.abspath(__file__), "--child", scenario, "--items", str(items),
+               "--workers", str(args.workers), "--base-url", server.base_url, "--workdir", workdir,
+               "--result", result_file, "--audio-kb", str(args.audio_kb), "--page-kb", str(args.page_kb)]
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [os.path.dirname(os.path.abspath(__file__)),
+                                                                     os.environ.get('PYTHONPATH')])))
+    if args.link_mode:
+        env['BENCH_LINK_MODE'] = args.link_mode
+    process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    # wait4 trả về rusage của riêng tiến trình con này, nên peak RSS không bị lẫn giữa các kịch bản
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    try:
+        if process.returncode != 0:
+            raise RuntimeError(f"Kịch bản {scenario} x{items} thất bại (mã thoát {process.returncode})")
+        with open(result_file) as f:
+            result = json.load(f)
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+    latencies = result.pop('latencies')
+    result.update({
+        'scenario': scenario,
+        'throughput': result['items'] / result['seconds'] if result['seconds'] else 0.0,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'peak_rss_mb': usage.ru_maxrss / 1024 if sys.platform != 'darwin' else usage.ru_maxrss / 1024 / 1024,
+        'bytes_per_item': result['bytes_written'] / result['items'] if result['items'] else 0,
+    })
+    return result
+
+
+def compare(results, baseline_file, tolerance):
+    # Báo hồi quy khi throughput giảm hoặc p99/RSS tăng quá `tolerance` so với baseline
+    with open(baseline_file) as f:
+        baseline = {(entry['scenario'], entry['items']): entry for entry in json.load(f)}
+    regressions = []
+    for result in results:
+        base = baseline.get((result['scenario'], result['items']))
+        if base is None:
+            continue
+        checks = [('throughput', result['throughput'] < base['throughput'] * (1 - tolerance)),
+                  ('p99_ms', result['p99_ms'] > base['p99_ms'] * (1 + tolerance)),
+                  ('peak_rss_mb', result['peak_rss_mb'] > base['peak_rss_mb'] * (1 + tolerance))]
+        for metric, regressed in checks:
+            if regressed:
+                regressions.append(f"{result['scenario']} x{result['items']}: {metric} "
+                                   f"{base[metric]:.2f} -> {result[metric]:.2f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the scraper, audio downloader and pairer against a local mock GTY server")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--scales", nargs="+", type=int, default=[1, 10, 100], help="Catalog size multipliers")
+    parser.add_argument("--base-items", type=int, default=10, help="Number of items at scale 1x")
+    parser.add_argument("--workers", type=int, default=4, help="Worker threads per scenario")
+    parser.add_argument("--link-mode", help="Link mode for the pair scenario (default: copy)")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare against a previous --output file and exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative change before flagging")
+    parser.add_argument("--keep", action="store_true", help="Keep scenario working directories")
+    add_server_arguments(parser)
+    parser.add_argument("--child", choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument("--items", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--base-url", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        return 0
+
+    server = MockGTYServer(config=config_from_args(args))
+    server.start()
+    results = []
+    try:
+        print(f"{'scenario':<10}{'items':>7}{'ok':>7}{'items/s':>10}{'p50 ms':>10}{'p99 ms':>10}"
+              f"{'RSS MB':>9}{'KB/item':>10}")
+        for scenario in args.scenarios:
+            for scale in args.scales:
+                result = run_scenario(scenario, args.base_items * scale, server, args)
+                results.append(result)
+                print(f"{scenario:<10}{result['items']:>7}{result['ok']:>7}{result['throughput']:>10.2f}"
+                      f"{result['p50_ms']:>10.1f}{result['p99_ms']:>10.1f}{result['peak_rss_mb']:>9.1f}"
+                      f"{result['bytes_per_item'] / 1024:>10.1f}", flush=True)
+    finally:
+        server.shutdown()
+        server.server_close()
+    print(f"Mock server: {server.config.stats}", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.tolerance)
+        for regression in regressions:
+            print(f"HỒI QUY: {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
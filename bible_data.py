@@ -0,0 +1,99 @@
+from collections import OrderedDict
+
+# Mã sách theo chuẩn USFM -> (tên tiếng Anh, số chương, các cách viết khác)
+BOOKS = OrderedDict([
+    ('GEN', ('Genesis', 50, ['Gen', 'Gn'])),
+    ('EXO', ('Exodus', 40, ['Exod', 'Exo', 'Ex'])),
+    ('LEV', ('Leviticus', 27, ['Lev', 'Lv'])),
+    ('NUM', ('Numbers', 36, ['Num', 'Nm'])),
+    ('DEU', ('Deuteronomy', 34, ['Deut', 'Dt'])),
+    ('JOS', ('Joshua', 24, ['Josh', 'Jos'])),
+    ('JDG', ('Judges', 21, ['Judg', 'Jdg'])),
+    ('RUT', ('Ruth', 4, ['Rth'])),
+    ('1SA', ('1 Samuel', 31, ['1 Sam', '1 Sa'])),
+    ('2SA', ('2 Samuel', 24, ['2 Sam', '2 Sa'])),
+    ('1KI', ('1 Kings', 22, ['1 Kgs', '1 Ki'])),
+    ('2KI', ('2 Kings', 25, ['2 Kgs', '2 Ki'])),
+    ('1CH', ('1 Chronicles', 29, ['1 Chron', '1 Chr'])),
+    ('2CH', ('2 Chronicles', 36, ['2 Chron', '2 Chr'])),
+    ('EZR', ('Ezra', 10, ['Ezr'])),
+    ('NEH', ('Nehemiah', 13, ['Neh'])),
+    ('EST', ('Esther', 10, ['Esth', 'Est'])),
+    ('JOB', ('Job', 42, [])),
+    ('PSA', ('Psalms', 150, ['Psalm', 'Ps', 'Psa'])),
+    ('PRO', ('Proverbs', 31, ['Prov', 'Pr'])),
+    ('ECC', ('Ecclesiastes', 12, ['Eccl', 'Ecc'])),
+    ('SNG', ('Song of Solomon', 8, ['Song of Songs', 'Song'])),
+    ('ISA', ('Isaiah', 66, ['Isa', 'Is'])),
+    ('JER', ('Jeremiah', 52, ['Jer'])),
+    ('LAM', ('Lamentations', 5, ['Lam'])),
+    ('EZK', ('Ezekiel', 48, ['Ezek', 'Eze'])),
+    ('DAN', ('Daniel', 12, ['Dan', 'Dn'])),
+    ('HOS', ('Hosea', 14, ['Hos'])),
+    ('JOL', ('Joel', 3, [])),
+    ('AMO', ('Amos', 9, ['Am'])),
+    ('OBA', ('Obadiah', 1, ['Obad', 'Ob'])),
+    ('JON', ('Jonah', 4, ['Jon'])),
+    ('MIC', ('Micah', 7, ['Mic'])),
+    ('NAM', ('Nahum', 3, ['Nah'])),
+    ('HAB', ('Habakkuk', 3, ['Hab'])),
+    ('ZEP', ('Zephaniah', 3, ['Zeph', 'Zep'])),
+    ('HAG', ('Haggai', 2, ['Hag'])),
+    ('ZEC', ('Zechariah', 14, ['Zech', 'Zec'])),
+    ('MAL', ('Malachi', 4, ['Mal'])),
+    ('MAT', ('Matthew', 28, ['Matt', 'Mt'])),
+    ('MRK', ('Mark', 16, ['Mk', 'Mrk'])),
+    ('LUK', ('Luke', 24, ['Lk', 'Luk'])),
+    ('JHN', ('John', 21, ['Jn', 'Jhn'])),
+    ('ACT', ('Acts', 28, ['Act'])),
+    ('ROM', ('Romans', 16, ['Rom', 'Rm'])),
+    ('1CO', ('1 Corinthians', 16, ['1 Cor', '1 Co'])),
+    ('2CO', ('2 Corinthians', 13, ['2 Cor', '2 Co'])),
+    ('GAL', ('Galatians', 6, ['Gal'])),
+    ('EPH', ('Ephesians', 6, ['Eph'])),
+    ('PHP', ('Philippians', 4, ['Phil', 'Php'])),
+    ('COL', ('Colossians', 4, ['Col'])),
+    ('1TH', ('1 Thessalonians', 5, ['1 Thess', '1 Th'])),
+    ('2TH', ('2 Thessalonians', 3, ['2 Thess', '2 Th'])),
+    ('1TI', ('1 Timothy', 6, ['1 Tim', '1 Ti'])),
+    ('2TI', ('2 Timothy', 4, ['2 Tim', '2 Ti'])),
+    ('TIT', ('Titus', 3, ['Tit'])),
+    ('PHM', ('Philemon', 1, ['Philem', 'Phm'])),
+    ('HEB', ('Hebrews', 13, ['Heb'])),
+    ('JAS', ('James', 5, ['Jas'])),
+    ('1PE', ('1 Peter', 5, ['1 Pet', '1 Pe'])),
+    ('2PE', ('2 Peter', 3, ['2 Pet', '2 Pe'])),
+    ('1JN', ('1 John', 5, ['1 Jn'])),
+    ('2JN', ('2 John', 1, ['2 Jn'])),
+    ('3JN', ('3 John', 1, ['3 Jn'])),
+    ('JUD', ('Jude', 1, [])),
+    ('REV', ('Revelation', 22, ['Rev', 'Revelations'])),
+])
+
+BOOK_NUMBERS = {code: number for number, code in enumerate(BOOKS, 1)}
+
+ORDINALS = {
+    'first': 1, 'second': 2, 'third': 3, 'fourth': 4, 'fifth': 5, 'sixth': 6, 'seventh': 7,
+    'eighth': 8, 'ninth': 9, 'tenth': 10, 'eleventh': 11, 'twelfth': 12, 'thirteenth': 13,
+    'fourteenth': 14, 'fifteenth': 15, 'sixteenth': 16, 'seventeenth': 17, 'eighteenth': 18,
+    'nineteenth': 19, 'twentieth': 20,
+}
+
+# Tiền tố số của các sách như "1 Corinthians" có thể được đọc thành chữ trong bài giảng
+NUMBER_PREFIXES = {
+    '1': ['1', '1st', 'I', 'First'],
+    '2': ['2', '2nd', 'II', 'Second'],
+    '3': ['3', '3rd', 'III', 'Third'],
+}
+
+
+def book_name_variants():
+    variants = {}
+    for code, (name, _, aliases) in BOOKS.items():
+        for spelling in [name] + aliases:
+            if spelling[0] in NUMBER_PREFIXES and spelling[1] == ' ':
+                for prefix in NUMBER_PREFIXES[spelling[0]]:
+                    variants[f"{prefix} {spelling[2:]}"] = code
+            else:
+                variants[spelling] = code
+    return variants
@@ -0,0 +1,106 @@
+import os
+import heapq
+import signal
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+ORDERS = ("catalog", "newest", "oldest")
+_DONE = object()
+
+
+def year_priority(order, year_of=lambda url_info: url_info[1]):
+    # Khoá sắp xếp cho BoundedScheduler: "newest" = năm mới nhất trước, "catalog" = giữ nguyên thứ tự
+    if order == "newest":
+        return lambda item: -int(year_of(item))
+    if order == "oldest":
+        return lambda item: int(year_of(item))
+    return None
+
+
+class BoundedScheduler:
+    # Gửi việc vào thread pool theo cửa sổ cố định (mặc định 2 x số luồng) thay vì submit cả catalog một lúc:
+    # số future và kết quả giữ trong bộ nhớ không tăng theo số URL, kết quả được xử lý ngay khi xong.
+    # Việc được requeue() chạy sau mọi việc còn lại. Ctrl-C lần đầu: ngừng gửi việc mới, chờ các việc
+    # đang chạy xong rồi trả về để caller lưu tiến độ; Ctrl-C lần hai: gọi on_abort (ghi tiến độ xuống đĩa)
+    # rồi os._exit. Không thể chỉ raise KeyboardInterrupt: lúc thoát interpreter vẫn join các luồng
+    # non-daemon của ThreadPoolExecutor, tức là vẫn chờ các việc đang chạy.
+    def __init__(self, workers, window=None, priority=None, name="worker", on_abort=None):
+        self.workers = max(1, workers)
+        self.window = max(self.workers, window or self.workers * 2)
+        self.priority = priority
+        self.on_abort = on_abort
+        self.retries = deque()
+        self.stopping = False
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(wait=exc_type is None)
+
+    def requeue(self, item):
+        self.retries.append(item)
+
+    def stop(self):
+        if not self.stopping:
+            self.stopping = True
+            logging.warning("Nhận tín hiệu dừng: không gửi việc mới, chờ các việc đang chạy hoàn tất")
+
+    def abort(self):
+        print("\nThoát ngay: bỏ các việc đang chạy, chúng sẽ được tải lại ở lần chạy sau", flush=True)
+        try:
+            if self.on_abort is not None:
+                self.on_abort()
+        except Exception as e:
+            logging.error(f"Lỗi khi lưu tiến độ trước khi thoát: {str(e)}")
+        finally:
+            logging.shutdown()
+            os._exit(130)
+
+    def _handle_sigint(self, signum, frame):
+        if self.stopping:
+            self.abort()
+        self.stop()
+        print("\nĐang dừng: chờ các việc đang chạy xong rồi lưu tiến độ (Ctrl-C lần nữa để thoát ngay)")
+
+    def _ordered(self, items):
+        if self.priority is None:
+            yield from items
+            return
+        heap = [(self.priority(item), position, item) for position, item in enumerate(items)]
+        heapq.heapify(heap)
+        while heap:
+            yield heapq.heappop(heap)[2]
+
+    def map(self, func, items):
+        # Generator trả về (item, future) theo thứ tự hoàn thành
+        source = self._ordered(items)
+        in_flight = {}
+        main_thread = threading.current_thread() is threading.main_thread()
+        if main_thread:
+            previous_handler = signal.signal(signal.SIGINT, self._handle_sigint)
+        try:
+            while True:
+                while not self.stopping and len(in_flight) < self.window:
+                    item = next(source, _DONE)
+                    if item is _DONE:
+                        if not self.retries:
+                            break
+                        item = self.retries.popleft()
+                    in_flight[self.executor.submit(func, item)] = item
+                if not in_flight:
+                    break
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield in_flight.pop(future), future
+        finally:
+            for future in in_flight:
+                future.cancel()
+            if main_thread:
+                signal.signal(signal.SIGINT, previous_handler)
+
+    def close(self, wait=True):
+        self.executor.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,212 @@
+import os
+import sys
+import json
+import sqlite3
+import hashlib
+import logging
+import argparse
+
+CATALOG_FILE = "combined_gty_sermons.json"
+URL_TEMPLATES = {
+    'text': "https://www.gty.org/library/sermons-library/{}",
+    'audio': "https://cdn.gty.org/sermons/High/{}.mp3",
+}
+INDEX_VERSION = "1"
+
+
+def index_path(json_file):
+    # File index ẩn nằm cạnh catalog: .combined_gty_sermons.json.index.sqlite
+    directory, name = os.path.split(json_file)
+    return os.path.join(directory, f".{name}.index.sqlite")
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def item_from_url(url, kind='text'):
+    prefix, suffix = URL_TEMPLATES[kind].split('{}')
+    if url.startswith(prefix) and url.endswith(suffix) and len(url) > len(prefix) + len(suffix):
+        return url[len(prefix):len(url) - len(suffix)]
+    return None
+
+
+class CatalogIndex:
+    # Bản biên dịch của catalog JSON sang SQLite, chỉ dựng lại khi file nguồn đổi.
+    # Kiểm tra nhanh bằng size + mtime; nếu khác thì so sha256 (file được touch/copy lại
+    # nhưng nội dung giữ nguyên thì không cần dựng lại).
+    def __init__(self, json_file=CATALOG_FILE, index_file=None):
+        self.json_file = json_file
+        self.index_file = index_file or index_path(json_file)
+        try:
+            self.conn = self._open()
+        except (OSError, sqlite3.Error) as e:
+            # Thư mục chỉ đọc hoặc index hỏng: dựng index trong bộ nhớ cho lần chạy này
+            logging.warning(f"Không dùng được index {self.index_file}: {str(e)}. Dựng index trong bộ nhớ.")
+            self.conn = sqlite3.connect(":memory:")
+            self._build(self.conn, *self._source_state(), file_sha256(self.json_file))
+
+    def _source_state(self):
+        stat = os.stat(self.json_file)
+        return str(stat.st_size), str(stat.st_mtime_ns)
+
+    def _open(self):
+        size, mtime = self._source_state()
+        sha256 = None
+        if os.path.exists(self.index_file):
+            conn = sqlite3.connect(self.index_file)
+            try:
+                meta = dict(conn.execute("SELECT key, value FROM meta"))
+            except sqlite3.DatabaseError:
+                meta = {}
+            if meta.get('version') == INDEX_VERSION:
+                if meta.get('size') == size and meta.get('mtime') == mtime:
+                    return conn
+                sha256 = file_sha256(self.json_file)
+                if meta.get('sha256') == sha256:
+                    with conn:
+                        conn.executemany("UPDATE meta SET value = ? WHERE key = ?", ((size, 'size'), (mtime, 'mtime')))
+                    return conn
+            conn.close()
+        # Dựng vào file tạm rồi os.replace: nhiều tiến trình (vd. distributed.py) có thể dựng cùng lúc
+        temp_file = f"{self.index_file}.{os.getpid()}.tmp"
+        conn = sqlite3.connect(temp_file)
+        try:
+            self._build(conn, size, mtime, sha256 or file_sha256(self.json_file))
+            conn.close()
+            os.replace(temp_file, self.index_file)
+        except BaseException:
+            conn.close()
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            raise
+        logging.info(f"Đã dựng lại index catalog {self.index_file}")
+        return sqlite3.connect(self.index_file)
+
+    def _build(self, conn, size, mtime, sha256):
+        with open(self.json_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        conn.executescript("""
+            DROP TABLE IF EXISTS meta;
+            DROP TABLE IF EXISTS items;
+            CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            CREATE TABLE items (
+                year INTEGER NOT NULL,
+                position INTEGER NOT NULL,
+                item TEXT NOT NULL,
+                PRIMARY KEY (year, position)
+            ) WITHOUT ROWID;
+        """)
+        with conn:
+            conn.executemany("INSERT INTO items (year, position, item) VALUES (?, ?, ?)",
+                             ((int(year), position, item)
+                              for year, year_data in data.items()
+                              for position, item in enumerate(year_data['items'])))
+            conn.execute("CREATE INDEX items_item ON items (item)")
+            conn.executemany("INSERT INTO meta (key, value) VALUES (?, ?)",
+                             (('version', INDEX_VERSION), ('size', size), ('mtime', mtime), ('sha256', sha256)))
+
+    def select(self, kind='text', start_year=None, end_year=None, item=None):
+        # Trả về [(url, year, item)] theo thứ tự năm tăng dần, giữ thứ tự item trong catalog
+        conditions = []
+        params = []
+        if start_year:
+            conditions.append("year >= ?")
+            params.append(start_year)
+        if end_year:
+            conditions.append("year <= ?")
+            params.append(end_year)
+        if item is not None:
+            conditions.append("item = ?")
+            params.append(item)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        template = URL_TEMPLATES[kind]
+        rows = self.conn.execute(f"SELECT year, item FROM items {where} ORDER BY year, position", params)
+        return [(template.format(item), str(year), item) for year, item in rows]
+
+    def years(self):
+        return [(str(year), count) for year, count in
+                self.conn.execute("SELECT year, COUNT(*) FROM items GROUP BY year ORDER BY year")]
+
+    def close(self):
+        self.conn.close()
+
+
+def generate_urls(json_file=CATALOG_FILE, kind='text', start_year=None, end_year=None, specific_url=None):
+    item = None
+    if specific_url:
+        item = item_from_url(specific_url, kind)
+        if item is None:
+            return []
+    index = CatalogIndex(json_file)
+    try:
+        return index.select(kind, start_year, end_year, item)
+    finally:
+        index.close()
+
+
+def progress_status(json_file, progress_file):
+    # [(year, tổng số bài, số bài đã xong)] mà không cần nạp requests/tqdm
+    from progress_store import ProgressJournal
+    done = {}
+    if os.path.exists(progress_file) or os.path.exists(progress_file + '.journal'):
+        journal = ProgressJournal(progress_file)
+        _, progress = journal.load()
+        done = {year: len(items) for year, items in progress.items()}
+    index = CatalogIndex(json_file)
+    try:
+        return [(year, total, done.get(year, 0)) for year, total in index.years()]
+    finally:
+        index.close()
+
+
+def print_status(json_file, progress_file):
+    rows = progress_status(json_file, progress_file)
+    for year, total, done in rows:
+        print(f"{year}: {done}/{total}")
+    total = sum(row[1] for row in rows)
+    done = sum(row[2] for row in rows)
+    print(f"Tổng cộng: {done}/{total} ({done / total * 100 if total else 0:.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the compiled sermon catalog index")
+    parser.add_argument("--catalog", default=CATALOG_FILE, help="Catalog JSON file")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    urls = subparsers.add_parser("urls", help="Print the selected URLs")
+    urls.add_argument("--kind", choices=sorted(URL_TEMPLATES), default="text")
+    urls.add_argument("--url", help="Only this URL (if it is in the catalog)")
+    urls.add_argument("--year", type=int)
+    urls.add_argument("--start-year", type=int)
+    urls.add_argument("--end-year", type=int)
+
+    status = subparsers.add_parser("status", help="Per-year progress against the catalog")
+    status.add_argument("--progress", default="progress.json", help="Progress file (progress.json, audio_progress.json...)")
+
+    subparsers.add_parser("years", help="Item count per year")
+    args = parser.parse_args()
+
+    if args.command == "urls":
+        start_year = args.year or args.start_year
+        end_year = args.year or args.end_year
+        for url, _, _ in generate_urls(args.catalog, args.kind, start_year, end_year, args.url):
+            print(url)
+    elif args.command == "status":
+        print_status(args.catalog, args.progress)
+    else:
+        index = CatalogIndex(args.catalog)
+        try:
+            for year, count in index.years():
+                print(f"{year}: {count}")
+        finally:
+            index.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
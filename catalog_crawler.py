@@ -0,0 +1,184 @@
+import os
+import re
+import sys
+import json
+import logging
+import argparse
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from http_session import create_session, REQUEST_ERRORS
+from adaptive_scheduler import ByteBucket
+
+# Cấu trúc trang danh sách của gty.org chưa được ghi lại trong repo: URL và mẫu nhận dạng mã bài
+# đều có thể đổi qua tham số dòng lệnh. Mã bài luôn chứa chữ số ("1316A", "81-167", "CONF-RC05-03").
+DEFAULT_LISTING_URL = "https://www.gty.org/library/sermons-library/date?year={year}&page={page}"
+DEFAULT_ITEM_PATTERN = r'/library/sermons-library/([\w-]*\d[\w-]*)'
+CATALOG_FILE = "combined_gty_sermons.json"
+
+
+def load_catalog(catalog_file):
+    if not os.path.exists(catalog_file):
+        return {}
+    with open(catalog_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_catalog(catalog, catalog_file):
+    # Giữ năm theo thứ tự tăng dần cho dễ đọc và diff
+    ordered = {year: {'total_items': len(catalog[year]['items']), 'items': catalog[year]['items']}
+               for year in sorted(catalog, key=int)}
+    temp_file = catalog_file + '.tmp'
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump(ordered, f, indent=2, ensure_ascii=False)
+    os.replace(temp_file, catalog_file)
+
+
+class CatalogCrawler:
+    def __init__(self, session, listing_url=DEFAULT_LISTING_URL, item_pattern=DEFAULT_ITEM_PATTERN,
+                 rps=2.0, max_pages=50):
+        self.session = session
+        self.listing_url = listing_url
+        self.item_pattern = re.compile(item_pattern)
+        self.rate_limiter = ByteBucket(rps, burst=1)
+        self.max_pages = max_pages
+
+    def parse_items(self, html):
+        items = []
+        seen = set()
+        for item in self.item_pattern.findall(html):
+            if item not in seen:
+                seen.add(item)
+                items.append(item)
+        return items
+
+    def crawl_year(self, year):
+        # Đọc lần lượt các trang của một năm cho tới khi gặp trang không có mã bài mới
+        items = []
+        seen = set()
+        for page in range(1, self.max_pages + 1):
+            self.rate_limiter.consume(1)
+            url = self.listing_url.format(year=year, page=page)
+            response = self.session.get(url, timeout=60)
+            if response.status_code == 404:
+                break
+            response.raise_for_status()
+            new_items = [item for item in self.parse_items(response.text) if item not in seen]
+            if not new_items:
+                break
+            seen.update(new_items)
+            items.extend(new_items)
+        return year, items
+
+    def crawl(self, years, workers=4):
+        results = {}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {year: executor.submit(self.crawl_year, year) for year in years}
+            for year, future in futures.items():
+                try:
+                    _, items = future.result()
+                    results[year] = items
+                    logging.info(f"Năm {year}: tìm thấy {len(items)} bài giảng")
+                except REQUEST_ERRORS as e:
+                    logging.error(f"Lỗi khi đọc danh sách năm {year}: {str(e)}")
+        return results
+
+
+def diff_catalog(catalog, crawled):
+    # Trả về {year: {'added': [...], 'removed': [...]}} cho các năm có thay đổi
+    changes = {}
+    for year, items in crawled.items():
+        if not items:
+            # Trang danh sách trống hoặc 404: coi như chưa crawl được, không suy ra là bị xoá
+            continue
+        existing = catalog.get(year, {}).get('items', [])
+        existing_set = set(existing)
+        crawled_set = set(items)
+        added = [item for item in items if item not in existing_set]
+        removed = [item for item in existing if item not in crawled_set]
+        if added or removed:
+            changes[year] = {'added': added, 'removed': removed}
+    return changes
+
+
+def apply_changes(catalog, changes, prune=False):
+    # Mục mới được nối vào cuối danh sách của năm để thứ tự cũ (và progress) không đổi.
+    # Chỉ xoá mục khi có --prune, vì một lần crawl lỗi giữa chừng trông giống như mục bị gỡ.
+    updated = {year: {'total_items': data['total_items'], 'items': list(data['items'])}
+               for year, data in catalog.items()}
+    for year, change in changes.items():
+        entry = updated.setdefault(year, {'total_items': 0, 'items': []})
+        entry['items'].extend(change['added'])
+        if prune and change['removed']:
+            removed = set(change['removed'])
+            entry['items'] = [item for item in entry['items'] if item not in removed]
+        entry['total_items'] = len(entry['items'])
+    return updated
+
+
+def delta_catalog(changes):
+    # Cùng định dạng với combined_gty_sermons.json nhưng chỉ gồm các mục mới,
+    # dùng được trực tiếp với main.py / download_audio.py --catalog
+    return {year: {'total_items': len(change['added']), 'items': change['added']}
+            for year, change in changes.items() if change['added']}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Discover new sermons and update the catalog incrementally")
+    parser.add_argument("--catalog", default=CATALOG_FILE, help="Catalog file to update")
+    parser.add_argument("--delta", default="catalog_delta.json", help="Write only the newly found items here")
+    parser.add_argument("--year", type=int, help="Crawl a single year")
+    parser.add_argument("--start-year", type=int, help="First year to crawl (default: first year in the catalog)")
+    parser.add_argument("--end-year", type=int, help="Last year to crawl (default: current year)")
+    parser.add_argument("--listing-url", default=DEFAULT_LISTING_URL, help="Listing page URL template with {year} and {page}")
+    parser.add_argument("--item-pattern", default=DEFAULT_ITEM_PATTERN, help="Regex whose first group is the item code")
+    parser.add_argument("--max-pages", type=int, default=50, help="Maximum listing pages per year")
+    parser.add_argument("--workers", type=int, default=4, help="Years crawled concurrently")
+    parser.add_argument("--rps", type=float, default=2.0, help="Requests per second budget across all workers")
+    parser.add_argument("--prune", action="store_true", help="Also remove items no longer listed")
+    parser.add_argument("--dry-run", action="store_true", help="Only print the differences")
+    args = parser.parse_args()
+
+    logging.basicConfig(filename="gty_catalog.log", level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    catalog = load_catalog(args.catalog)
+    if args.year:
+        years = [str(args.year)]
+    else:
+        start_year = args.start_year or min((int(year) for year in catalog), default=datetime.now().year)
+        end_year = args.end_year or datetime.now().year
+        years = [str(year) for year in range(start_year, end_year + 1)]
+
+    session = create_session(pool_size=args.workers)
+    try:
+        crawler = CatalogCrawler(session, args.listing_url, args.item_pattern, args.rps, args.max_pages)
+        crawled = crawler.crawl(years, args.workers)
+    finally:
+        session.close()
+
+    changes = diff_catalog(catalog, crawled)
+    for year, change in sorted(changes.items()):
+        removed = f", {len(change['removed'])} không còn trong danh sách" if change['removed'] else ""
+        print(f"{year}: {len(change['added'])} mục mới{removed}")
+    if not changes:
+        print("Catalog không thay đổi")
+        return 0
+    if args.dry_run:
+        return 0
+    if not args.prune and not any(change['added'] for change in changes.values()):
+        print("Không có mục mới, catalog giữ nguyên (dùng --prune để xoá mục không còn trong danh sách)")
+        return 0
+
+    save_catalog(apply_changes(catalog, changes, args.prune), args.catalog)
+    delta = delta_catalog(changes)
+    save_catalog(delta, args.delta)
+    total_new = sum(entry['total_items'] for entry in delta.values())
+    logging.info(f"Đã cập nhật {args.catalog}: {total_new} mục mới, delta ghi vào {args.delta}")
+    print(f"Đã cập nhật {args.catalog}: {total_new} mục mới")
+    if total_new:
+        print(f"Tải phần mới: python main.py --catalog {args.delta} && python download_audio.py --catalog {args.delta}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,287 @@
+import os
+import re
+import sys
+import heapq
+import sqlite3
+import hashlib
+import argparse
+import threading
+from array import array
+
+from resumable_download import BlockHasher, BUFFER_SIZE
+
+SKETCH_SIZE = 128
+SHINGLE_SIZE = 5
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def file_digest(path):
+    hasher = BlockHasher()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(BUFFER_SIZE), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def data_digest(data):
+    hasher = BlockHasher()
+    hasher.update(data)
+    return hasher.hexdigest()
+
+
+def minhash_sketch(text, size=SKETCH_SIZE, shingle_size=SHINGLE_SIZE):
+    # Bottom-k MinHash: giữ k giá trị băm nhỏ nhất của các shingle 5 từ liên tiếp.
+    # Dùng blake2b thay cho hash() để chữ ký ổn định giữa các lần chạy.
+    tokens = TOKEN_PATTERN.findall(text.lower())
+    shingles = {' '.join(tokens[i:i + shingle_size]) for i in range(max(1, len(tokens) - shingle_size + 1))}
+    hashes = (int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+              for shingle in shingles)
+    return array('Q', sorted(heapq.nsmallest(size, hashes)))
+
+
+def estimate_similarity(a, b, size=SKETCH_SIZE):
+    a, b = set(a), set(b)
+    union = heapq.nsmallest(size, a | b)
+    if not union:
+        return 0.0
+    return sum(1 for value in union if value in a and value in b) / len(union)
+
+
+class ContentStore:
+    # Kho theo địa chỉ nội dung: <root>/objects/<2 ký tự đầu>/<phần còn lại của digest>.
+    # File trong cây tải về được thay bằng hardlink tới blob, nên các bản trùng chỉ chiếm chỗ một lần
+    # mà đường dẫn cũ vẫn dùng được. Mọi chương trình trong repo đều ghi file bằng tmp + os.replace
+    # (tạo inode mới), nên ghi đè một item không làm hỏng blob dùng chung.
+    def __init__(self, root="gty_blobs", text_dir=None):
+        self.root = root
+        self.text_dir = text_dir
+        self.lock = threading.Lock()
+        os.makedirs(os.path.join(root, 'objects'), exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(root, 'store.sqlite'), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS blobs (
+                digest TEXT PRIMARY KEY,
+                size INTEGER NOT NULL
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS items (
+                kind TEXT NOT NULL,
+                year TEXT NOT NULL,
+                item TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                PRIMARY KEY (kind, year, item)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS items_digest ON items (digest);
+            CREATE TABLE IF NOT EXISTS sketches (
+                year TEXT NOT NULL,
+                item TEXT NOT NULL,
+                sketch BLOB NOT NULL,
+                PRIMARY KEY (year, item)
+            ) WITHOUT ROWID;
+        """)
+
+    def blob_path(self, digest):
+        return os.path.join(self.root, 'objects', digest[:2], digest[2:])
+
+    def _record(self, kind, year, item, digest, size):
+        with self.lock:
+            self.conn.execute("INSERT OR IGNORE INTO blobs (digest, size) VALUES (?, ?)", (digest, size))
+            self.conn.execute("INSERT OR REPLACE INTO items (kind, year, item, digest) VALUES (?, ?, ?, ?)",
+                              (kind, year, item, digest))
+            self.conn.commit()
+
+    def ingest_file(self, kind, year, item, path, digest=None):
+        # Trả về True nếu nội dung đã có trong kho (file được thay bằng hardlink tới blob có sẵn)
+        digest = digest or file_digest(path)
+        blob = self.blob_path(digest)
+        duplicate = os.path.exists(blob)
+        if duplicate:
+            if not os.path.samefile(blob, path):
+                temp_file = path + '.dedup'
+                os.link(blob, temp_file)
+                os.replace(temp_file, path)
+        else:
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            try:
+                os.link(path, blob)
+            except FileExistsError:
+                duplicate = True
+            except OSError:
+                # Kho nằm khác filesystem: lưu một bản sao, file gốc giữ nguyên
+                temp_file = blob + '.tmp'
+                with open(path, 'rb') as src, open(temp_file, 'wb') as dst:
+                    for chunk in iter(lambda: src.read(BUFFER_SIZE), b''):
+                        dst.write(chunk)
+                os.replace(temp_file, blob)
+        self._record(kind, year, item, digest, os.path.getsize(blob))
+        return duplicate
+
+    def ingest_text(self, year, item, text, path=None):
+        data = text.encode('utf-8')
+        if path is not None and os.path.exists(path):
+            duplicate = self.ingest_file('text', year, item, path)
+        else:
+            # Transcript chỉ nằm trong corpus pack: lưu blob trực tiếp
+            digest = data_digest(data)
+            blob = self.blob_path(digest)
+            duplicate = os.path.exists(blob)
+            if not duplicate:
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                temp_file = blob + '.tmp'
+                with open(temp_file, 'wb') as f:
+                    f.write(data)
+                os.replace(temp_file, blob)
+            self._record('text', year, item, digest, len(data))
+        sketch = minhash_sketch(text)
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO sketches (year, item, sketch) VALUES (?, ?, ?)",
+                              (year, item, sketch.tobytes()))
+            self.conn.commit()
+        return duplicate
+
+    def on_transcript_saved(self, year, item, text):
+        path = os.path.join(self.text_dir, year, f"{item}.txt") if self.text_dir else None
+        self.ingest_text(year, item, text, path)
+
+    def digest(self, kind, year, item):
+        with self.lock:
+            row = self.conn.execute("SELECT digest FROM items WHERE kind = ? AND year = ? AND item = ?",
+                                    (kind, year, item)).fetchone()
+        return row[0] if row else None
+
+    def duplicates(self, kind=None):
+        # [(digest, size, [(kind, year, item)])] cho các blob được nhiều item dùng chung
+        sql = ("SELECT i.digest, b.size, i.kind, i.year, i.item FROM items i JOIN blobs b ON b.digest = i.digest "
+               "WHERE i.digest IN (SELECT digest FROM items GROUP BY digest HAVING COUNT(*) > 1)")
+        params = []
+        if kind:
+            sql += " AND i.kind = ?"
+            params.append(kind)
+        groups = {}
+        with self.lock:
+            for digest, size, item_kind, year, item in self.conn.execute(sql, params):
+                groups.setdefault((digest, size), []).append((item_kind, year, item))
+        return sorted(((digest, size, sorted(items)) for (digest, size), items in groups.items() if len(items) > 1),
+                      key=lambda group: -len(group[2]))
+
+    def near_duplicates(self, threshold=0.8):
+        # Ứng viên là các cặp có chung ít nhất một phần tư chữ ký, sau đó ước lượng Jaccard từ bottom-k.
+        # Bỏ qua cặp trùng hoàn toàn (cùng digest), đã có trong duplicates().
+        with self.lock:
+            sketches = {}
+            for year, item, blob in self.conn.execute("SELECT year, item, sketch FROM sketches"):
+                values = array('Q')
+                values.frombytes(blob)
+                sketches[(year, item)] = values
+            digests = {(year, item): digest for year, item, digest in
+                       self.conn.execute("SELECT year, item, digest FROM items WHERE kind = 'text'")}
+        postings = {}
+        for key, values in sketches.items():
+            for value in values:
+                postings.setdefault(value, []).append(key)
+        shared = {}
+        for keys in postings.values():
+            if len(keys) < 2:
+                continue
+            for i in range(len(keys)):
+                for j in range(i + 1, len(keys)):
+                    pair = (keys[i], keys[j]) if keys[i] < keys[j] else (keys[j], keys[i])
+                    shared[pair] = shared.get(pair, 0) + 1
+        minimum = max(1, SKETCH_SIZE * threshold // 4)
+        results = []
+        for (a, b), count in shared.items():
+            if count < minimum or (digests.get(a) and digests.get(a) == digests.get(b)):
+                continue
+            similarity = estimate_similarity(sketches[a], sketches[b])
+            if similarity >= threshold:
+                results.append((similarity, a, b))
+        return sorted(results, reverse=True)
+
+    def stats(self):
+        with self.lock:
+            items, logical = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(b.size), 0) FROM items i JOIN blobs b ON b.digest = i.digest").fetchone()
+            blobs, stored = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+        return {'items': items, 'blobs': blobs, 'logical_bytes': logical, 'stored_bytes': stored}
+
+    def gc(self):
+        # Xoá blob không còn item nào trỏ tới (item đã được tải lại với nội dung khác)
+        with self.lock:
+            orphans = [row[0] for row in self.conn.execute(
+                "SELECT digest FROM blobs WHERE digest NOT IN (SELECT digest FROM items)")]
+            for digest in orphans:
+                blob = self.blob_path(digest)
+                if os.path.exists(blob):
+                    os.remove(blob)
+                self.conn.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+            self.conn.commit()
+        return len(orphans)
+
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
+
+
+def ingest_directory(store, base_dir, extension, kind):
+    count = duplicates = 0
+    for year in sorted(os.listdir(base_dir)):
+        year_dir = os.path.join(base_dir, year)
+        if not year.isdigit() or not os.path.isdir(year_dir):
+            continue
+        for file in sorted(os.listdir(year_dir)):
+            if not file.endswith(extension):
+                continue
+            path = os.path.join(year_dir, file)
+            item = file[:-len(extension)]
+            if kind == 'text':
+                with open(path, 'r', encoding='utf-8', newline='') as f:
+                    duplicate = store.ingest_text(year, item, f.read(), path)
+            else:
+                duplicate = store.ingest_file(kind, year, item, path)
+            count += 1
+            duplicates += duplicate
+    return count, duplicates
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Content-addressed deduplication for transcripts and audio")
+    parser.add_argument("--root", default="gty_blobs", help="Blob store directory")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    ingest = subparsers.add_parser("ingest", help="Hash a <year>/<item> tree into the store and hardlink duplicates")
+    ingest.add_argument("directory")
+    ingest.add_argument("--kind", choices=["text", "audio"], required=True)
+    report = subparsers.add_parser("report", help="Exact and near-duplicate report")
+    report.add_argument("--threshold", type=float, default=0.8, help="Minimum estimated Jaccard similarity")
+    subparsers.add_parser("gc", help="Delete blobs no item points to")
+    args = parser.parse_args()
+
+    store = ContentStore(args.root)
+    try:
+        if args.command == "ingest":
+            extension = '.txt' if args.kind == 'text' else '.mp3'
+            count, duplicates = ingest_directory(store, args.directory, extension, args.kind)
+            print(f"Đã xử lý {count} file, {duplicates} file trùng nội dung")
+        elif args.command == "gc":
+            print(f"Đã xoá {store.gc()} blob không dùng")
+        else:
+            stats = store.stats()
+            print(f"{stats['items']} item, {stats['blobs']} blob duy nhất, "
+                  f"tiết kiệm {(stats['logical_bytes'] - stats['stored_bytes']) / 1024 / 1024:.1f} MB")
+            for digest, size, items in store.duplicates():
+                print(f"\nTrùng hoàn toàn ({size} bytes, {digest[:12]}):")
+                for kind, year, item in items:
+                    print(f"  {kind} {year}/{item}")
+            near = store.near_duplicates(args.threshold)
+            if near:
+                print("\nGần trùng:")
+            for similarity, (year_a, item_a), (year_b, item_b) in near:
+                print(f"  {similarity:.2f}\t{year_a}/{item_a}\t{year_b}/{item_b}")
+    finally:
+        store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,239 @@
+import os
+import sys
+import json
+import mmap
+import zlib
+import struct
+import argparse
+import threading
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MAGIC = b'GTYPACK1'
+# Mỗi bản ghi: header (magic, độ dài key, độ dài dữ liệu nén, kích thước gốc, crc32) + key + dữ liệu nén.
+# Nhờ đó dựng lại được index cho các bản ghi ghi sau lần lưu index cuối cùng.
+RECORD_MAGIC = b'GR'
+RECORD_HEADER = struct.Struct('<2sHIII')
+ZSTD_FRAME = b'\x28\xb5\x2f\xfd'
+
+
+def _compressor(codec, level=None):
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("Codec zstd cần thư viện zstandard: pip install zstandard")
+        compressor = zstandard.ZstdCompressor(level=level or 10)
+        return compressor.compress
+    return lambda data: zlib.compress(data, level or 9)
+
+
+def _decompressor(codec):
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("Codec zstd cần thư viện zstandard: pip install zstandard")
+        return zstandard.ZstdDecompressor().decompress
+    return zlib.decompress
+
+
+def default_codec():
+    return 'zstd' if zstandard is not None else 'zlib'
+
+
+class CorpusPackWriter:
+    # <pack>: MAGIC + các bản ghi nén nối tiếp nhau; <pack>.idx.json: (year/item) -> [offset, length, size].
+    # Ghi đè một item chỉ thêm bản ghi mới và trỏ index sang đó; chạy lại "build" để dọn chỗ trống.
+    # Mỗi add() fsync bản ghi trước khi trả về, nên item đã được ghi vào progress chắc chắn có trong pack;
+    # index chỉ lưu định kỳ, phần sau đó được đọc lại từ header của bản ghi khi mở pack.
+    def __init__(self, pack_file, codec=None, level=None, save_every=200):
+        self.pack_file = pack_file
+        self.index_file = pack_file + '.idx.json'
+        self.save_every = save_every
+        self.entries = {}
+        self.dirty = 0
+        self.lock = threading.Lock()
+        self.codec = None
+        if os.path.exists(pack_file):
+            if os.path.exists(self.index_file):
+                with open(self.index_file, 'r') as f:
+                    index = json.load(f)
+                self.codec = index['codec']
+                self.entries = index['entries']
+        else:
+            with open(pack_file, 'wb') as f:
+                f.write(MAGIC)
+        self.file = open(pack_file, 'r+b')
+        end = max([offset + length for offset, length, _ in self.entries.values()], default=len(MAGIC))
+        end, recovered = self._recover(end)
+        # Bỏ phần bản ghi ghi dở (chương trình dừng giữa chừng khi đang ghi)
+        self.file.truncate(end)
+        self.file.seek(end)
+        self.codec = self.codec or codec or default_codec()
+        self._compress = _compressor(self.codec, level)
+        if recovered or not os.path.exists(self.index_file):
+            self._save_index()
+
+    def _recover(self, end):
+        file_size = os.fstat(self.file.fileno()).st_size
+        recovered = 0
+        self.file.seek(end)
+        while end + RECORD_HEADER.size <= file_size:
+            magic, key_length, length, size, crc = RECORD_HEADER.unpack(self.file.read(RECORD_HEADER.size))
+            record_end = end + RECORD_HEADER.size + key_length + length
+            if magic != RECORD_MAGIC or record_end > file_size:
+                break
+            key = self.file.read(key_length)
+            compressed = self.file.read(length)
+            if zlib.crc32(compressed) != crc:
+                break
+            try:
+                key = key.decode('utf-8')
+            except UnicodeDecodeError:
+                break
+            if self.codec is None:
+                self.codec = 'zstd' if compressed.startswith(ZSTD_FRAME) else 'zlib'
+            self.entries[key] = [end + RECORD_HEADER.size + key_length, length, size]
+            end = record_end
+            recovered += 1
+        return end, recovered
+
+    @staticmethod
+    def key(year, item):
+        return f"{year}/{item}"
+
+    def contains(self, year, item):
+        with self.lock:
+            return self.key(year, item) in self.entries
+
+    def add(self, year, item, text):
+        data = text.encode('utf-8')
+        compressed = self._compress(data)
+        key = self.key(year, item)
+        key_data = key.encode('utf-8')
+        header = RECORD_HEADER.pack(RECORD_MAGIC, len(key_data), len(compressed), len(data), zlib.crc32(compressed))
+        with self.lock:
+            offset = self.file.tell() + RECORD_HEADER.size + len(key_data)
+            self.file.write(header + key_data + compressed)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.entries[key] = [offset, len(compressed), len(data)]
+            self.dirty += 1
+            if self.dirty >= self.save_every:
+                self._save_index()
+
+    def _save_index(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        temp_file = self.index_file + '.tmp'
+        with open(temp_file, 'w') as f:
+            json.dump({'codec': self.codec, 'entries': self.entries}, f)
+        os.replace(temp_file, self.index_file)
+        self.dirty = 0
+
+    def close(self):
+        with self.lock:
+            self._save_index()
+            self.file.close()
+
+
+class CorpusPackReader:
+    def __init__(self, pack_file):
+        with open(pack_file + '.idx.json', 'r') as f:
+            index = json.load(f)
+        self.codec = index['codec']
+        self.entries = index['entries']
+        self._decompress = _decompressor(self.codec)
+        self.file = open(pack_file, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{pack_file} không phải file corpus pack")
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return f"{key[0]}/{key[1]}" in self.entries
+
+    def keys(self):
+        return [tuple(key.split('/', 1)) for key in self.entries]
+
+    def get(self, year, item):
+        entry = self.entries.get(f"{year}/{item}")
+        if entry is None:
+            return None
+        offset, length, _ = entry
+        return self._decompress(self.map[offset:offset + length]).decode('utf-8')
+
+    def __iter__(self):
+        # Đọc theo thứ tự offset để truy cập đĩa tuần tự
+        for key, (offset, length, _) in sorted(self.entries.items(), key=lambda x: x[1][0]):
+            year, item = key.split('/', 1)
+            yield year, item, self._decompress(self.map[offset:offset + length]).decode('utf-8')
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def build_from_directory(text_dir, pack_file, codec=None):
+    for suffix in ('', '.idx.json'):
+        if os.path.exists(pack_file + suffix):
+            os.remove(pack_file + suffix)
+    writer = CorpusPackWriter(pack_file, codec)
+    count = 0
+    try:
+        for year in sorted(os.listdir(text_dir)):
+            year_dir = os.path.join(text_dir, year)
+            if not year.isdigit() or not os.path.isdir(year_dir):
+                continue
+            for file in sorted(os.listdir(year_dir)):
+                if file.endswith('.txt'):
+                    with open(os.path.join(year_dir, file), 'r', encoding='utf-8', newline='') as f:
+                        writer.add(year, file[:-4], f.read())
+                    count += 1
+    finally:
+        writer.close()
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and read compressed sermon corpus packs")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="Build a pack from a <year>/<item>.txt directory tree")
+    build.add_argument("text_dir")
+    build.add_argument("pack_file")
+    build.add_argument("--codec", choices=["zstd", "zlib"])
+    get = subparsers.add_parser("get", help="Print one transcript")
+    get.add_argument("pack_file")
+    get.add_argument("year")
+    get.add_argument("item")
+    listing = subparsers.add_parser("list", help="List items in a pack")
+    listing.add_argument("pack_file")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        count = build_from_directory(args.text_dir, args.pack_file, args.codec)
+        print(f"Đã đóng gói {count} transcript vào {args.pack_file}")
+    elif args.command == "get":
+        with CorpusPackReader(args.pack_file) as reader:
+            text = reader.get(args.year, args.item)
+        if text is None:
+            print(f"Không tìm thấy {args.year}/{args.item}", file=sys.stderr)
+            return 1
+        sys.stdout.write(text)
+    else:
+        with CorpusPackReader(args.pack_file) as reader:
+            for year, item in sorted(reader.keys()):
+                print(f"{year}/{item}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
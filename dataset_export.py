@@ -0,0 +1,262 @@
+import io
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import argparse
+import tarfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from manifest import DirectoryManifest
+
+MANIFEST_FILE = "manifest.jsonl"
+SHARDS_FILE = "shards.json"
+TAR_BLOCK = 512
+
+
+class _HashingWriter:
+    # Bọc file đích để tính sha256 của shard ngay khi ghi, không phải đọc lại file
+    def __init__(self, file):
+        self.file = file
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.digest.update(data)
+        self.size += len(data)
+        return self.file.write(data)
+
+    def tell(self):
+        return self.size
+
+    def flush(self):
+        self.file.flush()
+
+
+def _tar_size(size):
+    return TAR_BLOCK + -(-size // TAR_BLOCK) * TAR_BLOCK
+
+
+def _add_bytes(tar, name, data, mtime):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mtime = mtime
+    tar.addfile(info, io.BytesIO(data))
+
+
+def write_shard(job):
+    # Chạy trong process con. Mỗi mẫu gồm 3 file liền nhau theo quy ước WebDataset:
+    #   <year>/<item>.mp3, <year>/<item>.txt, <year>/<item>.json
+    # MP3 được chép từ file nguồn theo từng khối (tarfile.addfile + copyfileobj), không nạp cả file vào RAM.
+    shard_path, samples, pack_file = job
+    pack = None
+    if pack_file:
+        from corpus_pack import CorpusPackReader
+        pack = CorpusPackReader(pack_file)
+    entries = []
+    temp_file = shard_path + '.tmp'
+    try:
+        with open(temp_file, 'wb') as f:
+            writer = _HashingWriter(f)
+            with tarfile.open(fileobj=writer, mode='w', format=tarfile.USTAR_FORMAT) as tar:
+                for sample in samples:
+                    year, item = sample['year'], sample['item']
+                    if pack is not None:
+                        text = pack.get(year, item)
+                    else:
+                        with open(sample['text_path'], 'r', encoding='utf-8', newline='') as text_file:
+                            text = text_file.read()
+                    if text is None:
+                        logging.warning(f"Không có transcript cho {year}/{item}, bỏ qua")
+                        continue
+                    text_data = text.encode('utf-8')
+                    stat = os.stat(sample['audio_path'])
+                    metadata = {'year': year, 'item': item, 'duration': sample['duration'],
+                                'bitrate': sample['bitrate'], 'text_chars': len(text)}
+                    info = tarfile.TarInfo(f"{year}/{item}.mp3")
+                    info.size = stat.st_size
+                    info.mtime = int(stat.st_mtime)
+                    with open(sample['audio_path'], 'rb') as audio:
+                        tar.addfile(info, audio)
+                    _add_bytes(tar, f"{year}/{item}.txt", text_data, int(stat.st_mtime))
+                    _add_bytes(tar, f"{year}/{item}.json", json.dumps(metadata, ensure_ascii=False).encode('utf-8'),
+                               int(stat.st_mtime))
+                    entries.append({'shard': os.path.basename(shard_path), 'year': year, 'item': item,
+                                    'text_chars': len(text), 'text_bytes': len(text_data),
+                                    'audio_bytes': stat.st_size, 'duration': sample['duration']})
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, shard_path)
+    except BaseException:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
+    finally:
+        if pack is not None:
+            pack.close()
+    shard = {'name': os.path.basename(shard_path), 'items': len(entries), 'bytes': writer.size,
+             'sha256': writer.digest.hexdigest()}
+    return shard, entries
+
+
+class DatasetExporter:
+    # Xuất gty_sermons_paired/<year>/<item>.{mp3,txt} thành các shard tar có giới hạn kích thước.
+    # manifest.jsonl: mỗi dòng một mẫu (shard, year, item, text_chars, text_bytes, audio_bytes, duration);
+    # shards.json: tên, số mẫu, kích thước và sha256 của từng shard.
+    # Chạy lại chỉ xuất các mẫu chưa có trong manifest vào shard mới; shard cũ không bị ghi lại.
+    def __init__(self, output_dir="gty_dataset", prefix="gty", shard_size=1024 * 1024 * 1024, shard_items=10000):
+        self.output_dir = output_dir
+        self.prefix = prefix
+        self.shard_size = shard_size
+        self.shard_items = shard_items
+        self.manifest_file = os.path.join(output_dir, MANIFEST_FILE)
+        self.shards_file = os.path.join(output_dir, SHARDS_FILE)
+        os.makedirs(output_dir, exist_ok=True)
+        self.shards = []
+        if os.path.exists(self.shards_file):
+            with open(self.shards_file, 'r') as f:
+                self.shards = json.load(f)['shards']
+
+    def exported(self):
+        # Chỉ tính các dòng của shard đã được ghi vào shards.json; dòng thừa do dừng giữa chừng bị bỏ qua
+        names = {shard['name'] for shard in self.shards}
+        keys = set()
+        if os.path.exists(self.manifest_file):
+            with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if entry.get('shard') in names:
+                        keys.add((entry['year'], entry['item']))
+        return keys
+
+    def plan(self, samples):
+        # Chia mẫu (đã sắp theo năm, mã bài) thành các shard theo kích thước ước tính trong tar
+        shards = []
+        current = []
+        current_size = 0
+        for sample in samples:
+            size = _tar_size(sample['audio_bytes']) + _tar_size(sample['text_bytes']) + _tar_size(256)
+            if current and (current_size + size > self.shard_size or len(current) >= self.shard_items):
+                shards.append(current)
+                current, current_size = [], 0
+            current.append(sample)
+            current_size += size
+        if current:
+            shards.append(current)
+        return shards
+
+    def _shard_path(self, number):
+        return os.path.join(self.output_dir, f"{self.prefix}-{number:06d}.tar")
+
+    def _save_shards(self):
+        temp_file = self.shards_file + '.tmp'
+        with open(temp_file, 'w') as f:
+            json.dump({'shards': self.shards}, f, indent=2)
+        os.replace(temp_file, self.shards_file)
+
+    def export(self, samples, pack_file=None, workers=None):
+        exported = self.exported()
+        pending = sorted((sample for sample in samples if (sample['year'], sample['item']) not in exported),
+                         key=lambda sample: (int(sample['year']), sample['item']))
+        if not pending:
+            return 0, 0
+        planned = self.plan(pending)
+        # Số shard mới lấy sau mọi file shard đã có trên đĩa, kể cả shard mồ côi của lần chạy bị dừng,
+        # để không ghi đè lên shard mà manifest.jsonl có thể đã nhắc tới
+        names = {shard['name'] for shard in self.shards}
+        names.update(name for name in os.listdir(self.output_dir)
+                     if name.startswith(self.prefix + '-') and name.endswith('.tar'))
+        numbers = [int(name[len(self.prefix) + 1:-4]) for name in names if name[len(self.prefix) + 1:-4].isdigit()]
+        first = max(numbers, default=-1) + 1
+        jobs = [(self._shard_path(first + i), shard, pack_file) for i, shard in enumerate(planned)]
+        workers = max(1, min(workers or os.cpu_count() or 1, len(jobs)))
+        written = 0
+        with ProcessPoolExecutor(max_workers=workers) as executor, \
+                open(self.manifest_file, 'a', encoding='utf-8') as manifest:
+            futures = [executor.submit(write_shard, job) for job in jobs]
+            for future in as_completed(futures):
+                shard, entries = future.result()
+                # Ghi manifest trước rồi mới ghi shards.json: nếu dừng giữa hai bước, dòng thừa bị bỏ qua
+                for entry in entries:
+                    manifest.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                manifest.flush()
+                os.fsync(manifest.fileno())
+                self.shards.append(shard)
+                self.shards.sort(key=lambda shard: shard['name'])
+                self._save_shards()
+                written += shard['items']
+                logging.info(f"Đã ghi {shard['name']}: {shard['items']} mẫu, {shard['bytes'] / 1024 / 1024:.1f} MB")
+        return len(jobs), written
+
+
+def collect_samples(paired_dir, pack_file=None, audio_index=None, workers=None):
+    # Mẫu = MP3 hợp lệ có transcript tương ứng (.txt trong paired_dir hoặc trong corpus pack)
+    from audio_verifier import AudioIndex
+    audio_manifest = DirectoryManifest(paired_dir, '.mp3')
+    audio_manifest.refresh()
+    audio_files = audio_manifest.items()
+    audio_manifest.close()
+    if pack_file:
+        from corpus_pack import CorpusPackReader
+        with CorpusPackReader(pack_file) as pack:
+            text_sizes = {(year, item): pack.entries[f"{year}/{item}"][2] for year, item in pack.keys()}
+        text_files = {}
+    else:
+        text_manifest = DirectoryManifest(paired_dir, '.txt')
+        text_manifest.refresh()
+        text_files = text_manifest.items()
+        text_manifest.close()
+        text_sizes = {}
+    index = AudioIndex(audio_index)
+    try:
+        results = index.verify({key: path for key, path in audio_files.items()
+                                if key in text_files or key in text_sizes}, workers)
+    finally:
+        index.close()
+    samples = []
+    for key, result in results.items():
+        if result['status'] != 'ok':
+            logging.warning(f"Bỏ qua {key[0]}/{key[1]}: audio không hợp lệ ({result['status']}: {result['reason']})")
+            continue
+        audio_path = audio_files[key]
+        text_path = text_files.get(key)
+        samples.append({'year': key[0], 'item': key[1], 'audio_path': audio_path, 'text_path': text_path,
+                        'audio_bytes': os.path.getsize(audio_path),
+                        'text_bytes': text_sizes[key] if text_path is None else os.path.getsize(text_path),
+                        'duration': result['duration'], 'bitrate': result['bitrate']})
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export paired sermons as size-bounded tar shards (WebDataset layout)")
+    parser.add_argument("--paired-dir", default="gty_sermons_paired", help="Output of pair_audio_text.py")
+    parser.add_argument("--pack", help="Read transcripts from this corpus pack (pair_audio_text.py --pack)")
+    parser.add_argument("--output-dir", default="gty_dataset", help="Directory for shards, manifest.jsonl and shards.json")
+    parser.add_argument("--prefix", default="gty", help="Shard file name prefix")
+    parser.add_argument("--shard-size-mb", type=float, default=1024, help="Maximum shard size")
+    parser.add_argument("--shard-items", type=int, default=10000, help="Maximum samples per shard")
+    parser.add_argument("--audio-index", default="gty_audio_index.sqlite",
+                        help="audio_verifier.py index used for durations and to skip invalid MP3s")
+    parser.add_argument("--workers", type=int, help="Shards written in parallel (default: CPU count)")
+    args = parser.parse_args()
+
+    logging.basicConfig(filename="gty_dataset_export.log", level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    start = time.time()
+    samples = collect_samples(args.paired_dir, args.pack, args.audio_index, args.workers)
+    exporter = DatasetExporter(args.output_dir, args.prefix, int(args.shard_size_mb * 1024 * 1024), args.shard_items)
+    shards, written = exporter.export(samples, args.pack, args.workers)
+    if not shards:
+        print(f"Không có mẫu mới ({len(samples)} mẫu đã được xuất)")
+        return 0
+    print(f"Đã ghi {written} mẫu vào {shards} shard mới trong {args.output_dir} ({time.time() - start:.1f}s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,337 @@
+import os
+import sys
+import time
+import json
+import shutil
+import socket
+import sqlite3
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+KINDS = ("text", "audio")
+EXTENSIONS = {"text": ".txt", "audio": ".mp3"}
+
+
+class LeaseStore:
+    # Hàng đợi công việc dùng chung giữa các máy, lưu trong một file SQLite trên ổ chia sẻ.
+    # Mỗi item được "thuê" (lease) trong lease_seconds; máy chết thì lease hết hạn và item
+    # được máy khác nhận lại. Không dùng WAL vì WAL cần shared memory, không chạy trên NFS/SMB.
+    def __init__(self, db_file, node_id=None, lease_seconds=300, max_attempts=5):
+        self.db_file = db_file
+        self.node_id = node_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_file, timeout=60, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=DELETE")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                kind TEXT NOT NULL,
+                year TEXT NOT NULL,
+                item TEXT NOT NULL,
+                url TEXT NOT NULL,
+                state TEXT NOT NULL DEFAULT 'pending',
+                owner TEXT,
+                lease_until REAL NOT NULL DEFAULT 0,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (kind, year, item)
+            );
+            CREATE INDEX IF NOT EXISTS tasks_claim ON tasks (kind, state, lease_until);
+            CREATE TABLE IF NOT EXISTS rate_buckets (
+                name TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated REAL NOT NULL
+            );
+        """)
+
+    def _transaction(self, func):
+        # BEGIN IMMEDIATE lấy khoá ghi ngay từ đầu để hai máy không cùng nhận một item
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = func()
+                self.conn.execute("COMMIT")
+                return result
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def seed(self, kind, urls):
+        def insert():
+            before = self.conn.total_changes
+            self.conn.executemany("INSERT OR IGNORE INTO tasks (kind, year, item, url) VALUES (?, ?, ?, ?)",
+                                  ((kind, year, item, url) for url, year, item in urls))
+            return self.conn.total_changes - before
+        return self._transaction(insert)
+
+    def claim(self, kind, batch=8):
+        def take():
+            now = time.time()
+            rows = self.conn.execute(
+                "SELECT year, item, url FROM tasks WHERE kind = ? AND "
+                "(state = 'pending' OR (state = 'leased' AND lease_until < ?)) "
+                "ORDER BY year, item LIMIT ?", (kind, now, batch)).fetchall()
+            self.conn.executemany(
+                "UPDATE tasks SET state = 'leased', owner = ?, lease_until = ? WHERE kind = ? AND year = ? AND item = ?",
+                ((self.node_id, now + self.lease_seconds, kind, year, item) for year, item, _ in rows))
+            return [(url, year, item) for year, item, url in rows]
+        return self._transaction(take)
+
+    def renew(self, kind, keys):
+        def extend():
+            self.conn.executemany(
+                "UPDATE tasks SET lease_until = ? WHERE kind = ? AND year = ? AND item = ? AND owner = ? AND state = 'leased'",
+                ((time.time() + self.lease_seconds, kind, year, item, self.node_id) for year, item in keys))
+        if keys:
+            self._transaction(extend)
+
+    def complete(self, kind, year, item, success):
+        # Lỗi thì trả item về hàng đợi; quá max_attempts lần thì đánh dấu failed.
+        # Chỉ áp dụng khi máy này vẫn giữ lease: lease đã hết hạn và bị máy khác nhận thì không ghi đè
+        # trạng thái của máy đó. Trả về False trong trường hợp này.
+        def finish():
+            if success:
+                cursor = self.conn.execute(
+                    "UPDATE tasks SET state = 'done', lease_until = 0 "
+                    "WHERE kind = ? AND year = ? AND item = ? AND owner = ?", (kind, year, item, self.node_id))
+            else:
+                cursor = self.conn.execute(
+                    "UPDATE tasks SET attempts = attempts + 1, lease_until = 0, owner = NULL, "
+                    "state = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END "
+                    "WHERE kind = ? AND year = ? AND item = ? AND owner = ?",
+                    (self.max_attempts, kind, year, item, self.node_id))
+            return cursor.rowcount > 0
+        return self._transaction(finish)
+
+    def acquire_rate(self, name, rate):
+        # Token bucket toàn cục chia sẻ qua SQLite: tổng số request của mọi máy không vượt quá `rate`/giây
+        def take():
+            now = time.time()
+            row = self.conn.execute("SELECT tokens, updated FROM rate_buckets WHERE name = ?", (name,)).fetchone()
+            tokens = rate if row is None else min(rate, row[0] + (now - row[1]) * rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+            if not wait:
+                tokens -= 1
+            self.conn.execute("INSERT OR REPLACE INTO rate_buckets (name, tokens, updated) VALUES (?, ?, ?)",
+                              (name, tokens, now))
+            return wait
+        while True:
+            wait = self._transaction(take)
+            if not wait:
+                return
+            time.sleep(wait)
+
+    def status(self):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT kind, state, COUNT(*) FROM tasks GROUP BY kind, state ORDER BY kind, state").fetchall()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class LeaseKeeper:
+    # Thread nền gia hạn lease cho mọi item máy này đã nhận mà chưa complete (kể cả item còn chờ trong batch)
+    def __init__(self, store, kind):
+        self.store = store
+        self.kind = kind
+        self.active = set()
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def add(self, year, item):
+        with self.lock:
+            self.active.add((year, item))
+
+    def discard(self, year, item):
+        with self.lock:
+            self.active.discard((year, item))
+
+    def _run(self):
+        while not self.stop_event.wait(self.store.lease_seconds / 3):
+            with self.lock:
+                keys = list(self.active)
+            try:
+                self.store.renew(self.kind, keys)
+            except sqlite3.Error as e:
+                logging.error(f"Không gia hạn được lease: {str(e)}")
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+
+def node_paths(nodes_dir, node_id, kind):
+    node_dir = os.path.join(nodes_dir, node_id)
+    return os.path.join(node_dir, f"gty_{kind}"), os.path.join(node_dir, f"{kind}_progress.json")
+
+
+def _make_processor(kind, output_dir, tracker, session, segments):
+    if kind == "text":
+        from main import process_url
+        return lambda url_info: process_url(url_info, output_dir, tracker, session)
+    from download_audio import process_url
+    return lambda url_info: process_url(url_info, output_dir, tracker, session, segments)
+
+
+def run_worker(store, kind, nodes_dir, rps, workers=1, batch=8, segments=1):
+    # Mỗi máy ghi vào thư mục và file progress riêng trong nodes_dir/<node_id>;
+    # lệnh merge gộp lại sau. Trả về số item xử lý thành công.
+    if kind == "text":
+        from main import ProgressTracker
+    else:
+        from download_audio import ProgressTracker
+    from http_session import create_session
+
+    output_dir, progress_file = node_paths(nodes_dir, store.node_id, kind)
+    os.makedirs(output_dir, exist_ok=True)
+    tracker = ProgressTracker(progress_file, 0)
+    session = create_session(pool_size=workers * max(1, segments))
+    keeper = LeaseKeeper(store, kind).start()
+    process = _make_processor(kind, output_dir, tracker, session, segments)
+    completed = 0
+
+    def handle(url_info):
+        _, year, item = url_info
+        try:
+            store.acquire_rate(kind, rps)
+            success = process(url_info)[0] or tracker.is_done(year, item)
+        except Exception as e:
+            logging.error(f"Lỗi khi xử lý {year}/{item}: {str(e)}")
+            success = False
+        try:
+            if not store.complete(kind, year, item, success):
+                logging.warning(f"Lease của {year}/{item} đã hết hạn và bị máy khác nhận lại")
+        finally:
+            keeper.discard(year, item)
+        return success
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while True:
+                tasks = store.claim(kind, batch)
+                if not tasks:
+                    break
+                # Gia hạn cả những item còn chờ luồng rảnh, không chỉ item đang chạy
+                for _, year, item in tasks:
+                    keeper.add(year, item)
+                completed += sum(executor.map(handle, tasks))
+    finally:
+        keeper.stop()
+        session.close()
+        tracker.close()
+    return completed
+
+
+def merge(nodes_dir, kind, output_dir, progress_file):
+    # Gộp file của từng máy vào cây chính (os.replace nếu cùng filesystem) và gộp progress.
+    # Chạy lại được nhiều lần: file đã chuyển thì không còn trong thư mục của máy.
+    from progress_store import ProgressJournal
+    journal = ProgressJournal(progress_file)
+    journal.load()
+    moved = 0
+    extension = EXTENSIONS[kind]
+    try:
+        for node_id in sorted(os.listdir(nodes_dir)):
+            node_output, node_progress = node_paths(nodes_dir, node_id, kind)
+            if os.path.exists(node_progress) or os.path.exists(node_progress + '.journal'):
+                node_journal = ProgressJournal(node_progress)
+                _, progress = node_journal.load()
+                node_journal.close()
+                for year, items in progress.items():
+                    for item in items:
+                        journal.append(year, item)
+            if not os.path.isdir(node_output):
+                continue
+            for year in sorted(os.listdir(node_output)):
+                year_dir = os.path.join(node_output, year)
+                if not os.path.isdir(year_dir):
+                    continue
+                target_dir = os.path.join(output_dir, year)
+                os.makedirs(target_dir, exist_ok=True)
+                for file in os.listdir(year_dir):
+                    if not file.endswith(extension):
+                        continue
+                    source = os.path.join(year_dir, file)
+                    target = os.path.join(target_dir, file)
+                    try:
+                        os.replace(source, target)
+                    except OSError:
+                        shutil.copyfile(source, target + '.tmp')
+                        os.replace(target + '.tmp', target)
+                        os.remove(source)
+                    moved += 1
+    finally:
+        journal.close()
+    return moved
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split the scrape/download work list across several machines")
+    parser.add_argument("--db", default="gty_leases.sqlite", help="Lease store (SQLite file on a shared volume)")
+    parser.add_argument("--nodes-dir", default="gty_nodes", help="Per-node output directory (shared or local)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    seed = subparsers.add_parser("seed", help="Load the work list from the catalog")
+    seed.add_argument("--kind", choices=KINDS, required=True)
+    seed.add_argument("--catalog", default="combined_gty_sermons.json")
+    seed.add_argument("--start-year", type=int)
+    seed.add_argument("--end-year", type=int)
+
+    work = subparsers.add_parser("work", help="Claim and process items until the queue is empty")
+    work.add_argument("--kind", choices=KINDS, required=True)
+    work.add_argument("--node-id", help="Unique name of this machine (default: hostname-pid)")
+    work.add_argument("--rps", type=float, default=2.0, help="Global requests per second budget shared by all nodes")
+    work.add_argument("--workers", type=int, default=1, help="Concurrent items on this node")
+    work.add_argument("--batch", type=int, default=8, help="Items claimed per lease transaction")
+    work.add_argument("--lease-seconds", type=float, default=300, help="Lease length; expired leases are reclaimed")
+    work.add_argument("--segments", type=int, default=1, help="Parallel byte-range segments per audio file")
+
+    merge_parser = subparsers.add_parser("merge", help="Combine per-node outputs and progress")
+    merge_parser.add_argument("--kind", choices=KINDS, required=True)
+    merge_parser.add_argument("--output-dir", help="Default: gty_sermons / gty_audio_sermons")
+    merge_parser.add_argument("--progress-file", help="Default: progress.json / audio_progress.json")
+
+    subparsers.add_parser("status", help="Show queue counts")
+    args = parser.parse_args()
+    if args.command == "work" and args.segments < 1:
+        work.error("--segments phải >= 1")
+
+    logging.basicConfig(filename="gty_distributed.log", level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.command == "merge":
+        output_dir = args.output_dir or ("gty_sermons" if args.kind == "text" else "gty_audio_sermons")
+        progress_file = args.progress_file or ("progress.json" if args.kind == "text" else "audio_progress.json")
+        moved = merge(args.nodes_dir, args.kind, output_dir, progress_file)
+        print(f"Đã gộp {moved} file vào {output_dir}, progress vào {progress_file}")
+        return 0
+
+    store = LeaseStore(args.db, getattr(args, 'node_id', None), getattr(args, 'lease_seconds', 300))
+    try:
+        if args.command == "seed":
+            from catalog import generate_urls
+            urls = generate_urls(args.catalog, args.kind, start_year=args.start_year, end_year=args.end_year)
+            print(f"Đã thêm {store.seed(args.kind, urls)}/{len(urls)} item vào hàng đợi {args.kind}")
+        elif args.command == "work":
+            start = time.time()
+            completed = run_worker(store, args.kind, args.nodes_dir, args.rps, args.workers, args.batch, args.segments)
+            print(f"\nMáy {store.node_id}: xong {completed} item trong {time.time() - start:.1f}s")
+        else:
+            print(json.dumps([{'kind': kind, 'state': state, 'count': count}
+                              for kind, state, count in store.status()], ensure_ascii=False, indent=2))
+    finally:
+        store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,19 @@
 import argparse
-import requests
 import os
 import json
-from concurrent.futures import ThreadPoolExecutor
-import time
 import threading
 from datetime import datetime
 import logging
-from tqdm import tqdm
+from progress_store import ProgressJournal
+from adaptive_scheduler import AdaptiveScheduler
+from bounded_scheduler import BoundedScheduler, ORDERS, year_priority
+from manifest import DirectoryManifest
+from catalog import generate_urls, print_status
+from metrics import REGISTRY, MetricsExporter, Reporter, log_stage_summary
+
+ITEMS_COMPLETED = REGISTRY.counter('audio_completed_total', 'MP3 files downloaded')
+ITEMS_FAILED = REGISTRY.counter('audio_failed_total', 'MP3 downloads that failed')
+BYTES_WRITTEN = REGISTRY.counter('audio_bytes_total', 'Bytes of MP3 files downloaded')
 
 class ProgressTracker:
     def __init__(self, progress_file, total_urls):
@@ -17,21 +23,29 @@ class ProgressTracker:
         self.progress = {}
         self.year_counts = {}
         self.lock = threading.Lock()
+        self.journal = ProgressJournal(progress_file)
         self.load_progress()
         self.start_time = datetime.now()
         self.total_urls = total_urls
+        from tqdm import tqdm
         self.pbar = tqdm(total=total_urls, unit="file")
 
     def increment_downloads(self, year, number):
         with self.lock:
-            self.successful_downloads += 1
-            if year not in self.progress:
-                self.progress[year] = []
-            self.progress[year].append(number)
-            self.year_counts[year] = self.year_counts.get(year, 0) + 1
-            self.save_progress()
+            if self.journal.append(year, number):
+                self.successful_downloads = self.journal.successful_downloads
+                self.year_counts[year] = self.year_counts.get(year, 0) + 1
             self.pbar.update(1)
 
+    def is_done(self, year, number):
+        return self.journal.contains(year, number)
+
+    def pending_urls(self, urls):
+        pending = [url_info for url_info in urls if not self.is_done(url_info[1], url_info[2])]
+        with self.lock:
+            self.pbar.reset(total=len(pending))
+        return pending
+
     def update_current_url(self, url):
         with self.lock:
             self.current_url = url
@@ -42,13 +56,10 @@ class ProgressTracker:
             return self.successful_downloads, self.current_url, self.year_counts
 
     def load_progress(self):
-        if os.path.exists(self.progress_file):
+        if os.path.exists(self.progress_file) or os.path.exists(self.journal.journal_file):
             try:
-                with open(self.progress_file, 'r') as f:
-                    data = json.load(f)
-                    self.successful_downloads = data.get('successful_downloads', 0)
-                    self.progress = data.get('files_success', {})
-                    self.year_counts = {year: len(items) for year, items in self.progress.items()}
+                self.successful_downloads, self.progress = self.journal.load()
+                self.year_counts = {year: len(items) for year, items in self.progress.items()}
             except json.JSONDecodeError:
                 logging.error(f"Lỗi: File {self.progress_file} không phải là JSON hợp lệ. Tạo file progress mới.")
                 self.reset_progress()
@@ -60,78 +71,85 @@ class ProgressTracker:
             self.reset_progress()
 
     def reset_progress(self):
+        self.journal.reset()
         self.successful_downloads = 0
-        self.progress = {}
+        self.progress = self.journal.progress
         self.year_counts = {}
 
     def save_progress(self):
-        with open(self.progress_file, 'w') as f:
-            json.dump({
-                'successful_downloads': self.successful_downloads,
-                'files_success': self.progress
-            }, f, indent=2)
+        self.journal.compact()
 
     def get_session_time(self):
         return str(datetime.now() - self.start_time).split('.')[0]
 
     def close(self):
+        self.journal.close()
         self.pbar.close()
 
-def download_audio(url, filename, tracker, year, number):
+def download_audio(url, filename, tracker, year, number, session=None, segments=1, on_bytes=None, on_digest=None, audio_index=None,
+                   on_error=None):
+    # requests chỉ được nạp khi thật sự tải, để --status và --help khởi động nhanh
+    from http_session import REQUEST_ERRORS, is_transient
+    from resumable_download import download_file
     try:
         tracker.update_current_url(url)
-        response = requests.get(url, stream=True)
-        response.raise_for_status()
-        
-        os.makedirs(os.path.dirname(filename), exist_ok=True)
-        with open(filename, 'wb') as file:
-            for chunk in response.iter_content(chunk_size=8192):
-                file.write(chunk)
-        
+        with REGISTRY.span('download'):
+            download_file(url, filename, session, segments, on_bytes, on_digest)
+        if audio_index is not None:
+            # Tải hết luồng chưa chắc là MP3 đúng (trang lỗi HTML, file bị cắt): kiểm tra frame trước khi ghi progress
+            result = audio_index.check(year, number, filename)
+            if result['status'] != 'ok':
+                logging.error(f"File tải về không hợp lệ ({result['status']}: {result['reason']}): {url}")
+                return False
         tracker.increment_downloads(year, number)
         logging.info(f"Đã tải xuống thành công: {url}")
         return True
-    except requests.RequestException as e:
+    except REQUEST_ERRORS as e:
         logging.error(f"Lỗi khi tải xuống URL {url}: {str(e)}")
+        # None: lỗi vĩnh viễn (vd. 404), process_url báo cho vòng --retries bỏ qua file này.
+        # on_error chỉ nhận lỗi tạm thời, để AdaptiveScheduler không giảm số luồng vì file thiếu trên CDN
+        if not is_transient(e):
+            return None
+        if on_error is not None:
+            on_error()
         return False
     except Exception as e:
         logging.error(f"Lỗi không xác định khi xử lý URL {url}: {str(e)}")
         return False
 
-def process_url(url_info, output_dir, tracker):
+def process_url(url_info, output_dir, tracker, session=None, segments=1, scheduler=None, manifest=None, store=None, audio_index=None):
     url, year, number = url_info
-    if year in tracker.progress and number in tracker.progress[year]:
-        logging.info(f"Bỏ qua URL đã xử lý: {url}")
+    if tracker.is_done(year, number):
         return False, None
 
     year_dir = os.path.join(output_dir, year)
     filename = os.path.join(year_dir, f"{number}.mp3")
-    success = download_audio(url, filename, tracker, year, number)
+    digests = []
+    if scheduler is None:
+        success = download_audio(url, filename, tracker, year, number, session, segments, on_digest=digests.append,
+                                 audio_index=audio_index)
+    else:
+        with scheduler.slot() as transfer:
+            success = download_audio(url, filename, tracker, year, number, session, segments, transfer.add_bytes,
+                                     digests.append, audio_index, transfer.mark_error)
+            transfer.success = success
+    if success:
+        ITEMS_COMPLETED.inc()
+        BYTES_WRITTEN.inc(os.path.getsize(filename))
+    else:
+        ITEMS_FAILED.inc()
+    if success and store is not None:
+        try:
+            if store.ingest_file('audio', year, number, filename, digests[0] if digests else None):
+                logging.info(f"Nội dung trùng với file đã có, đã thay bằng hardlink: {filename}")
+        except OSError as e:
+            logging.error(f"Lỗi khi đưa {filename} vào kho nội dung: {str(e)}")
+    if success and manifest is not None:
+        manifest.record(filename)
     if not success and os.path.exists(filename):
         os.remove(filename)
-    time.sleep(0.5)  # Nghỉ 0.5 giây sau mỗi lần tải
-    return success, filename
-
-def generate_urls_from_json(json_file, start_year=None, end_year=None, specific_url=None):
-    with open(json_file, 'r') as f:
-        data = json.load(f)
-    
-    urls = []
-    base_url = "https://cdn.gty.org/sermons/High/{}.mp3"
-    
-    for year, year_data in data.items():
-        if start_year and int(year) < start_year:
-            continue
-        if end_year and int(year) > end_year:
-            break
-        
-        for item in year_data['items']:
-            url = base_url.format(item)
-            if specific_url and url != specific_url:
-                continue
-            urls.append((url, year, item))
-    
-    return urls
+    # filename None: không có gì để thử lại (đã xong từ trước hoặc lỗi vĩnh viễn)
+    return bool(success), filename if success is not None else None
 
 def main():
     parser = argparse.ArgumentParser(description="Download audio sermons from GTY.org")
@@ -139,7 +157,28 @@ def main():
     parser.add_argument("--year", type=int, help="Specific year to download")
     parser.add_argument("--start-year", type=int, help="Start year for download range")
     parser.add_argument("--end-year", type=int, help="End year for download range")
+    parser.add_argument("--catalog", default="combined_gty_sermons.json",
+                        help="Catalog file (e.g. the delta written by catalog_crawler.py)")
+    parser.add_argument("--min-workers", type=int, default=1, help="Minimum concurrent downloads")
+    parser.add_argument("--max-workers", type=int, default=16, help="Maximum concurrent downloads")
+    parser.add_argument("--max-bandwidth", type=float, help="Bandwidth cap in MB/s")
+    parser.add_argument("--segments", type=int, default=1, help="Parallel byte-range segments per large file")
+    parser.add_argument("--dedup-store", help="Content-addressed store directory; duplicate MP3s are hardlinked to one blob")
+    parser.add_argument("--audio-index", help="Verify MP3 frame headers before counting a download as done and record the result here")
+    parser.add_argument("--metrics-file", help="Export metrics here periodically (.prom = Prometheus textfile, otherwise JSONL)")
+    parser.add_argument("--metrics-interval", type=float, default=15.0, help="Seconds between metrics exports")
+    parser.add_argument("--order", choices=ORDERS, default="catalog", help="Processing order: catalog order, newest or oldest years first")
+    parser.add_argument("--window", type=int, help="Maximum queued + running downloads (default: 2 x max workers)")
+    parser.add_argument("--retries", type=int, default=0, help="Retry downloads that failed with a transient error (timeout, 408/429/5xx) this many times, after all other files")
+    parser.add_argument("--status", action="store_true", help="Print per-year progress against the catalog and exit")
     args = parser.parse_args()
+    if args.segments < 1:
+        parser.error("--segments phải >= 1")
+    if args.min_workers > args.max_workers:
+        parser.error("--min-workers phải <= --max-workers")
+    if args.status:
+        print_status(args.catalog, "audio_progress.json")
+        return
 
     log_file = "gty_audio_downloader.log"
     logging.basicConfig(filename=log_file, level=logging.INFO,
@@ -149,26 +188,65 @@ def main():
     output_dir = "gty_audio_sermons"
     os.makedirs(output_dir, exist_ok=True)
     progress_file = "audio_progress.json"
-    json_file = "combined_gty_sermons.json"
+    json_file = args.catalog
 
     if args.url:
-        urls = generate_urls_from_json(json_file, specific_url=args.url)
+        urls = generate_urls(json_file, 'audio', specific_url=args.url)
     elif args.year:
-        urls = generate_urls_from_json(json_file, start_year=args.year, end_year=args.year)
+        urls = generate_urls(json_file, 'audio', start_year=args.year, end_year=args.year)
     elif args.start_year and args.end_year:
-        urls = generate_urls_from_json(json_file, start_year=args.start_year, end_year=args.end_year)
+        urls = generate_urls(json_file, 'audio', start_year=args.start_year, end_year=args.end_year)
     else:
-        urls = generate_urls_from_json(json_file)
+        urls = generate_urls(json_file, 'audio')
 
     total_urls = len(urls)
     tracker = ProgressTracker(progress_file, total_urls)
     logging.info(f"Đã tạo {total_urls} URLs")
+    pending_urls = tracker.pending_urls(urls)
+    logging.info(f"Bỏ qua {total_urls - len(pending_urls)} URL đã xử lý, còn {len(pending_urls)} URL cần tải")
 
+    max_bandwidth = args.max_bandwidth * 1024 * 1024 if args.max_bandwidth else None
+    scheduler = AdaptiveScheduler(min_workers=args.min_workers, max_workers=args.max_workers,
+                                  max_bandwidth=max_bandwidth)
+    from http_session import create_session
+    session = create_session(pool_size=args.max_workers * max(1, args.segments))
+    manifest = DirectoryManifest(output_dir, '.mp3')
+    store = None
+    if args.dedup_store:
+        from content_store import ContentStore
+        store = ContentStore(args.dedup_store)
+    audio_index = None
+    if args.audio_index:
+        from audio_verifier import AudioIndex
+        audio_index = AudioIndex(args.audio_index)
+    total_pending = len(pending_urls)
+    REGISTRY.gauge('queue_depth', 'Items not yet processed in this run',
+                   function=lambda: total_pending - ITEMS_COMPLETED.value() - ITEMS_FAILED.value())
+    REGISTRY.gauge('audio_workers', 'Current adaptive concurrency limit', function=lambda: scheduler.get_stats()[0])
+    reporter = Reporter()
+    if args.metrics_file:
+        reporter.every(args.metrics_interval, MetricsExporter(REGISTRY, args.metrics_file).export)
+    reporter.start()
     try:
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            results = list(executor.map(lambda url_info: process_url(url_info, output_dir, tracker), urls))
+        attempts = {}
+        with BoundedScheduler(args.max_workers, args.window, year_priority(args.order), on_abort=tracker.journal.flush) as work:
+            for url_info, future in work.map(lambda url_info: process_url(url_info, output_dir, tracker, session, args.segments, scheduler, manifest, store, audio_index), pending_urls):
+                success, filename = future.result()
+                if not success and filename is not None and attempts.get(url_info[0], 0) < args.retries:
+                    attempts[url_info[0]] = attempts.get(url_info[0], 0) + 1
+                    work.requeue(url_info)
+            if work.stopping:
+                logging.info("Đã dừng theo yêu cầu; các file còn lại sẽ được tải ở lần chạy sau")
     finally:
+        session.close()
+        manifest.close()
+        if store is not None:
+            store.close()
+        if audio_index is not None:
+            audio_index.close()
+        reporter.stop()
         tracker.close()
+    log_stage_summary()
 
     successful_downloads, _, year_counts = tracker.get_stats()
     print("\n")  # Xuống dòng sau khi hoàn thành
@@ -0,0 +1,212 @@
+import os
+import re
+import sys
+import argparse
+from html.parser import HTMLParser
+
+TRANSCRIPT_CLASS = 'transcript-content gty-writing-content'
+SKIP_TAGS = {'script', 'style', 'template'}
+PRESERVE_WHITESPACE_TAGS = {'pre', 'textarea'}
+
+_SECTION_START = re.compile(r'<section\b[^>]*transcript-content', re.IGNORECASE)
+_META_CHARSET = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.IGNORECASE)
+
+
+class _SectionDone(Exception):
+    pass
+
+
+def _collapse_whitespace(data):
+    # BeautifulSoup thay chuỗi chỉ gồm khoảng trắng bằng '\n' hoặc ' '
+    if data.strip(' \t\n\r\f') == '' and data:
+        return '\n' if '\n' in data else ' '
+    return data
+
+
+class _TranscriptParser(HTMLParser):
+    # Chỉ gom text bên trong section transcript, dừng ngay khi section đóng lại.
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.depth = 0
+        self.skip_depth = 0
+        self.preserve_depth = 0
+        self.found = False
+        self.parts = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'section':
+            if self.depth:
+                self.depth += 1
+            elif ' '.join((dict(attrs).get('class') or '').split()) == TRANSCRIPT_CLASS:
+                self.found = True
+                self.depth = 1
+        elif self.depth and tag in SKIP_TAGS:
+            self.skip_depth += 1
+        elif self.depth and tag in PRESERVE_WHITESPACE_TAGS:
+            self.preserve_depth += 1
+
+    def handle_endtag(self, tag):
+        if not self.depth:
+            return
+        if tag == 'section':
+            self.depth -= 1
+            if not self.depth:
+                raise _SectionDone()
+        elif tag in SKIP_TAGS and self.skip_depth:
+            self.skip_depth -= 1
+        elif tag in PRESERVE_WHITESPACE_TAGS and self.preserve_depth:
+            self.preserve_depth -= 1
+
+    def handle_data(self, data):
+        if self.depth and not self.skip_depth:
+            self.parts.append(data if self.preserve_depth else _collapse_whitespace(data))
+
+    def unknown_decl(self, data):
+        if self.depth and not self.skip_depth and data.startswith('CDATA['):
+            self.parts.append(data[6:])
+
+
+def _decode(content):
+    if isinstance(content, str):
+        return content
+    match = _META_CHARSET.search(content[:4096])
+    if match and match.group(1).lower() not in (b'utf-8', b'utf8'):
+        return None
+    try:
+        return content.decode('utf-8')
+    except UnicodeDecodeError:
+        return None
+
+
+def extract_targeted(content):
+    html = _decode(content)
+    if html is None:
+        return extract_bs4(content)
+    for match in _SECTION_START.finditer(html):
+        parser = _TranscriptParser()
+        try:
+            parser.feed(html[match.start():])
+            parser.close()
+        except _SectionDone:
+            pass
+        if parser.found:
+            return ''.join(parser.parts).strip()
+    return None
+
+
+def extract_bs4(content):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(content, 'html.parser')
+    transcript_content = soup.find('section', class_=TRANSCRIPT_CLASS)
+    if transcript_content:
+        return transcript_content.text.strip()
+    return None
+
+
+def _lxml_text(element, parts, preserve=False):
+    if isinstance(element.tag, str) and element.tag not in SKIP_TAGS:
+        child_preserve = preserve or element.tag in PRESERVE_WHITESPACE_TAGS
+        if element.text:
+            parts.append(element.text if child_preserve else _collapse_whitespace(element.text))
+        for child in element:
+            _lxml_text(child, parts, child_preserve)
+    if element.tail:
+        parts.append(element.tail if preserve else _collapse_whitespace(element.tail))
+
+
+def extract_lxml(content):
+    import lxml.html
+    # Giải mã trước như extract_targeted: với bytes không có <meta charset>, lxml tự đoán Latin-1
+    html = _decode(content)
+    if html is None:
+        return extract_bs4(content)
+    tree = lxml.html.document_fromstring(html)
+    sections = tree.xpath(f"//section[normalize-space(@class)='{TRANSCRIPT_CLASS}']")
+    if not sections:
+        return None
+    section = sections[0]
+    parts = [_collapse_whitespace(section.text or '')]
+    for child in section:
+        _lxml_text(child, parts)
+    return ''.join(parts).strip()
+
+
+def lxml_available():
+    try:
+        import lxml.html  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+EXTRACTORS = {
+    'targeted': extract_targeted,
+    'lxml': extract_lxml,
+    'bs4': extract_bs4,
+}
+
+def extract_auto(content):
+    text = extract_targeted(content)
+    if text is None:
+        return extract_bs4(content)
+    return text
+
+
+_active = extract_auto
+
+
+def select_extractor(name='auto'):
+    global _active
+    if name == 'auto':
+        _active = extract_auto
+    elif name == 'lxml' and not lxml_available():
+        raise RuntimeError("Extractor lxml cần thư viện lxml: pip install lxml")
+    else:
+        _active = EXTRACTORS[name]
+    return _active
+
+
+def extract_transcript(content):
+    return _active(content)
+
+
+def check_parity(fixtures_dir, names=None):
+    names = names or [name for name in EXTRACTORS if name != 'lxml' or lxml_available()]
+    mismatches = []
+    files = sorted(f for f in os.listdir(fixtures_dir) if f.endswith('.html'))
+    for file in files:
+        with open(os.path.join(fixtures_dir, file), 'rb') as f:
+            content = f.read()
+        expected = extract_bs4(content)
+        for name in names:
+            actual = EXTRACTORS[name](content)
+            if actual != expected:
+                mismatches.append((file, name, expected, actual))
+    return files, mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check transcript extractors against saved HTML fixtures")
+    parser.add_argument("fixtures_dir", nargs="?", default=os.path.join("fixtures", "html"))
+    parser.add_argument("--fetch", nargs="+", metavar="URL", help="Download pages into the fixtures directory first")
+    args = parser.parse_args()
+
+    if args.fetch:
+        import requests
+        os.makedirs(args.fixtures_dir, exist_ok=True)
+        for url in args.fetch:
+            response = requests.get(url, timeout=60)
+            response.raise_for_status()
+            name = url.rstrip('/').rsplit('/', 1)[-1]
+            with open(os.path.join(args.fixtures_dir, f"{name}.html"), 'wb') as f:
+                f.write(response.content)
+
+    files, mismatches = check_parity(args.fixtures_dir)
+    for file, name, expected, actual in mismatches:
+        print(f"MISMATCH {file} [{name}]: expected {len(expected or '')} chars, got {len(actual or '')} chars")
+    print(f"{len(files)} fixtures, {len(mismatches)} mismatches")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
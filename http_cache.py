@@ -0,0 +1,88 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+
+
+class HttpMetadataCache:
+    # Lưu ETag, Last-Modified và sha256 của transcript cho mỗi (year, item)
+    # để lần crawl sau có thể gửi request có điều kiện và bỏ qua trang không đổi.
+    def __init__(self, cache_file, save_every=100):
+        self.cache_file = cache_file
+        self.save_every = save_every
+        self.entries = {}
+        self.dirty = 0
+        self.lock = threading.Lock()
+        self.load()
+
+    @staticmethod
+    def key(year, item):
+        return f"{year}/{item}"
+
+    def load(self):
+        if not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, 'r') as f:
+                self.entries = json.load(f)
+        except json.JSONDecodeError:
+            logging.error(f"Lỗi: File {self.cache_file} không phải là JSON hợp lệ. Tạo cache mới.")
+            self.entries = {}
+
+    def get(self, year, item):
+        with self.lock:
+            return self.entries.get(self.key(year, item))
+
+    def conditional_headers(self, year, item):
+        entry = self.get(year, item)
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def touch(self, year, item):
+        with self.lock:
+            entry = self.entries.get(self.key(year, item))
+            if entry is not None:
+                entry['checked'] = time.time()
+                self._mark_dirty()
+
+    def update(self, year, item, headers, text):
+        # Trả về True nếu nội dung khác với lần lưu trước (cần ghi lại file)
+        digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        with self.lock:
+            previous = self.entries.get(self.key(year, item))
+            self.entries[self.key(year, item)] = {
+                'etag': headers.get('ETag'),
+                'last_modified': headers.get('Last-Modified'),
+                'sha256': digest,
+                'checked': time.time()
+            }
+            self._mark_dirty()
+            return previous is None or previous.get('sha256') != digest
+
+    def _mark_dirty(self):
+        self.dirty += 1
+        if self.dirty >= self.save_every:
+            self._save()
+
+    def _save(self):
+        temp_file = self.cache_file + '.tmp'
+        with open(temp_file, 'w') as f:
+            json.dump(self.entries, f)
+        os.replace(temp_file, self.cache_file)
+        self.dirty = 0
+
+    def save(self):
+        with self.lock:
+            self._save()
+
+    def close(self):
+        with self.lock:
+            if self.dirty:
+                self._save()
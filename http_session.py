@@ -0,0 +1,62 @@
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+REQUEST_ERRORS = (requests.RequestException,) if httpx is None else (requests.RequestException, httpx.HTTPError)
+
+
+def is_transient(error):
+    # Lỗi mạng/timeout và các mã 408/429/5xx đáng thử lại ở lượt sau; 404, 410, 403... thì thử lại cũng vô ích
+    response = getattr(error, 'response', None)
+    if response is None:
+        return True
+    return response.status_code == 408 or response.status_code in RETRY_STATUSES
+
+
+def create_retry(retries=5, backoff_factor=0.5, backoff_jitter=0.5):
+    options = dict(total=retries, connect=retries, read=retries, status=retries,
+                   backoff_factor=backoff_factor, status_forcelist=RETRY_STATUSES,
+                   allowed_methods=frozenset(['GET', 'HEAD']), respect_retry_after_header=True,
+                   raise_on_status=False)
+    try:
+        return Retry(backoff_jitter=backoff_jitter, **options)
+    except TypeError:
+        # urllib3 < 2.0 không hỗ trợ backoff_jitter
+        return Retry(**options)
+
+
+def create_http2_client(pool_size, retries=5):
+    if httpx is None:
+        return None
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return None
+    limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+    transport = httpx.HTTPTransport(http2=True, retries=retries, limits=limits)
+    return httpx.Client(http2=True, transport=transport, follow_redirects=True, timeout=60.0)
+
+
+def create_session(pool_size=10, retries=5, backoff_factor=0.5, backoff_jitter=0.5, http2=False):
+    # Một session dùng chung cho mọi worker: giữ kết nối keep-alive tới gty.org / cdn.gty.org
+    # thay vì mở TCP+TLS mới cho mỗi request.
+    if http2:
+        client = create_http2_client(pool_size, retries)
+        if client is not None:
+            return client
+        logging.warning("HTTP/2 không khả dụng (cần httpx[http2]), dùng requests với HTTP/1.1")
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, pool_block=True,
+                          max_retries=create_retry(retries, backoff_factor, backoff_jitter))
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
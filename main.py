@@ -1,14 +1,24 @@
 import argparse
-import requests
-from bs4 import BeautifulSoup
 import os
 import json
-from concurrent.futures import ThreadPoolExecutor
 import time
 import threading
 from datetime import datetime
 import logging
-from tqdm import tqdm
+from progress_store import ProgressJournal
+from http_cache import HttpMetadataCache
+from extractors import extract_transcript, select_extractor
+from manifest import DirectoryManifest
+from catalog import generate_urls, print_status
+from metrics import REGISTRY, MetricsExporter, Reporter, log_stage_summary
+from bounded_scheduler import BoundedScheduler, ORDERS, year_priority
+from functools import partial
+
+ITEMS_COMPLETED = REGISTRY.counter('items_completed_total', 'Transcripts saved for the first time')
+ITEMS_CHECKED = REGISTRY.counter('items_checked_total', 'Already saved transcripts re-checked')
+ITEMS_FAILED = REGISTRY.counter('items_failed_total', 'Transcripts that could not be fetched or parsed')
+BYTES_FETCHED = REGISTRY.counter('bytes_fetched_total', 'Response body bytes received')
+HTTP_RETRIES = REGISTRY.counter('http_retries_total', 'Requests retried by the HTTP client')
 
 class ProgressTracker:
     def __init__(self, progress_file, total_urls):
@@ -18,20 +28,34 @@ class ProgressTracker:
         self.progress = {}
         self.year_counts = {}
         self.lock = threading.Lock()
+        self.journal = ProgressJournal(progress_file)
         self.load_progress()
         self.start_time = datetime.now()
         self.total_urls = total_urls
+        from tqdm import tqdm
         self.pbar = tqdm(total=total_urls, unit="file")
 
     def increment_downloads(self, year, number):
         with self.lock:
-            self.successful_downloads += 1
-            if year not in self.progress:
-                self.progress[year] = []
-            self.progress[year].append(number)
-            self.year_counts[year] = self.year_counts.get(year, 0) + 1
-            self.save_progress()
+            if self.journal.append(year, number):
+                self.successful_downloads = self.journal.successful_downloads
+                self.year_counts[year] = self.year_counts.get(year, 0) + 1
+            self.pbar.update(1)
+        ITEMS_COMPLETED.inc()
+
+    def is_done(self, year, number):
+        return self.journal.contains(year, number)
+
+    def pending_urls(self, urls):
+        pending = [url_info for url_info in urls if not self.is_done(url_info[1], url_info[2])]
+        with self.lock:
+            self.pbar.reset(total=len(pending))
+        return pending
+
+    def mark_checked(self):
+        with self.lock:
             self.pbar.update(1)
+        ITEMS_CHECKED.inc()
 
     def update_current_url(self, url):
         with self.lock:
@@ -43,13 +67,10 @@ class ProgressTracker:
             return self.successful_downloads, self.current_url, self.year_counts
 
     def load_progress(self):
-        if os.path.exists(self.progress_file):
+        if os.path.exists(self.progress_file) or os.path.exists(self.journal.journal_file):
             try:
-                with open(self.progress_file, 'r') as f:
-                    data = json.load(f)
-                    self.successful_downloads = data.get('successful_downloads', 0)
-                    self.progress = data.get('files_success', {})
-                    self.year_counts = {year: len(items) for year, items in self.progress.items()}
+                self.successful_downloads, self.progress = self.journal.load()
+                self.year_counts = {year: len(items) for year, items in self.progress.items()}
             except json.JSONDecodeError:
                 logging.error(f"Lỗi: File {self.progress_file} không phải là JSON hợp lệ. Tạo file progress mới.")
                 self.reset_progress()
@@ -61,131 +82,160 @@ class ProgressTracker:
             self.reset_progress()
 
     def reset_progress(self):
+        self.journal.reset()
         self.successful_downloads = 0
-        self.progress = {}
+        self.progress = self.journal.progress
         self.year_counts = {}
 
     def save_progress(self):
-        with open(self.progress_file, 'w') as f:
-            json.dump({
-                'successful_downloads': self.successful_downloads,
-                'files_success': self.progress
-            }, f, indent=2)
+        self.journal.compact()
 
     def get_session_time(self):
         return str(datetime.now() - self.start_time).split('.')[0]
 
     def close(self):
+        self.journal.close()
         self.pbar.close()
 
-def extract_text_from_gty(url, filename, tracker, year, number):
+def parse_transcript(content):
+    return extract_transcript(content)
+
+def save_transcript(filename, text, manifest=None, pack=None, hooks=()):
+    year = os.path.basename(os.path.dirname(filename))
+    number = os.path.splitext(os.path.basename(filename))[0]
+    if pack is not None:
+        pack.add(year, number, text)
+    else:
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        temp_file = filename + '.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(temp_file, filename)
+        if manifest is not None:
+            manifest.record(filename)
+    for hook in hooks:
+        try:
+            hook.on_transcript_saved(year, number, text)
+        except Exception as e:
+            logging.error(f"Lỗi khi cập nhật {type(hook).__name__} cho {filename}: {str(e)}")
+
+def extract_text_from_gty(url, filename, tracker, year, number, session=None, cache=None, manifest=None, pack=None, hooks=()):
+    # requests chỉ được nạp khi thật sự tải, để --status và --help khởi động nhanh
+    import requests
+    from http_session import REQUEST_ERRORS, is_transient
     try:
         tracker.update_current_url(url)
-        response = requests.get(url)
+        headers = {}
+        exists = pack.contains(year, number) if pack is not None else os.path.exists(filename)
+        if cache is not None and exists:
+            headers = cache.conditional_headers(year, number)
+        with REGISTRY.span('fetch'):
+            response = (session or requests).get(url, headers=headers, timeout=60)
+        REGISTRY.counter('http_responses_total', 'Responses by status code', status=str(response.status_code)).inc()
+        retries = getattr(getattr(response, 'raw', None), 'retries', None)
+        if retries is not None and retries.history:
+            HTTP_RETRIES.inc(len(retries.history))
+        if response.status_code == 304:
+            cache.touch(year, number)
+            tracker.mark_checked()
+            logging.info(f"Không thay đổi: {url}")
+            return True
         response.raise_for_status()
-        soup = BeautifulSoup(response.content, 'html.parser')
-
-        transcript_content = soup.find('section', class_='transcript-content gty-writing-content')
-
-        if transcript_content:
-            text = transcript_content.text.strip()
-            if text:
-                os.makedirs(os.path.dirname(filename), exist_ok=True)
-                with open(filename, 'w', encoding='utf-8') as f:
-                    f.write(text)
+        BYTES_FETCHED.inc(len(response.content))
+        with REGISTRY.span('parse'):
+            text = parse_transcript(response.content)
+        if text:
+            changed = cache is None or cache.update(year, number, response.headers, text)
+            if changed or not exists:
+                with REGISTRY.span('save'):
+                    save_transcript(filename, text, manifest, pack, hooks)
+            if tracker.is_done(year, number):
+                tracker.mark_checked()
+                if changed:
+                    logging.info(f"Đã cập nhật transcript thay đổi: {url}")
+            else:
                 tracker.increment_downloads(year, number)
                 logging.info(f"Đã lưu thành công: {url}")
-                return True
+            return True
         logging.warning(f"Không tìm thấy nội dung cho URL: {url}")
         return False
-    except requests.RequestException as e:
+    except REQUEST_ERRORS as e:
         logging.error(f"Lỗi khi truy cập URL {url}: {str(e)}")
-        return False
+        # None: lỗi vĩnh viễn (vd. 404), process_url báo cho vòng --retries bỏ qua item này
+        return False if is_transient(e) else None
     except Exception as e:
         logging.error(f"Lỗi không xác định khi xử lý URL {url}: {str(e)}")
         return False
 
-def process_url(url_info, output_dir, tracker):
+def process_url(url_info, output_dir, tracker, session=None, cache=None, refresh=False, manifest=None, pack=None, hooks=(), delay=0.5):
     url, year, number = url_info
-    if year in tracker.progress and number in tracker.progress[year]:
-        logging.info(f"Bỏ qua URL đã xử lý: {url}")
+    if not refresh and tracker.is_done(year, number):
         return False, None
 
     year_dir = os.path.join(output_dir, year)
     filename = os.path.join(year_dir, f"{number}.txt")
-    success = extract_text_from_gty(url, filename, tracker, year, number)
-    if not success and os.path.exists(filename):
+    success = extract_text_from_gty(url, filename, tracker, year, number, session, cache, manifest, pack, hooks)
+    if not success:
+        ITEMS_FAILED.inc()
+    if not success and not refresh and os.path.exists(filename):
         os.remove(filename)
-    time.sleep(0.5)  # Nghỉ 1 giây sau mỗi lần tải
-    return success, filename
-
-def print_progress(tracker, total_urls, stop_event):
-    while not stop_event.is_set():
-        downloads, current_url, year_counts = tracker.get_stats()
-        session_time = tracker.get_session_time()
-        elapsed_time = time.time() - tracker.start_time.timestamp()
-        speed = downloads / elapsed_time if elapsed_time > 0 else 0
-        estimated_time = (total_urls - downloads) / speed if speed > 0 else 0
-        
-        print(f"\rTiến độ: {downloads}/{total_urls} | Tốc độ: {speed:.2f} file/s | Ước tính còn lại: {estimated_time:.0f}s", end="")
-        time.sleep(1)  # Cập nhật mỗi giây
-
-def count_files_in_directories(base_dir):
-    total_files = 0
-    dir_counts = {}
-
-    for root, dirs, files in os.walk(base_dir):
-        dir_name = os.path.basename(root)
-        if dir_name.isdigit():  # Chỉ đếm trong thư mục năm
-            file_count = len(files)
-            dir_counts[dir_name] = file_count
-            total_files += file_count
-
-    return dir_counts, total_files
-
-def generate_urls_from_json(json_file):
-    with open(json_file, 'r') as f:
-        data = json.load(f)
-    
-    urls = []
-    base_url = "https://www.gty.org/library/sermons-library/{}"
-    
-    for year, year_data in data.items():
-        for item in year_data['items']:
-            url = base_url.format(item)
-            urls.append((url, year, item))
-    
-    return urls
-
-
-
-def generate_urls_from_json(json_file, start_year=None, end_year=None, specific_url=None):
-    with open(json_file, 'r') as f:
-        data = json.load(f)
-    
-    urls = []
-    base_url = "https://www.gty.org/library/sermons-library/{}"
-    
-    for year, year_data in data.items():
-        if start_year and int(year) < start_year:
-            continue
-        if end_year and int(year) > end_year:
-            break
-        
-        for item in year_data['items']:
-            url = base_url.format(item)
-            if specific_url and url != specific_url:
-                continue
-            urls.append((url, year, item))
-    
-    return urls
+    if delay:
+        time.sleep(delay)  # Nghỉ sau mỗi lần tải để không dồn request lên gty.org
+    # filename None: không có gì để thử lại (đã xong từ trước hoặc lỗi vĩnh viễn)
+    return bool(success), filename if success is not None else None
+
+def print_progress(tracker, total_urls):
+    # Chạy trong thread Reporter mỗi giây; chỉ đọc counter nên không tranh lock với worker
+    downloads = ITEMS_COMPLETED.value()
+    elapsed_time = time.time() - tracker.start_time.timestamp()
+    speed = downloads / elapsed_time if elapsed_time > 0 else 0
+    estimated_time = (total_urls - downloads) / speed if speed > 0 else 0
+    print(f"\rTiến độ: {downloads}/{total_urls} | Tốc độ: {speed:.2f} file/s | Ước tính còn lại: {estimated_time:.0f}s", end="")
+
+def count_files_in_directories(base_dir, manifest=None):
+    manifest = manifest or DirectoryManifest(base_dir, '.txt')
+    manifest.refresh()
+    dir_counts = manifest.year_counts()
+    return dir_counts, sum(dir_counts.values())
+
 def main():
     parser = argparse.ArgumentParser(description="Scrape sermons from GTY.org")
     parser.add_argument("--url", help="Specific URL to scrape")
     parser.add_argument("--year", type=int, help="Specific year to scrape")
     parser.add_argument("--start-year", type=int, help="Start year for scraping range")
     parser.add_argument("--end-year", type=int, help="End year for scraping range")
+    parser.add_argument("--catalog", default="combined_gty_sermons.json",
+                        help="Catalog file (e.g. the delta written by catalog_crawler.py)")
+    parser.add_argument("--extractor", choices=["auto", "targeted", "lxml", "bs4"], default="auto",
+                        help="Transcript extractor (auto = targeted parser with BeautifulSoup fallback)")
+    parser.add_argument("--pack", help="Write transcripts into this compressed corpus pack instead of loose .txt files")
+    parser.add_argument("--index", help="Update this full-text index database as transcripts are saved")
+    parser.add_argument("--scripture-index", help="Update this verse-to-sermon index database as transcripts are saved")
+    parser.add_argument("--normalize", help="Also write a normalized copy of each saved transcript into this directory")
+    parser.add_argument("--dedup-store", help="Content-addressed store directory; identical transcripts share one blob")
+    parser.add_argument("--refresh", action="store_true", help="Re-check already downloaded transcripts with conditional GET")
+    parser.add_argument("--http2", action="store_true", help="Use HTTP/2 when httpx[http2] is installed")
+    parser.add_argument("--engine", choices=["thread", "async"], default="thread", help="Scraping engine")
+    parser.add_argument("--rps", type=float, default=2.0, help="Requests per second budget for gty.org (async engine)")
+    parser.add_argument("--max-in-flight", type=int, default=4, help="Maximum concurrent requests per host (async engine)")
+    parser.add_argument("--metrics-file", help="Export metrics here periodically (.prom = Prometheus textfile, otherwise JSONL)")
+    parser.add_argument("--metrics-interval", type=float, default=15.0, help="Seconds between metrics exports")
+    parser.add_argument("--delay", type=float, default=0.5, help="Seconds to pause after each transcript (thread engine)")
+    parser.add_argument("--order", choices=ORDERS, default="catalog", help="Processing order: catalog order, newest or oldest years first (thread engine)")
+    parser.add_argument("--window", type=int, help="Maximum queued + running tasks (default: 2 x workers, thread engine)")
+    parser.add_argument("--retries", type=int, default=0, help="Retry URLs that failed with a transient error (timeout, 408/429/5xx) this many times, after all other URLs (thread engine)")
+    parser.add_argument("--status", action="store_true", help="Print per-year progress against the catalog and exit")
     args = parser.parse_args()
+    if args.status:
+        print_status(args.catalog, "progress.json")
+        return
+    if args.engine == "async":
+        # Engine async tự xếp hàng theo --rps/--max-in-flight, không đi qua BoundedScheduler
+        for flag, used in (("--refresh", args.refresh), ("--order", args.order != "catalog"),
+                           ("--window", args.window is not None), ("--retries", args.retries)):
+            if used:
+                parser.error(f"{flag} chỉ hỗ trợ engine thread")
+    select_extractor(args.extractor)
     log_file = "gty_scraper.log"
     logging.basicConfig(filename=log_file, level=logging.INFO,
                         format='%(asctime)s - %(levelname)s - %(message)s')
@@ -193,28 +243,79 @@ def main():
     output_dir = "gty_sermons"
     os.makedirs(output_dir, exist_ok=True)
     progress_file = "progress.json"
-    json_file = "combined_gty_sermons.json"
+    json_file = args.catalog
     if args.url:
-        urls = generate_urls_from_json(json_file, specific_url=args.url)
+        urls = generate_urls(json_file, 'text', specific_url=args.url)
     elif args.year:
-        urls = generate_urls_from_json(json_file, start_year=args.year, end_year=args.year)
+        urls = generate_urls(json_file, 'text', start_year=args.year, end_year=args.year)
     elif args.start_year and args.end_year:
-        urls = generate_urls_from_json(json_file, start_year=args.start_year, end_year=args.end_year)
+        urls = generate_urls(json_file, 'text', start_year=args.start_year, end_year=args.end_year)
     else:
-        urls = generate_urls_from_json(json_file)
+        urls = generate_urls(json_file, 'text')
     total_urls = len(urls)
     tracker = ProgressTracker(progress_file, total_urls)
     logging.info(f"Đã tạo {total_urls} URLs")
-    stop_event = threading.Event()
-    progress_thread = threading.Thread(target=print_progress, args=(tracker, total_urls, stop_event))
-    progress_thread.start()
+    if args.refresh:
+        pending_urls = urls
+        tracker.pbar.reset(total=total_urls)
+        logging.info(f"Kiểm tra lại {total_urls} URL bằng conditional GET")
+    else:
+        pending_urls = tracker.pending_urls(urls)
+        logging.info(f"Bỏ qua {total_urls - len(pending_urls)} URL đã xử lý, còn {len(pending_urls)} URL cần tải")
+    cache = HttpMetadataCache("http_cache.json")
+    manifest = DirectoryManifest(output_dir, '.txt')
+    pack = None
+    if args.pack:
+        from corpus_pack import CorpusPackWriter
+        pack = CorpusPackWriter(args.pack)
+    hooks = []
+    if args.index:
+        from text_index import TranscriptIndex
+        hooks.append(TranscriptIndex(args.index))
+    if args.scripture_index:
+        from scripture import ScriptureIndex
+        hooks.append(ScriptureIndex(args.scripture_index))
+    if args.dedup_store:
+        from content_store import ContentStore
+        hooks.append(ContentStore(args.dedup_store, text_dir=None if pack is not None else output_dir))
+    if args.normalize:
+        from transcript_normalizer import TranscriptNormalizer
+        hooks.append(TranscriptNormalizer(args.normalize))
+    total_pending = len(pending_urls)
+    REGISTRY.gauge('queue_depth', 'Items not yet processed in this run',
+                   function=lambda: total_pending - ITEMS_COMPLETED.value() - ITEMS_CHECKED.value() - ITEMS_FAILED.value())
+    reporter = Reporter().every(1.0, partial(print_progress, tracker, total_pending))
+    if args.metrics_file:
+        reporter.every(args.metrics_interval, MetricsExporter(REGISTRY, args.metrics_file).export)
+    reporter.start()
+    max_workers = 1
+    from http_session import create_session
+    session = create_session(pool_size=max_workers, http2=args.http2)
     try:
-        with ThreadPoolExecutor(max_workers=1) as executor:
-            results = list(executor.map(lambda url_info: process_url(url_info, output_dir, tracker), urls))
+        if args.engine == "async":
+            from async_engine import scrape_async
+            scrape_async(pending_urls, output_dir, tracker, parse_transcript, partial(save_transcript, manifest=manifest, pack=pack, hooks=hooks),
+                                   rps=args.rps, max_in_flight=args.max_in_flight)
+        else:
+            attempts = {}
+            with BoundedScheduler(max_workers, args.window, year_priority(args.order), on_abort=tracker.journal.flush) as scheduler:
+                for url_info, future in scheduler.map(lambda url_info: process_url(url_info, output_dir, tracker, session, cache, args.refresh, manifest, pack, hooks, args.delay), pending_urls):
+                    success, filename = future.result()
+                    if not success and filename is not None and attempts.get(url_info[0], 0) < args.retries:
+                        attempts[url_info[0]] = attempts.get(url_info[0], 0) + 1
+                        scheduler.requeue(url_info)
+                if scheduler.stopping:
+                    logging.info("Đã dừng theo yêu cầu; các URL còn lại sẽ được tải ở lần chạy sau")
     finally:
-        stop_event.set()
-        progress_thread.join()
+        session.close()
+        cache.close()
+        if pack is not None:
+            pack.close()
+        for hook in hooks:
+            hook.close()
+        reporter.stop()
         tracker.close()
+    log_stage_summary()
     successful_downloads, _, year_counts = tracker.get_stats()
     print("\n")  # Xuống dòng sau khi hoàn thành
     logging.info(f"Tổng số URL đã xử lý: {total_urls}")
@@ -223,7 +324,8 @@ def main():
     logging.info("Số lượng item đã lưu cho mỗi năm:")
     for year, count in sorted(year_counts.items()):
         logging.info(f"{year}: {count}")
-    dir_counts, total_files = count_files_in_directories(output_dir)
+    dir_counts, total_files = count_files_in_directories(output_dir, manifest)
+    manifest.close()
     print("\nSố lượng bài giảng trong mỗi năm:")
     for year, count in sorted(dir_counts.items()):
         print(f"{year}: {count}")
@@ -0,0 +1,147 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+
+
+class DirectoryManifest:
+    # Chỉ mục bền vững cho cây <base_dir>/<year>/<item><extension>:
+    # (year, item) -> [size, mtime_ns, sha256]. Khi refresh chỉ quét lại những thư mục năm
+    # có mtime thay đổi (thêm/xoá/đổi tên file), thay vì os.walk toàn bộ cây.
+    # Các downloader ghi file bằng os.replace nên mọi file mới đều làm đổi mtime thư mục.
+    def __init__(self, base_dir, extension, manifest_file=None, with_hash=False, save_every=200):
+        self.base_dir = base_dir
+        self.extension = extension
+        self.manifest_file = manifest_file or os.path.normpath(base_dir) + '.manifest.json'
+        self.with_hash = with_hash
+        self.save_every = save_every
+        self.years = {}
+        self.stale_years = set()
+        self.dirty = 0
+        self.lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.manifest_file):
+            return
+        try:
+            with open(self.manifest_file, 'r') as f:
+                data = json.load(f)
+            if data.get('extension') == self.extension:
+                self.years = data.get('years', {})
+        except (json.JSONDecodeError, OSError) as e:
+            logging.warning(f"Không đọc được manifest {self.manifest_file}: {str(e)}. Quét lại từ đầu.")
+            self.years = {}
+
+    def _save(self):
+        # Ghi lại mtime cho các năm có file mới từ record(): mỗi năm một lần liệt kê thư mục mỗi lần lưu,
+        # không phải mỗi file
+        for year in self.stale_years:
+            if year in self.years:
+                try:
+                    self._stamp_year(year, os.path.join(self.base_dir, year))
+                except OSError as e:
+                    logging.warning(f"Không đọc được thư mục năm {year}: {str(e)}")
+        self.stale_years.clear()
+        temp_file = self.manifest_file + '.tmp'
+        with open(temp_file, 'w') as f:
+            json.dump({'extension': self.extension, 'years': self.years}, f)
+        os.replace(temp_file, self.manifest_file)
+        self.dirty = 0
+
+    def save(self):
+        with self.lock:
+            if self.dirty:
+                self._save()
+
+    @staticmethod
+    def _hash_file(path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _entry(self, path, stat, previous=None):
+        digest = None
+        if self.with_hash:
+            if previous and previous[0] == stat.st_size and previous[1] == stat.st_mtime_ns and previous[2]:
+                digest = previous[2]
+            else:
+                digest = self._hash_file(path)
+        return [stat.st_size, stat.st_mtime_ns, digest]
+
+    def _scan_year(self, year, year_path, mtime_ns):
+        previous = self.years.get(year, {}).get('items', {})
+        items = {}
+        with os.scandir(year_path) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(self.extension):
+                    item = entry.name[:-len(self.extension)]
+                    items[item] = self._entry(entry.path, entry.stat(), previous.get(item))
+        self.years[year] = {'mtime_ns': mtime_ns, 'items': items}
+
+    def refresh(self):
+        with self.lock:
+            seen = set()
+            if os.path.isdir(self.base_dir):
+                with os.scandir(self.base_dir) as entries:
+                    for entry in entries:
+                        if not entry.is_dir() or not entry.name.isdigit():
+                            continue
+                        seen.add(entry.name)
+                        mtime_ns = entry.stat().st_mtime_ns
+                        if self.years.get(entry.name, {}).get('mtime_ns') != mtime_ns:
+                            self._scan_year(entry.name, entry.path, mtime_ns)
+                            self.dirty += 1
+            for year in list(self.years):
+                if year not in seen:
+                    del self.years[year]
+                    self.dirty += 1
+            if self.dirty:
+                self._save()
+
+    def _stamp_year(self, year, year_path):
+        # os.replace của downloader làm đổi mtime thư mục năm. Lấy mtime trước rồi mới liệt kê tên file:
+        # nếu trên đĩa đúng bằng các item trong manifest thì không có thay đổi nào khác, ghi lại mtime
+        # để lần refresh sau không phải quét lại năm này; thay đổi xảy ra sau lúc stat vẫn làm lệch mtime.
+        year_entry = self.years[year]
+        mtime_ns = os.stat(year_path).st_mtime_ns
+        with os.scandir(year_path) as entries:
+            names = {entry.name[:-len(self.extension)] for entry in entries
+                     if entry.name.endswith(self.extension) and entry.is_file()}
+        if names == year_entry['items'].keys():
+            year_entry['mtime_ns'] = mtime_ns
+
+    def record(self, path):
+        # Gọi từ downloader ngay sau khi ghi xong file
+        year = os.path.basename(os.path.dirname(path))
+        item = os.path.basename(path)[:-len(self.extension)]
+        stat = os.stat(path)
+        with self.lock:
+            year_entry = self.years.setdefault(year, {'mtime_ns': None, 'items': {}})
+            year_entry['items'][item] = self._entry(path, stat, year_entry['items'].get(item))
+            self.stale_years.add(year)
+            self.dirty += 1
+            if self.dirty >= self.save_every:
+                self._save()
+
+    def path(self, year, item):
+        return os.path.join(self.base_dir, year, f"{item}{self.extension}")
+
+    def items(self):
+        with self.lock:
+            return {(year, item): self.path(year, item)
+                    for year, year_entry in self.years.items() for item in year_entry['items']}
+
+    def get(self, year, item):
+        with self.lock:
+            return self.years.get(year, {}).get('items', {}).get(item)
+
+    def year_counts(self):
+        with self.lock:
+            return {year: len(year_entry['items']) for year, year_entry in self.years.items()}
+
+    def close(self):
+        self.save()
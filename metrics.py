@@ -0,0 +1,276 @@
+import os
+import json
+import time
+import logging
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Giới hạn trên (giây) của các bucket histogram thời gian
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class _Sharded:
+    # Mỗi thread ghi vào ô riêng của mình (không cần lock); khi đọc thì cộng tất cả các ô.
+    # Lock chỉ dùng một lần khi thread đăng ký ô mới. new_shard: hàm tạo ô rỗng cho một thread.
+    def __init__(self, new_shard):
+        self._new_shard = new_shard
+        self._local = threading.local()
+        self._shards = []
+        self._register_lock = threading.Lock()
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._new_shard()
+            with self._register_lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+        return shard
+
+
+class Counter(_Sharded):
+    kind = 'counter'
+
+    def __init__(self, name, help='', labels=None):
+        super().__init__(lambda: [0])
+        self.name = name
+        self.help = help
+        self.labels = labels or {}
+
+    def inc(self, amount=1):
+        self._shard()[0] += amount
+
+    def value(self):
+        return sum(shard[0] for shard in list(self._shards))
+
+
+class Gauge:
+    # Giá trị đặt trực tiếp hoặc tính lúc export (ví dụ độ sâu hàng đợi = tổng - đã xong)
+    kind = 'gauge'
+
+    def __init__(self, name, help='', labels=None, function=None):
+        self.name = name
+        self.help = help
+        self.labels = labels or {}
+        self.function = function
+        self._value = 0
+
+    def set(self, value):
+        self._value = value
+
+    def value(self):
+        return self.function() if self.function is not None else self._value
+
+
+class Histogram(_Sharded):
+    kind = 'histogram'
+
+    def __init__(self, name, help='', labels=None, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        size = len(self.buckets) + 1
+        # Ô: [đếm theo bucket..., đếm vượt bucket cuối, tổng, số lần]
+        super().__init__(lambda: [0] * size + [0.0, 0])
+        self.name = name
+        self.help = help
+        self.labels = labels or {}
+
+    def observe(self, value):
+        shard = self._shard()
+        shard[bisect_left(self.buckets, value)] += 1
+        shard[-2] += value
+        shard[-1] += 1
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def snapshot(self):
+        totals = [0] * (len(self.buckets) + 3)
+        for shard in list(self._shards):
+            for i, value in enumerate(shard):
+                totals[i] += value
+        return totals[:-2], totals[-2], totals[-1]
+
+    def quantile(self, fraction, snapshot=None):
+        # Ước lượng từ bucket: trả về giới hạn trên của bucket chứa phân vị
+        counts, _, count = snapshot or self.snapshot()
+        if not count:
+            return 0.0
+        rank = fraction * count
+        seen = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            seen += bucket_count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+class Registry:
+    def __init__(self, prefix='gty'):
+        self.prefix = prefix
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def _get(self, cls, name, help, labels, **options):
+        name = f"{self.prefix}_{name}" if self.prefix else name
+        key = (name, tuple(sorted(labels.items())))
+        metric = self.metrics.get(key)
+        if metric is None:
+            with self.lock:
+                metric = self.metrics.get(key)
+                if metric is None:
+                    metric = cls(name, help, labels, **options)
+                    self.metrics[key] = metric
+        return metric
+
+    def counter(self, name, help='', **labels):
+        return self._get(Counter, name, help, labels)
+
+    def gauge(self, name, help='', function=None, **labels):
+        gauge = self._get(Gauge, name, help, labels, function=function)
+        if function is not None:
+            # Đăng ký lại (vd. lần chạy sau trong cùng process) thay closure cũ, nếu không gauge
+            # sẽ tiếp tục đọc hàng đợi/scheduler của lần chạy trước
+            gauge.function = function
+        return gauge
+
+    def histogram(self, name, help='', buckets=LATENCY_BUCKETS, **labels):
+        return self._get(Histogram, name, help, labels, buckets=buckets)
+
+    @contextmanager
+    def span(self, stage):
+        # Đo thời gian một giai đoạn (fetch, parse, save, download, pair...) của mỗi item
+        with self.histogram('stage_seconds', 'Time spent per pipeline stage', stage=stage).time():
+            yield
+
+    def stage_summary(self):
+        # {stage: (số lần, tổng giây)} để biết thời gian của lần chạy dồn vào đâu
+        summary = {}
+        for (name, labels), metric in list(self.metrics.items()):
+            if name.endswith('_stage_seconds'):
+                _, total, count = metric.snapshot()
+                summary[dict(labels)['stage']] = (count, total)
+        return summary
+
+    def collect(self):
+        return [metric for _, metric in sorted(self.metrics.items(), key=lambda x: x[0])]
+
+
+def _format_labels(labels, extra=None):
+    items = list(labels.items()) + list((extra or {}).items())
+    if not items:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in items) + '}'
+
+
+def render_prometheus(registry):
+    lines = []
+    described = set()
+    for metric in registry.collect():
+        if metric.name not in described:
+            described.add(metric.name)
+            if metric.help:
+                lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+        if metric.kind == 'histogram':
+            counts, total, count = metric.snapshot()
+            cumulative = 0
+            for bound, bucket_count in zip(metric.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"{metric.name}_bucket{_format_labels(metric.labels, {'le': le})} {cumulative}")
+            lines.append(f"{metric.name}_sum{_format_labels(metric.labels)} {total}")
+            lines.append(f"{metric.name}_count{_format_labels(metric.labels)} {count}")
+        else:
+            lines.append(f"{metric.name}{_format_labels(metric.labels)} {metric.value()}")
+    return "\n".join(lines) + "\n"
+
+
+def render_json(registry):
+    values = {}
+    for metric in registry.collect():
+        key = metric.name + _format_labels(metric.labels)
+        if metric.kind == 'histogram':
+            snapshot = metric.snapshot()
+            values[key] = {'count': snapshot[2], 'sum': round(snapshot[1], 6),
+                           'p50': metric.quantile(0.5, snapshot), 'p99': metric.quantile(0.99, snapshot)}
+        else:
+            values[key] = metric.value()
+    return {'time': time.time(), 'metrics': values}
+
+
+class MetricsExporter:
+    # File .prom: ghi đè nguyên tử cho textfile collector của node_exporter.
+    # Đuôi khác: nối thêm một dòng JSON mỗi lần export (JSONL).
+    def __init__(self, registry, path):
+        self.registry = registry
+        self.path = path
+        self.prometheus = path.endswith('.prom')
+
+    def export(self):
+        try:
+            if self.prometheus:
+                temp_file = self.path + '.tmp'
+                with open(temp_file, 'w') as f:
+                    f.write(render_prometheus(self.registry))
+                os.replace(temp_file, self.path)
+            else:
+                with open(self.path, 'a') as f:
+                    f.write(json.dumps(render_json(self.registry)) + "\n")
+        except OSError as e:
+            logging.error(f"Lỗi khi ghi metrics ra {self.path}: {str(e)}")
+
+
+class Reporter:
+    # Một thread nền duy nhất chạy các tác vụ định kỳ (hiển thị tiến độ, export metrics).
+    # Các tác vụ chỉ đọc metrics nên không tranh lock với worker.
+    def __init__(self, tick=1.0):
+        self.tick = tick
+        self.tasks = []
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def every(self, interval, func):
+        self.tasks.append([interval, func, time.monotonic() + interval])
+        return self
+
+    def _run(self):
+        while not self.stop_event.wait(self.tick):
+            now = time.monotonic()
+            for task in self.tasks:
+                if now >= task[2]:
+                    task[2] = now + task[0]
+                    try:
+                        task[1]()
+                    except Exception as e:
+                        logging.error(f"Lỗi trong tác vụ định kỳ {getattr(task[1], '__name__', task[1])}: {str(e)}")
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self, final=True):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+        if final:
+            for _, func, _ in self.tasks:
+                try:
+                    func()
+                except Exception as e:
+                    logging.error(f"Lỗi trong tác vụ định kỳ {getattr(func, '__name__', func)}: {str(e)}")
+
+
+REGISTRY = Registry()
+
+
+def log_stage_summary(registry=REGISTRY):
+    for stage, (count, total) in sorted(registry.stage_summary().items(), key=lambda x: -x[1][1]):
+        average = total / count * 1000 if count else 0
+        logging.info(f"Giai đoạn {stage}: {count} lần, tổng {total:.1f}s, trung bình {average:.1f}ms")
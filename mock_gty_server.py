@@ -0,0 +1,300 @@
+import re
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LISTING_PATH = re.compile(r'^/library/sermons-library/date\?year=(\d+)&page=(\d+)')
+LISTING_PAGE_SIZE = 20
+PAGE_PATH = re.compile(r'^/library/sermons-library/([^/?#]+)')
+AUDIO_PATH = re.compile(r'^/sermons/High/([^/?#]+)\.mp3')
+RANGE_HEADER = re.compile(r'bytes=(\d*)-(\d*)')
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz, stereo, không padding: mỗi frame dài 417 bytes
+MP3_FRAME_HEADER = b'\xff\xfb\x90\x00'
+MP3_FRAME_SIZE = 417
+
+WORDS = ("the Lord grace faith church Christ Scripture truth gospel God heart sin love righteousness "
+         "kingdom spirit prayer judgment mercy salvation believer world word life death hope people "
+         "and of to in that is we you it for not this with he was").split()
+REFERENCES = ["Matthew 7:21", "Romans 8:28-30", "John 3:16", "Ephesians 2", "Matthew 7 beginning at verse 21",
+              "the fourth chapter of Acts", "1 Corinthians 13", "Psalm 23"]
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html lang="en">
+<head><meta charset="utf-8"><title>{title} | Grace to You</title>
+<script>window.dataLayer = [];</script></head>
+<body>
+<nav><ul><li><a href="/library">Library</a></li></ul></nav>
+<main><section class="sermon-header"><h1>{title}</h1></section>
+<section class="transcript-content gty-writing-content">
+{paragraphs}
+</section>
+<footer><p>Copyright Grace to You</p></footer></main>
+</body>
+</html>
+"""
+
+
+@lru_cache(maxsize=256)
+def sermon_page(item, size):
+    rng = random.Random(f"page:{item}")
+    paragraphs = []
+    length = 0
+    while length < size:
+        words = [rng.choice(WORDS) for _ in range(rng.randint(60, 160))]
+        words.insert(rng.randrange(len(words)), rng.choice(REFERENCES))
+        paragraph = f"  <p>{' '.join(words).capitalize()}.</p>"
+        paragraphs.append(paragraph)
+        length += len(paragraph)
+    return PAGE_TEMPLATE.format(title=f"Sermon {item}", paragraphs="\n".join(paragraphs)).encode('utf-8')
+
+
+@lru_cache(maxsize=64)
+def audio_payload(item, size):
+    rng = random.Random(f"audio:{item}")
+    # Làm tròn xuống số frame nguyên để file hợp lệ khi kiểm tra bằng audio_verifier.py
+    frames = []
+    for _ in range(max(1, size // MP3_FRAME_SIZE)):
+        frames.append(MP3_FRAME_HEADER + rng.randbytes(MP3_FRAME_SIZE - len(MP3_FRAME_HEADER)))
+    return b''.join(frames)
+
+
+@lru_cache(maxsize=256)
+def etag_for(data):
+    return '"' + hashlib.md5(data).hexdigest() + '"'
+
+
+class ServerConfig:
+    def __init__(self, page_kb=40, audio_kb=1024, latency=0.0, jitter=0.0, error_rate=0.0, rps=None,
+                 bandwidth_kb=None, seed=0, catalog=None, bad_audio_rate=0.0):
+        self.page_size = int(page_kb * 1024)
+        self.audio_size = int(audio_kb * 1024)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rps = rps
+        self.bandwidth = bandwidth_kb * 1024 if bandwidth_kb else None
+        self.random = random.Random(seed)
+        self.catalog = catalog or {}
+        self.bad_audio_rate = bad_audio_rate
+        self.bad_items = {}
+        self.tokens = rps or 0
+        self.updated = time.monotonic()
+        self.stats = {'requests': 0, 'bytes_sent': 0, 'throttled': 0, 'errors': 0, 'not_modified': 0, 'bad_audio': 0}
+        self.lock = threading.Lock()
+
+    def admit(self):
+        # Trả về mã lỗi giả lập (429/503) hoặc None nếu request được phục vụ
+        with self.lock:
+            self.stats['requests'] += 1
+            if self.rps:
+                now = time.monotonic()
+                self.tokens = min(self.rps, self.tokens + (now - self.updated) * self.rps)
+                self.updated = now
+                if self.tokens < 1:
+                    self.stats['throttled'] += 1
+                    return 429
+                self.tokens -= 1
+            if self.error_rate and self.random.random() < self.error_rate:
+                self.stats['errors'] += 1
+                return 503
+            delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            time.sleep(delay)
+        return None
+
+    def bad_audio(self, item, head):
+        # Giả lập CDN trả 200 nhưng nội dung là trang lỗi HTML hoặc MP3 bị cắt cụt.
+        # Lỗi chỉ xảy ra ở lần GET đầu tiên của item, lần tải lại nhận file đúng.
+        with self.lock:
+            if item not in self.bad_items:
+                bad = self.bad_audio_rate and self.random.random() < self.bad_audio_rate
+                self.bad_items[item] = self.random.choice(('html', 'truncated')) if bad else None
+            kind = self.bad_items[item]
+            if kind and not head:
+                self.bad_items[item] = None
+                self.stats['bad_audio'] += 1
+            return kind
+
+    def count(self, key, amount=1):
+        with self.lock:
+            self.stats[key] += amount
+
+
+class MockGTYHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'MockGTY/1.0'
+
+    def log_message(self, *args):
+        pass
+
+    def _send_error(self, code):
+        self.send_response(code)
+        if code == 429:
+            self.send_header('Retry-After', '1')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _send_body(self, body):
+        bandwidth = self.server.config.bandwidth
+        chunk_size = 64 * 1024
+        for start in range(0, len(body), chunk_size):
+            chunk = body[start:start + chunk_size]
+            self.wfile.write(chunk)
+            if bandwidth:
+                time.sleep(len(chunk) / bandwidth)
+        self.server.config.count('bytes_sent', len(body))
+
+    def _listing(self, year, page):
+        # Trang danh sách giả lập cho catalog_crawler.py: LISTING_PAGE_SIZE bài mỗi trang
+        items = self.server.config.catalog.get(year, {}).get('items', [])
+        start = (page - 1) * LISTING_PAGE_SIZE
+        links = "\n".join(f'<li><a href="/library/sermons-library/{item}">Sermon {item}</a></li>'
+                          for item in items[start:start + LISTING_PAGE_SIZE])
+        return f"<html><body><ul>\n{links}\n</ul></body></html>".encode('utf-8')
+
+    def _resolve(self):
+        config = self.server.config
+        match = LISTING_PATH.match(self.path)
+        if match:
+            if match.group(1) not in config.catalog:
+                return None, None, False
+            return self._listing(match.group(1), int(match.group(2))), 'text/html; charset=utf-8', False
+        match = PAGE_PATH.match(self.path)
+        if match:
+            return sermon_page(match.group(1), config.page_size), 'text/html; charset=utf-8', False
+        match = AUDIO_PATH.match(self.path)
+        if match:
+            payload = audio_payload(match.group(1), config.audio_size)
+            bad = config.bad_audio(match.group(1), self.command == 'HEAD')
+            if bad == 'html':
+                return b"<!DOCTYPE html><html><body><h1>Service Unavailable</h1></body></html>", 'audio/mpeg', False
+            if bad == 'truncated':
+                return payload[:len(payload) // 2 + 100], 'audio/mpeg', False
+            return payload, 'audio/mpeg', True
+        return None, None, False
+
+    def _handle(self, head):
+        body, content_type, ranged = self._resolve()
+        if body is None:
+            self._send_error(404)
+            return
+        status = self.server.config.admit()
+        if status:
+            self._send_error(status)
+            return
+        etag = etag_for(body)
+        if not ranged and self.headers.get('If-None-Match') == etag:
+            self.server.config.count('not_modified')
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        status = 200
+        range_match = RANGE_HEADER.match(self.headers.get('Range', '')) if ranged else None
+        if range_match and (not self.headers.get('If-Range') or self.headers.get('If-Range') == etag):
+            start, end = range_match.groups()
+            if start:
+                start, end = int(start), min(int(end) if end else len(body) - 1, len(body) - 1)
+            else:
+                start, end = max(0, len(body) - int(end)), len(body) - 1
+            if start > end:
+                self._send_error(416)
+                return
+            status = 206
+            content_range = f"bytes {start}-{end}/{len(body)}"
+            body = body[start:end + 1]
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        if ranged:
+            self.send_header('Accept-Ranges', 'bytes')
+        if status == 206:
+            self.send_header('Content-Range', content_range)
+        self.end_headers()
+        if not head:
+            self._send_body(body)
+
+    def do_GET(self):
+        self._handle(head=False)
+
+    def do_HEAD(self):
+        self._handle(head=True)
+
+
+class MockGTYServer(ThreadingHTTPServer):
+    # Giả lập www.gty.org (trang bài giảng) và cdn.gty.org (MP3) trên cùng một cổng
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 0), config=None):
+        super().__init__(address, MockGTYHandler)
+        self.config = config or ServerConfig()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def page_url(self, item):
+        return f"{self.base_url}/library/sermons-library/{item}"
+
+    def audio_url(self, item):
+        return f"{self.base_url}/sermons/High/{item}.mp3"
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+
+def add_server_arguments(parser):
+    parser.add_argument("--page-kb", type=float, default=40, help="Size of each synthetic sermon page")
+    parser.add_argument("--audio-kb", type=float, default=1024, help="Size of each synthetic MP3")
+    parser.add_argument("--latency", type=float, default=0.0, help="Added response latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random extra latency up to this many seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument("--server-rps", type=float, help="Answer 429 above this many requests per second")
+    parser.add_argument("--bandwidth-kb", type=float, help="Per-connection bandwidth cap in KB/s")
+    parser.add_argument("--bad-audio-rate", type=float, default=0.0,
+                        help="Fraction of MP3 responses replaced by an HTML error page or a truncated file")
+    parser.add_argument("--listing-catalog", help="Catalog JSON served as year listing pages for catalog_crawler.py")
+
+
+def config_from_args(args):
+    catalog = None
+    if args.listing_catalog:
+        with open(args.listing_catalog, 'r', encoding='utf-8') as f:
+            catalog = json.load(f)
+    return ServerConfig(args.page_kb, args.audio_kb, args.latency, args.jitter, args.error_rate,
+                        args.server_rps, args.bandwidth_kb, catalog=catalog, bad_audio_rate=args.bad_audio_rate)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for gty.org serving synthetic sermon pages and MP3s")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    server = MockGTYServer((args.host, args.port), config_from_args(args))
+    print(f"Mock GTY server: {server.page_url('1316A')} | {server.audio_url('1316A')}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(server.config.stats, file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
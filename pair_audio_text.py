@@ -1,56 +1,155 @@
 import os
+import sys
 import shutil
 import logging
+import argparse
 import time
 import json
 from tqdm import tqdm
-from concurrent.futures import ThreadPoolExecutor, as_completed
 import threading
 import psutil
-from collections import OrderedDict
+from progress_store import ProgressJournal
+from manifest import DirectoryManifest
+from metrics import REGISTRY, MetricsExporter, Reporter, log_stage_summary
+from bounded_scheduler import BoundedScheduler, ORDERS, year_priority
+
+PAIRS_DONE = REGISTRY.counter('pairs_completed_total', 'Audio/text pairs written')
+PAIRS_FAILED = REGISTRY.counter('pairs_failed_total', 'Audio/text pairs that failed')
 
 def setup_logging():
     logging.basicConfig(filename='pair_audio_text.log', level=logging.INFO,
                         format='%(asctime)s - %(levelname)s - %(message)s')
 
 def find_matching_files(audio_dir, text_dir):
-    audio_files = {}
-    text_files = {}
-
-    for root, _, files in os.walk(audio_dir):
-        for file in files:
-            if file.endswith('.mp3'):
-                year = os.path.basename(root)
-                name = os.path.splitext(file)[0]
-                audio_files[(year, name)] = os.path.join(root, file)
-
-    for root, _, files in os.walk(text_dir):
-        for file in files:
-            if file.endswith('.txt'):
-                year = os.path.basename(root)
-                name = os.path.splitext(file)[0]
-                text_files[(year, name)] = os.path.join(root, file)
-
-    return audio_files, text_files
-
-def load_progress(progress_file):
+    # Manifests only rescan year directories whose mtime changed since the last run
+    audio_manifest = DirectoryManifest(audio_dir, '.mp3')
+    text_manifest = DirectoryManifest(text_dir, '.txt')
+    audio_manifest.refresh()
+    text_manifest.refresh()
+    return audio_manifest.items(), text_manifest.items()
+
+def skip_invalid_audio(audio_files, index_file, workers=None):
+    # Verifies frame headers (only new or changed files are rescanned) and drops audio that is
+    # truncated, corrupt or not an MP3 at all, so it is never copied into the paired output
+    from audio_verifier import AudioIndex
+    index = AudioIndex(index_file)
+    try:
+        results = index.verify(audio_files, workers)
+    finally:
+        index.close()
+    valid = {}
+    for key, path in audio_files.items():
+        result = results.get(key)
+        if result is not None and result['status'] != 'ok':
+            logging.warning(f"Skipped: {os.path.basename(path)} - invalid audio ({result['status']}: {result['reason']})")
+            continue
+        valid[key] = path
+    return valid
+
+def load_progress(progress_file, output_dir):
+    # Keys are (year, name) tuples; the journal stores them as separate fields so they
+    # round-trip through JSON and are indexed by a set.
+    checkpoint = ProgressJournal(progress_file, sync_every=100, sync_interval=5.0, compact_every=2000)
+    try:
+        checkpoint.load()
+    except json.JSONDecodeError:
+        print(f"Warning: {progress_file} is not a valid JSON file. Starting with empty progress.")
+        checkpoint.reset()
+        return checkpoint
+
+    # Older versions stored {'paired': [[year, name], ...]} and recorded keys at submit
+    # time, so only trust entries whose paired outputs actually exist.
     if os.path.exists(progress_file):
+        with open(progress_file, 'r') as f:
+            legacy = json.load(f).get('paired', [])
+        for year, name in legacy:
+            year_dir = os.path.join(output_dir, year)
+            if (os.path.exists(os.path.join(year_dir, f"{name}.mp3"))
+                    and os.path.exists(os.path.join(year_dir, f"{name}.txt"))):
+                checkpoint.append(year, name)
+        if legacy:
+            checkpoint.compact()
+    return checkpoint
+
+LINK_MODES = ['copy', 'hardlink', 'reflink', 'symlink', 'auto']
+FICLONE = 0x40049409
+
+def reflink_file(src, dst):
+    if not sys.platform.startswith('linux'):
+        raise OSError("reflink is only supported on Linux")
+    import fcntl
+    with open(src, 'rb') as s, open(dst, 'wb') as d:
+        fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+
+def kernel_copy_file(src, dst):
+    with open(src, 'rb') as s, open(dst, 'wb') as d:
+        remaining = os.fstat(s.fileno()).st_size
         try:
-            with open(progress_file, 'r') as f:
-                return json.load(f)
-        except json.JSONDecodeError:
-            print(f"Warning: {progress_file} is not a valid JSON file. Starting with empty progress.")
-            return {'paired': [], 'last_processed': None}
-    return {'paired': [], 'last_processed': None}
-
-def save_progress(progress_file, progress):
-    temp_file = progress_file + '.tmp'
-    with open(temp_file, 'w') as f:
-        json.dump(progress, f)
-    os.replace(temp_file, progress_file)
+            if hasattr(os, 'copy_file_range'):
+                while remaining > 0:
+                    copied = os.copy_file_range(s.fileno(), d.fileno(), remaining)
+                    if copied == 0:
+                        break
+                    remaining -= copied
+            else:
+                offset = 0
+                while remaining > 0:
+                    sent = os.sendfile(d.fileno(), s.fileno(), offset, remaining)
+                    if sent == 0:
+                        break
+                    offset += sent
+                    remaining -= sent
+        except OSError:
+            # Filesystem does not support in-kernel copies, fall back to userspace
+            s.seek(0)
+            d.seek(0)
+            d.truncate()
+            shutil.copyfileobj(s, d, length=1024*1024)  # 1MB buffer
+
+def link_file(src, dst, mode='copy'):
+    temp_dst = dst + '.tmp'
+    if os.path.lexists(temp_dst):
+        os.remove(temp_dst)
+
+    try:
+        if mode == 'auto':
+            used = None
+            try:
+                reflink_file(src, temp_dst)
+                used = 'reflink'
+            except OSError:
+                if os.path.exists(temp_dst):
+                    os.remove(temp_dst)
+                if os.stat(src).st_dev == os.stat(os.path.dirname(dst)).st_dev:
+                    try:
+                        os.link(src, temp_dst)
+                        used = 'hardlink'
+                    except OSError:
+                        pass
+            if used is None:
+                kernel_copy_file(src, temp_dst)
+                used = 'copy'
+        elif mode == 'reflink':
+            reflink_file(src, temp_dst)
+            used = mode
+        elif mode == 'hardlink':
+            os.link(src, temp_dst)
+            used = mode
+        elif mode == 'symlink':
+            os.symlink(os.path.abspath(src), temp_dst)
+            used = mode
+        else:
+            kernel_copy_file(src, temp_dst)
+            used = 'copy'
+        os.replace(temp_dst, dst)
+    except OSError:
+        if os.path.lexists(temp_dst):
+            os.remove(temp_dst)
+        raise
+    return used
 
 def pair_single_file(args):
-    key, audio_path, text_path, output_dir = args
+    key, audio_path, text_path, output_dir, link_mode, pack = args
     year, name = key
     
     year_dir = os.path.join(output_dir, year)
@@ -60,11 +159,13 @@ def pair_single_file(args):
     text_output = os.path.join(year_dir, f"{name}.txt")
     
     try:
-        with open(audio_path, 'rb') as src, open(audio_output, 'wb') as dst:
-            shutil.copyfileobj(src, dst, length=1024*1024)  # 1MB buffer
-        
-        with open(text_path, 'rb') as src, open(text_output, 'wb') as dst:
-            shutil.copyfileobj(src, dst, length=1024*1024)  # 1MB buffer
+        with REGISTRY.span('pair'):
+            link_file(audio_path, audio_output, link_mode)
+            if pack is not None:
+                with open(text_path, 'r', encoding='utf-8', newline='') as f:
+                    pack.add(year, name, f.read())
+            else:
+                link_file(text_path, text_output, link_mode)
         
         audio_filename = os.path.basename(audio_path)
         text_filename = os.path.basename(text_path)
@@ -85,87 +186,102 @@ def check_system_resources():
             f"Disk Read: {disk_io.read_bytes / 1024 / 1024:.2f} MB\n"
             f"Disk Write: {disk_io.write_bytes / 1024 / 1024:.2f} MB")
 
-def pair_audio_text(audio_files, text_files, output_dir, progress_file):
-    progress = load_progress(progress_file)
-    paired_count = len(progress['paired'])
+def pair_audio_text(audio_files, text_files, output_dir, progress_file, link_mode='copy', pack=None, metrics_file=None, metrics_interval=15.0,
+                    order='oldest', window=None, workers=None):
+    checkpoint = load_progress(progress_file, output_dir)
+    initial_count = len(checkpoint)
     total_files = len(audio_files)
-    last_update_time = time.time()
     current_pairs = []
     
     print_lock = threading.Lock()
-    performance_stats = {'start_time': time.time(), 'last_check_time': time.time(), 'last_check_count': paired_count}
+    performance_stats = {'start_time': time.time(), 'last_check_time': time.time(), 'last_check_count': initial_count}
+
+    def paired_count():
+        return initial_count + PAIRS_DONE.value()
 
-    def update_progress(future):
-        nonlocal paired_count, last_update_time, current_pairs
+    def update_progress(future, key):
+        # Runs on the main thread as results stream in: only counters and a list append, no printing or psutil sampling
         try:
             result = future.result()
-            with print_lock:
-                if result:
-                    paired_count += 1
+            if result:
+                checkpoint.append(*key)
+                PAIRS_DONE.inc()
+                with print_lock:
                     current_pairs.append(result)
-                
-                current_time = time.time()
-                if len(current_pairs) >= 10 or (current_time - last_update_time >= 5 and current_pairs):
-                    print(f"\nTotal paired: {paired_count}/{total_files}")
-                    print("\n".join(current_pairs))
-                    print("-" * 50)
-                    
-                    time_diff = current_time - performance_stats['last_check_time']
-                    count_diff = paired_count - performance_stats['last_check_count']
-                    speed = count_diff / time_diff if time_diff > 0 else 0
-                    overall_speed = paired_count / (current_time - performance_stats['start_time'])
-                    print(f"Current speed: {speed:.2f} pairs/second")
-                    print(f"Overall speed: {overall_speed:.2f} pairs/second")
-                    print(check_system_resources())
-                    
-                    performance_stats['last_check_time'] = current_time
-                    performance_stats['last_check_count'] = paired_count
-                    current_pairs = []
-                    last_update_time = current_time
+            else:
+                PAIRS_FAILED.inc()
         except Exception as e:
-            with print_lock:
-                logging.error(f"Error processing file: {str(e)}")
-
-    # Sort audio_files by year
-    sorted_audio_files = OrderedDict(sorted(audio_files.items(), key=lambda x: x[0][0]))
-
-    with tqdm(total=total_files, initial=paired_count, desc="Pairing files", unit="pair") as pbar:
-        with ThreadPoolExecutor(max_workers=get_optimal_workers()) as executor:
-            futures = []
-            for key, audio_path in sorted_audio_files.items():
-                if key in progress['paired']:
-                    pbar.update(0)
-                    continue
-                
-                if key in text_files:
-                    text_path = text_files[key]
-                    future = executor.submit(pair_single_file, (key, audio_path, text_path, output_dir))
-                    future.add_done_callback(lambda f: pbar.update(1))
-                    future.add_done_callback(update_progress)
-                    futures.append(future)
-                else:
-                    logging.warning(f"Skipped: {os.path.basename(audio_path)} - No matching text file")
-                
-                if key not in progress['paired']:
-                    progress['paired'].append(key)
-                    progress['last_processed'] = key
-                    save_progress(progress_file, progress)
-            
-            for future in as_completed(futures):
-                pass
-
-    if current_pairs:
-        print(f"\nTotal paired: {paired_count}/{total_files}")
-        print("\n".join(current_pairs))
+            PAIRS_FAILED.inc()
+            logging.error(f"Error processing file: {str(e)}")
+
+    def report_progress():
+        # Runs on the reporter thread every few seconds
+        nonlocal current_pairs
+        with print_lock:
+            pairs, current_pairs = current_pairs, []
+        if not pairs:
+            return
+        current_time = time.time()
+        count = paired_count()
+        print(f"\nTotal paired: {count}/{total_files}")
+        print("\n".join(pairs))
         print("-" * 50)
+        
+        time_diff = current_time - performance_stats['last_check_time']
+        count_diff = count - performance_stats['last_check_count']
+        speed = count_diff / time_diff if time_diff > 0 else 0
+        overall_speed = (count - initial_count) / (current_time - performance_stats['start_time'])
+        print(f"Current speed: {speed:.2f} pairs/second")
+        print(f"Overall speed: {overall_speed:.2f} pairs/second")
+        print(check_system_resources())
+        
+        performance_stats['last_check_time'] = current_time
+        performance_stats['last_check_count'] = count
+
+    def pending_jobs():
+        for key, audio_path in audio_files.items():
+            if checkpoint.contains(*key):
+                continue
+            if key in text_files:
+                yield (key, audio_path, text_files[key], output_dir, link_mode, pack)
+            else:
+                logging.warning(f"Skipped: {os.path.basename(audio_path)} - No matching text file")
+
+    reporter = Reporter().every(5.0, report_progress)
+    if metrics_file:
+        reporter.every(metrics_interval, MetricsExporter(REGISTRY, metrics_file).export)
+    reporter.start()
+    try:
+        with tqdm(total=total_files, initial=initial_count, desc="Pairing files", unit="pair") as pbar:
+            # Years in the requested order; only a bounded window of jobs is queued at a time
+            with BoundedScheduler(workers or get_optimal_workers(), window, year_priority(order, lambda job: job[0][0])) as scheduler:
+                for job, future in scheduler.map(pair_single_file, pending_jobs()):
+                    pbar.update(1)
+                    update_progress(future, job[0])
+                if scheduler.stopping:
+                    logging.info("Pairing interrupted; remaining files will be paired on the next run")
+    finally:
+        reporter.stop()
+        checkpoint.close()
 
     print("\n")
     total_time = time.time() - performance_stats['start_time']
     print(f"Total time: {total_time:.2f} seconds")
-    print(f"Average speed: {paired_count/total_time:.2f} pairs/second")
-    return paired_count
+    print(f"Average speed: {(paired_count() - initial_count)/total_time:.2f} pairs/second")
+    log_stage_summary()
+    return paired_count()
 
 def main():
+    parser = argparse.ArgumentParser(description="Pair downloaded audio and text sermons")
+    parser.add_argument("--link-mode", choices=LINK_MODES, default="copy",
+                        help="How paired files are created (auto tries reflink, then hardlink, then copy)")
+    parser.add_argument("--pack", help="Store paired transcripts in this compressed corpus pack instead of .txt copies")
+    parser.add_argument("--audio-index", help="Verify MP3s with audio_verifier.py (cached in this index) and skip invalid ones")
+    parser.add_argument("--metrics-file", help="Export metrics here periodically (.prom = Prometheus textfile, otherwise JSONL)")
+    parser.add_argument("--order", choices=ORDERS, default="oldest", help="Pairing order by year")
+    parser.add_argument("--window", type=int, help="Maximum queued + running pair jobs (default: 2 x workers)")
+    args = parser.parse_args()
+
     setup_logging()
     
     audio_dir = "gty_sermons_audio"
@@ -181,8 +297,22 @@ def main():
         
         logging.info(f"Found {len(audio_files)} audio files and {len(text_files)} text files")
         print(f"Found {len(audio_files)} audio files and {len(text_files)} text files")
+        if args.audio_index:
+            found = len(audio_files)
+            audio_files = skip_invalid_audio(audio_files, args.audio_index)
+            logging.info(f"Skipping {found - len(audio_files)} invalid audio files")
+            print(f"Skipping {found - len(audio_files)} invalid audio files")
 
-        paired_count = pair_audio_text(audio_files, text_files, output_dir, progress_file)
+        pack = None
+        if args.pack:
+            from corpus_pack import CorpusPackWriter
+            pack = CorpusPackWriter(args.pack)
+        try:
+            paired_count = pair_audio_text(audio_files, text_files, output_dir, progress_file, args.link_mode, pack,
+                                           args.metrics_file, order=args.order, window=args.window)
+        finally:
+            if pack is not None:
+                pack.close()
 
         logging.info(f"Pairing completed. Total paired: {paired_count}/{len(audio_files)}")
         print(f"\nPairing completed. Total paired: {paired_count}/{len(audio_files)}")
@@ -0,0 +1,137 @@
+import argparse
+import os
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from main import ProgressTracker, parse_transcript, save_transcript
+from catalog import URL_TEMPLATES, generate_urls
+from http_session import create_session, REQUEST_ERRORS
+from resumable_download import download_file
+from adaptive_scheduler import ByteBucket
+
+def fetch_transcript(session, url, filename, rate_limiter):
+    # File được ghi bằng os.replace nên nếu đã tồn tại thì chắc chắn là đầy đủ
+    if os.path.exists(filename):
+        return True
+    rate_limiter.consume(1)
+    response = session.get(url, timeout=60)
+    response.raise_for_status()
+    text = parse_transcript(response.content)
+    if not text:
+        logging.warning(f"Không tìm thấy nội dung cho URL: {url}")
+        return False
+    save_transcript(filename, text)
+    return True
+
+
+def fetch_audio(session, url, filename, segments):
+    if os.path.exists(filename):
+        return True
+    download_file(url, filename, session, segments)
+    return True
+
+
+def _guard(func, url, *args):
+    try:
+        return func(*args)
+    except REQUEST_ERRORS as e:
+        logging.error(f"Lỗi khi truy cập URL {url}: {str(e)}")
+    except Exception as e:
+        logging.error(f"Lỗi không xác định khi xử lý URL {url}: {str(e)}")
+    return False
+
+
+class _ItemJoin:
+    # Ghi một mục progress chung khi cả transcript và audio của item đã xong
+    def __init__(self, tracker, year, number):
+        self.tracker = tracker
+        self.year = year
+        self.number = number
+        self.remaining = 2
+        self.ok = True
+        self.lock = threading.Lock()
+
+    def done(self, future):
+        with self.lock:
+            self.remaining -= 1
+            self.ok = self.ok and bool(future.result())
+            finished = self.remaining == 0 and self.ok
+        if finished:
+            self.tracker.increment_downloads(self.year, self.number)
+            logging.info(f"Đã ghép xong: {self.year}/{self.number}")
+
+
+def run_pipeline(urls, output_dir, tracker, session, text_workers=1, audio_workers=4, rps=2.0, segments=1):
+    rate_limiter = ByteBucket(rps, burst=1)
+    futures = []
+    with ThreadPoolExecutor(max_workers=text_workers) as text_pool, \
+            ThreadPoolExecutor(max_workers=audio_workers) as audio_pool:
+        for url, year, number in urls:
+            year_dir = os.path.join(output_dir, year)
+            audio_url = URL_TEMPLATES['audio'].format(number)
+            join = _ItemJoin(tracker, year, number)
+            text_future = text_pool.submit(_guard, fetch_transcript, url, session, url,
+                                           os.path.join(year_dir, f"{number}.txt"), rate_limiter)
+            audio_future = audio_pool.submit(_guard, fetch_audio, audio_url, session, audio_url,
+                                             os.path.join(year_dir, f"{number}.mp3"), segments)
+            text_future.add_done_callback(join.done)
+            audio_future.add_done_callback(join.done)
+            futures.extend((text_future, audio_future))
+        wait(futures)
+    return [future.result() for future in futures]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fetch GTY transcripts and audio straight into the paired layout")
+    parser.add_argument("--year", type=int, help="Specific year to process")
+    parser.add_argument("--start-year", type=int, help="Start year for range")
+    parser.add_argument("--end-year", type=int, help="End year for range")
+    parser.add_argument("--catalog", default="combined_gty_sermons.json",
+                        help="Catalog file (e.g. the delta written by catalog_crawler.py)")
+    parser.add_argument("--output-dir", default="gty_sermons_paired", help="Paired output directory")
+    parser.add_argument("--text-workers", type=int, default=1, help="Concurrent transcript fetches")
+    parser.add_argument("--audio-workers", type=int, default=4, help="Concurrent audio downloads")
+    parser.add_argument("--rps", type=float, default=2.0, help="Transcript requests per second budget")
+    parser.add_argument("--segments", type=int, default=1, help="Parallel byte-range segments per large audio file")
+    args = parser.parse_args()
+    if args.segments < 1:
+        parser.error("--segments phải >= 1")
+
+    log_file = "gty_pipeline.log"
+    logging.basicConfig(filename=log_file, level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    logging.info("Bắt đầu pipeline...")
+
+    json_file = args.catalog
+    if args.year:
+        urls = generate_urls(json_file, 'text', start_year=args.year, end_year=args.year)
+    elif args.start_year and args.end_year:
+        urls = generate_urls(json_file, 'text', start_year=args.start_year, end_year=args.end_year)
+    else:
+        urls = generate_urls(json_file, 'text')
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    tracker = ProgressTracker("pipeline_progress.json", len(urls))
+    pending_urls = tracker.pending_urls(urls)
+    logging.info(f"Bỏ qua {len(urls) - len(pending_urls)} item đã xử lý, còn {len(pending_urls)} item cần tải")
+
+    session = create_session(pool_size=args.text_workers + args.audio_workers * max(1, args.segments))
+    try:
+        run_pipeline(pending_urls, args.output_dir, tracker, session, args.text_workers,
+                     args.audio_workers, args.rps, args.segments)
+    finally:
+        session.close()
+        tracker.close()
+
+    successful_downloads, _, year_counts = tracker.get_stats()
+    print("\n")
+    logging.info(f"Số item đã ghép đủ transcript và audio: {successful_downloads}")
+    logging.info(f"Tổng thời gian chạy: {tracker.get_session_time()}")
+    for year, count in sorted(year_counts.items()):
+        logging.info(f"{year}: {count}")
+    print(f"\nChương trình đã kết thúc. Xem file log {log_file} để biết chi tiết.")
+
+
+if __name__ == "__main__":
+    main()
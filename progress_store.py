@@ -0,0 +1,175 @@
+import os
+import json
+import time
+import logging
+import threading
+
+
+class ProgressJournal:
+    # Snapshot giữ nguyên định dạng cũ của progress.json / audio_progress.json:
+    #   {"successful_downloads": N, "files_success": {year: [item, ...]}}
+    # Mỗi item hoàn thành được ghi thêm một dòng vào file journal bên cạnh,
+    # định kỳ gộp (compact) lại vào snapshot rồi xoá journal.
+    def __init__(self, snapshot_file, sync_every=50, sync_interval=2.0, compact_every=1000):
+        self.snapshot_file = snapshot_file
+        self.journal_file = snapshot_file + '.journal'
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.compact_every = compact_every
+        self.successful_downloads = 0
+        self.progress = {}
+        self._done = set()
+        self._journal = None
+        self._pending_sync = 0
+        self._journal_records = 0
+        self._last_sync = time.time()
+        self.lock = threading.Lock()
+
+    def load(self):
+        with self.lock:
+            self.successful_downloads = 0
+            self.progress = {}
+            self._done = set()
+            if os.path.exists(self.snapshot_file):
+                with open(self.snapshot_file, 'r') as f:
+                    data = json.load(f)
+                self.successful_downloads = data.get('successful_downloads', 0)
+                for year, items in data.get('files_success', {}).items():
+                    for item in items:
+                        self._add(year, item)
+            self._journal_records = self._replay_journal()
+            return self.successful_downloads, self.progress
+
+    def reset(self):
+        with self.lock:
+            self._close_journal()
+            self.successful_downloads = 0
+            self.progress = {}
+            self._done = set()
+            self._journal_records = 0
+            if os.path.exists(self.journal_file):
+                os.remove(self.journal_file)
+
+    def _add(self, year, item):
+        if (year, item) in self._done:
+            return False
+        self._done.add((year, item))
+        self.progress.setdefault(year, []).append(item)
+        return True
+
+    def _replay_journal(self):
+        if not os.path.exists(self.journal_file):
+            return 0
+        records = 0
+        skipped = 0
+        valid_size = 0
+        with open(self.journal_file, 'rb') as f:
+            for line in f:
+                # Dòng cuối có thể bị cắt dở nếu chương trình dừng giữa chừng khi đang ghi
+                if not line.endswith(b'\n'):
+                    break
+                valid_size += len(line)
+                try:
+                    record = json.loads(line)
+                    year, item = record['y'], record['i']
+                except (ValueError, KeyError, TypeError):
+                    # Dòng hỏng ở giữa file: bỏ qua dòng đó, vẫn đọc các bản ghi phía sau
+                    skipped += 1
+                    continue
+                records += 1
+                if self._add(year, item):
+                    self.successful_downloads += 1
+        if skipped:
+            logging.warning(f"Bỏ qua {skipped} dòng hỏng trong {self.journal_file}")
+        if valid_size < os.path.getsize(self.journal_file):
+            logging.warning(f"Bỏ qua phần ghi dở cuối file {self.journal_file}")
+            with open(self.journal_file, 'r+b') as f:
+                f.truncate(valid_size)
+        return records
+
+    def _open_journal(self):
+        if self._journal is None:
+            self._journal = open(self.journal_file, 'a', encoding='utf-8')
+        return self._journal
+
+    def _close_journal(self):
+        if self._journal is not None:
+            self._sync()
+            self._journal.close()
+            self._journal = None
+
+    def _sync(self):
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+        self._pending_sync = 0
+        self._last_sync = time.time()
+
+    def __len__(self):
+        return len(self._done)
+
+    def contains(self, year, item):
+        return (year, item) in self._done
+
+    def append(self, year, item):
+        with self.lock:
+            if not self._add(year, item):
+                return False
+            self.successful_downloads += 1
+            journal = self._open_journal()
+            journal.write(json.dumps({'y': year, 'i': item}) + '\n')
+            journal.flush()
+            self._pending_sync += 1
+            self._journal_records += 1
+            if self._pending_sync >= self.sync_every or time.time() - self._last_sync >= self.sync_interval:
+                self._sync()
+            if self._journal_records >= self.compact_every:
+                self._compact()
+            return True
+
+    def discard(self, keys):
+        # Bỏ các item khỏi tiến độ (vd. file audio hỏng cần tải lại) rồi ghi lại snapshot ngay
+        with self.lock:
+            removed = 0
+            for year, item in keys:
+                if (year, item) in self._done:
+                    self._done.remove((year, item))
+                    self.progress[year].remove(item)
+                    removed += 1
+            if removed:
+                self.successful_downloads = max(0, self.successful_downloads - removed)
+                self._close_journal()
+                self._compact()
+            return removed
+
+    def flush(self):
+        with self.lock:
+            if self._journal is not None:
+                self._sync()
+
+    def compact(self):
+        with self.lock:
+            self._compact()
+
+    def _compact(self):
+        temp_file = self.snapshot_file + '.tmp'
+        with open(temp_file, 'w') as f:
+            json.dump({
+                'successful_downloads': self.successful_downloads,
+                'files_success': self.progress
+            }, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, self.snapshot_file)
+        # Nếu dừng ở đây, journal cũ sẽ được phát lại nhưng các item trùng bị bỏ qua
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        if os.path.exists(self.journal_file):
+            os.remove(self.journal_file)
+        self._journal_records = 0
+        self._pending_sync = 0
+
+    def close(self):
+        with self.lock:
+            self._close_journal()
+            self._compact()
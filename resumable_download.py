@@ -0,0 +1,313 @@
+import os
+import re
+import json
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+BUFFER_SIZE = 1024 * 1024
+BLOCK_SIZE = 8 * 1024 * 1024
+PARALLEL_THRESHOLD = 16 * 1024 * 1024
+
+_MD5_ETAG = re.compile(r'^"?([0-9a-fA-F]{32})"?$')
+_CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+
+class DownloadError(Exception):
+    pass
+
+
+class _PartState:
+    # File .part.json đi kèm .part: kích thước, ETag và sha256 của từng block 8MB đã tải xong,
+    # để lần chạy sau chỉ tải lại những block còn thiếu hoặc bị hỏng.
+    def __init__(self, state_file, size, etag):
+        self.state_file = state_file
+        self.size = size
+        self.etag = etag
+        self.blocks = {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, state_file, size, etag):
+        state = cls(state_file, size, etag)
+        if os.path.exists(state_file):
+            try:
+                with open(state_file, 'r') as f:
+                    data = json.load(f)
+                if data.get('size') == size and data.get('etag') == etag:
+                    state.blocks = {int(index): digest for index, digest in data.get('blocks', {}).items()}
+            except (ValueError, OSError):
+                pass
+        return state
+
+    @staticmethod
+    def peek(state_file):
+        # (size, etag) của lần tải dở trước, để gửi ngay request Range cho block còn thiếu đầu tiên
+        try:
+            with open(state_file, 'r') as f:
+                data = json.load(f)
+            return data.get('size'), data.get('etag')
+        except (ValueError, OSError):
+            return None, None
+
+    def record(self, index, digest):
+        with self.lock:
+            self.blocks[index] = digest
+            self._save()
+
+    def discard(self, index):
+        with self.lock:
+            self.blocks.pop(index, None)
+
+    def _save(self):
+        temp_file = self.state_file + '.tmp'
+        with open(temp_file, 'w') as f:
+            json.dump({'size': self.size, 'etag': self.etag, 'blocks': self.blocks}, f)
+        os.replace(temp_file, self.state_file)
+
+    def remove(self):
+        if os.path.exists(self.state_file):
+            os.remove(self.state_file)
+
+
+def content_digest(block_digests):
+    # Mã nội dung của file = sha256 của danh sách sha256 từng block 8MB. Tính được ngay từ
+    # file .part.json khi tải theo block (kể cả tải song song, tải tiếp), không cần đọc lại file.
+    combined = hashlib.sha256()
+    for digest in block_digests:
+        combined.update(bytes.fromhex(digest))
+    return combined.hexdigest()
+
+
+class BlockHasher:
+    # Tính cùng mã nội dung đó cho dữ liệu đọc tuần tự (tải không có Range, file có sẵn, transcript)
+    def __init__(self):
+        self.blocks = []
+        self.digest = hashlib.sha256()
+        self.filled = 0
+
+    def update(self, data):
+        view = memoryview(data)
+        while view:
+            take = min(len(view), BLOCK_SIZE - self.filled)
+            self.digest.update(view[:take])
+            self.filled += take
+            view = view[take:]
+            if self.filled == BLOCK_SIZE:
+                self.blocks.append(self.digest.hexdigest())
+                self.digest = hashlib.sha256()
+                self.filled = 0
+
+    def hexdigest(self):
+        return content_digest(self.blocks + [self.digest.hexdigest()] if self.filled else self.blocks)
+
+
+def _block_range(index, size):
+    start = index * BLOCK_SIZE
+    return start, min(size, start + BLOCK_SIZE) - 1
+
+
+def _verify_blocks(part_file, state):
+    if not os.path.exists(part_file) or os.path.getsize(part_file) != state.size:
+        state.blocks = {}
+        return
+    with open(part_file, 'rb') as f:
+        for index, digest in list(state.blocks.items()):
+            start, end = _block_range(index, state.size)
+            f.seek(start)
+            if hashlib.sha256(f.read(end - start + 1)).hexdigest() != digest:
+                logging.warning(f"Block {index} của {part_file} không khớp checksum, tải lại")
+                state.discard(index)
+
+
+def _group_runs(indexes):
+    runs = []
+    for index in sorted(indexes):
+        if runs and runs[-1][-1] == index - 1:
+            runs[-1].append(index)
+        else:
+            runs.append([index])
+    return runs
+
+
+def _split_runs(runs, parts):
+    # Chia các dãy block liên tiếp thành tối đa `parts` đoạn có độ dài gần bằng nhau
+    total = sum(len(run) for run in runs)
+    target = max(1, -(-total // parts))
+    segments = []
+    for run in runs:
+        for i in range(0, len(run), target):
+            segments.append(run[i:i + target])
+    return segments
+
+
+def _fetch_blocks(session, url, fd, state, blocks, on_bytes=None):
+    start = _block_range(blocks[0], state.size)[0]
+    end = _block_range(blocks[-1], state.size)[1]
+    headers = {'Range': f'bytes={start}-{end}'}
+    if state.etag:
+        headers['If-Range'] = state.etag
+    with session.get(url, headers=headers, stream=True, timeout=60) as response:
+        response.raise_for_status()
+        if response.status_code != 206:
+            raise DownloadError(f"Server không hỗ trợ Range cho {url}")
+        _write_blocks(response, url, fd, state, blocks, on_bytes)
+
+
+def _write_blocks(response, url, fd, state, blocks, on_bytes=None):
+    # Ghi response 206 bắt đầu đúng tại block blocks[0] vào file .part, ghi nhận sha256 từng block
+    start = _block_range(blocks[0], state.size)[0]
+    end = _block_range(blocks[-1], state.size)[1]
+    offset = start
+    index = blocks[0]
+    block_end = _block_range(index, state.size)[1]
+    digest = hashlib.sha256()
+    for chunk in response.iter_content(chunk_size=BUFFER_SIZE):
+        if on_bytes is not None:
+            on_bytes(len(chunk))
+        view = memoryview(chunk)
+        while view:
+            take = min(len(view), block_end - offset + 1)
+            os.pwrite(fd, view[:take], offset)
+            digest.update(view[:take])
+            offset += take
+            view = view[take:]
+            if offset > block_end:
+                state.record(index, digest.hexdigest())
+                if offset > end:
+                    break
+                index += 1
+                block_end = _block_range(index, state.size)[1]
+                digest = hashlib.sha256()
+    if offset <= end:
+        raise DownloadError(f"Kết nối bị ngắt khi tải {url} ({offset - start}/{end - start + 1} bytes)")
+
+
+def _fetch_whole(session, url, part_file, on_bytes=None):
+    with session.get(url, stream=True, timeout=60) as response:
+        response.raise_for_status()
+        return _write_whole(response, url, part_file, on_bytes)
+
+
+def _write_whole(response, url, part_file, on_bytes=None):
+    # Dùng khi server không trả kích thước hoặc không hỗ trợ Range
+    hasher = BlockHasher()
+    expected = response.headers.get('Content-Length')
+    written = 0
+    with open(part_file, 'wb', buffering=BUFFER_SIZE) as f:
+        for chunk in response.iter_content(chunk_size=BUFFER_SIZE):
+            if on_bytes is not None:
+                on_bytes(len(chunk))
+            f.write(chunk)
+            hasher.update(chunk)
+            written += len(chunk)
+    if expected is not None and written != int(expected):
+        raise DownloadError(f"Kích thước không khớp cho {url}: {written}/{expected} bytes")
+    return written, hasher.hexdigest()
+
+
+def _file_md5(path):
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(BUFFER_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def download_file(url, filename, session=None, segments=1, on_bytes=None, on_digest=None):
+    session = session or requests.Session()
+    part_file = filename + '.part'
+    state_file = part_file + '.json'
+    os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+
+    # Không dùng HEAD: request Range đầu tiên cho biết kích thước (Content-Range), ETag và việc server
+    # hỗ trợ Range, đồng thời dữ liệu của nó chính là block còn thiếu đầu tiên (file nhỏ: toàn bộ file)
+    known_size, known_etag = _PartState.peek(state_file)
+    known = None
+    probe_index = 0
+    if known_size:
+        known = _PartState.load(state_file, known_size, known_etag)
+        _verify_blocks(part_file, known)
+        probe_index = next((index for index in range(-(-known_size // BLOCK_SIZE)) if index not in known.blocks), 0)
+    probe_start = probe_index * BLOCK_SIZE
+    headers = {'Range': f'bytes={probe_start}-{probe_start + BLOCK_SIZE - 1}'}
+    if known_etag:
+        headers['If-Range'] = known_etag
+    response = session.get(url, headers=headers, stream=True, timeout=60)
+    try:
+        content_range = _CONTENT_RANGE.match(response.headers.get('Content-Range', ''))
+        if response.status_code == 416 or (response.status_code == 206 and content_range is None):
+            # Không đọc được kích thước từ response Range (file rỗng, Content-Range "*"): tải nguyên file
+            response.close()
+            response = None
+            written, digest = _fetch_whole(session, url, part_file, on_bytes)
+        elif response.status_code != 206:
+            # Server bỏ qua Range, hoặc file đã đổi so với ETag của lần tải dở: nhận nguyên file từ chính response này
+            response.raise_for_status()
+            written, digest = _write_whole(response, url, part_file, on_bytes)
+        else:
+            written = None
+        if written is not None:
+            if os.path.exists(state_file):
+                os.remove(state_file)
+            os.replace(part_file, filename)
+            if on_digest is not None:
+                on_digest(digest)
+            return written
+
+        size = int(content_range.group(3))
+        etag = response.headers.get('ETag')
+        if known is not None and (known.size, known.etag) == (size, etag):
+            state = known
+        else:
+            state = _PartState(state_file, size, etag)
+        if not state.blocks and os.path.exists(part_file):
+            os.remove(part_file)
+        if not os.path.exists(part_file):
+            with open(part_file, 'wb') as f:
+                f.truncate(size)
+        probe_index = int(content_range.group(1)) // BLOCK_SIZE
+        probe_range = (int(content_range.group(1)), int(content_range.group(2)))
+        if probe_index not in state.blocks and probe_range == _block_range(probe_index, size):
+            fd = os.open(part_file, os.O_WRONLY)
+            try:
+                _write_blocks(response, url, fd, state, [probe_index], on_bytes)
+            finally:
+                os.close(fd)
+    finally:
+        if response is not None:
+            response.close()
+
+    missing = [index for index in range(-(-size // BLOCK_SIZE)) if index not in state.blocks]
+    if missing:
+        parts = max(1, segments) if size >= PARALLEL_THRESHOLD else 1
+        work = _split_runs(_group_runs(missing), parts)
+        fd = os.open(part_file, os.O_WRONLY)
+        try:
+            if parts > 1 and len(work) > 1:
+                with ThreadPoolExecutor(max_workers=parts) as executor:
+                    for future in [executor.submit(_fetch_blocks, session, url, fd, state, blocks, on_bytes) for blocks in work]:
+                        future.result()
+            else:
+                for blocks in work:
+                    _fetch_blocks(session, url, fd, state, blocks, on_bytes)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    if os.path.getsize(part_file) != size or len(state.blocks) != -(-size // BLOCK_SIZE):
+        raise DownloadError(f"File {part_file} chưa đầy đủ")
+    md5_etag = _MD5_ETAG.match(etag or '')
+    if md5_etag and _file_md5(part_file) != md5_etag.group(1).lower():
+        os.remove(part_file)
+        state.remove()
+        raise DownloadError(f"MD5 của {url} không khớp ETag")
+    digest = content_digest(state.blocks[index] for index in range(len(state.blocks)))
+    os.replace(part_file, filename)
+    state.remove()
+    if on_digest is not None:
+        on_digest(digest)
+    return size
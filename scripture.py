@@ -0,0 +1,309 @@
+import os
+import re
+import sys
+import time
+import sqlite3
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from bible_data import BOOKS, BOOK_NUMBERS, ORDINALS, book_name_variants
+
+# Các cách viết dễ trùng với từ thông thường ("Is 5 enough", "Am I ...") không được dùng để nhận dạng
+AMBIGUOUS_NAMES = {'Is', 'Am', 'Act', 'Song'}
+BOOK_CODES = {name: code for name, code in book_name_variants().items() if name not in AMBIGUOUS_NAMES}
+BOOK_CODES_LOWER = {name.lower(): code for name, code in BOOK_CODES.items()}
+CODE_BY_NUMBER = {number: code for code, number in BOOK_NUMBERS.items()}
+
+# Mẫu tổng quát cho tên sách rồi tra từ điển: nhanh hơn nhiều so với một phép OR trên ~250 cách viết
+_PREFIX = r'(?P<prefix>(?:[123]|1st|2nd|3rd|III|II|I|First|Second|Third)\s+)?'
+_BOOK = r'(?P<book>' + _PREFIX + r'[A-Z][a-z]+(?:\s+of\s+(?:Solomon|Songs))?)\.?'
+_RANGE = r'\s*(?:-|–|to|through|thru)\s*'
+_ORDINAL = '(?:' + '|'.join(ORDINALS) + r'|\d{1,3}(?:st|nd|rd|th))'
+
+# "Romans 8:28-30", "Matthew 7:21 to 23", "Matthew 7 beginning at verse 21", "Romans chapter 8, verses 28 through 30"
+FORWARD_PATTERN = re.compile(
+    r'\b' + _BOOK + r'\s+(?:chapter\s+)?(?P<chapter>\d{1,3})(?!\d)'
+    r'(?:(?::\s*|\.)(?P<verse>\d{1,3})(?:' + _RANGE + r'(?P<verse_end>\d{1,3})(?!\s*:\s*\d))?'
+    r'|,?\s+(?:(?:beginning|starting)\s+(?:at|with|in)\s+|at\s+|in\s+)?verses?\s+(?P<spoken_verse>\d{1,3})'
+    r'(?:' + _RANGE + r'(?P<spoken_verse_end>\d{1,3}))?)?\b')
+# "chapter 8 of Romans", "the fourth chapter of Acts", "the 3rd chapter of the Gospel of John"
+BACKWARD_PATTERN = re.compile(
+    r'\b(?:chapter\s+(?P<chapter>\d{1,3})|the\s+(?P<ordinal>' + _ORDINAL + r')\s+chapter)\s+of\s+'
+    r'(?:the\s+)?(?:(?:book|gospel|epistle|letter)\s+(?:of|to)\s+(?:the\s+)?)?' + _BOOK + r'\b',
+    re.IGNORECASE)
+
+
+def _ordinal_value(word):
+    word = word.lower()
+    if word in ORDINALS:
+        return ORDINALS[word]
+    return int(word[:-2])
+
+
+def _book_code(match, ignore_case=False):
+    codes = BOOK_CODES_LOWER if ignore_case else BOOK_CODES
+    name = re.sub(r'\s+', ' ', match.group('book'))
+    code = codes.get(name.lower() if ignore_case else name)
+    if code is None and match.group('prefix'):
+        # "... the First Romans 8": tiền tố không thuộc tên sách
+        name = name[len(match.group('prefix').rstrip()) + 1:]
+        code = codes.get(name.lower() if ignore_case else name)
+    return code
+
+
+def normalize(code, chapter, verse=None, verse_end=None):
+    # Trả về (book_number, chapter, verse_start, verse_end) với verse = 0 nghĩa là cả chương,
+    # hoặc None nếu số chương vượt quá số chương của sách
+    if code is None or not 1 <= chapter <= BOOKS[code][1]:
+        return None
+    verse = verse or 0
+    verse_end = verse_end or verse
+    if verse_end < verse:
+        verse_end = verse
+    return BOOK_NUMBERS[code], chapter, verse, verse_end
+
+
+def extract_references(text):
+    # Trả về danh sách (book_number, chapter, verse_start, verse_end, offset) theo thứ tự xuất hiện
+    references = {}
+    for match in FORWARD_PATTERN.finditer(text):
+        verse = match.group('verse') or match.group('spoken_verse')
+        verse_end = match.group('verse_end') or match.group('spoken_verse_end')
+        reference = normalize(_book_code(match), int(match.group('chapter')),
+                              int(verse) if verse else None, int(verse_end) if verse_end else None)
+        if reference:
+            references[match.start()] = reference
+    for match in BACKWARD_PATTERN.finditer(text):
+        if match.start() in references:
+            continue
+        chapter = int(match.group('chapter')) if match.group('chapter') else _ordinal_value(match.group('ordinal'))
+        reference = normalize(_book_code(match, ignore_case=True), chapter)
+        if reference:
+            references[match.start()] = reference
+    return [reference + (offset,) for offset, reference in sorted(references.items())]
+
+
+def format_reference(book, chapter, verse=0, verse_end=0):
+    name = BOOKS[CODE_BY_NUMBER[book]][0]
+    if not verse:
+        return f"{name} {chapter}"
+    if verse_end and verse_end != verse:
+        return f"{name} {chapter}:{verse}-{verse_end}"
+    return f"{name} {chapter}:{verse}"
+
+
+def parse_reference(query):
+    references = extract_references(query.strip())
+    if not references:
+        raise ValueError(f"Không nhận dạng được đoạn Kinh Thánh: {query}")
+    return references[0][:4]
+
+
+class ScriptureIndex:
+    # Chỉ mục (book, chapter, verse) -> (year, item, offset) lưu trong SQLite, khoá chính theo
+    # sách/chương nên tra "Romans 8" chỉ là một lần quét khoảng trên B-tree
+    def __init__(self, db_file="gty_scripture_index.sqlite"):
+        self.db_file = db_file
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS docs (
+                doc_id INTEGER PRIMARY KEY,
+                year TEXT NOT NULL,
+                item TEXT NOT NULL,
+                signature TEXT,
+                UNIQUE (year, item)
+            );
+            CREATE TABLE IF NOT EXISTS refs (
+                book INTEGER NOT NULL,
+                chapter INTEGER NOT NULL,
+                verse_start INTEGER NOT NULL,
+                verse_end INTEGER NOT NULL,
+                doc_id INTEGER NOT NULL,
+                offset INTEGER NOT NULL,
+                PRIMARY KEY (book, chapter, verse_start, doc_id, offset)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS refs_doc ON refs (doc_id);
+        """)
+
+    def signatures(self):
+        with self.lock:
+            return {(year, item): signature
+                    for year, item, signature in self.conn.execute("SELECT year, item, signature FROM docs")}
+
+    def replace(self, year, item, references, signature=None, commit=True):
+        with self.lock:
+            row = self.conn.execute("SELECT doc_id FROM docs WHERE year = ? AND item = ?", (year, item)).fetchone()
+            if row:
+                doc_id = row[0]
+                self.conn.execute("DELETE FROM refs WHERE doc_id = ?", (doc_id,))
+                self.conn.execute("UPDATE docs SET signature = ? WHERE doc_id = ?", (signature, doc_id))
+            else:
+                doc_id = self.conn.execute("INSERT INTO docs (year, item, signature) VALUES (?, ?, ?)",
+                                           (year, item, signature)).lastrowid
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO refs (book, chapter, verse_start, verse_end, doc_id, offset) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                ((book, chapter, verse, verse_end, doc_id, offset)
+                 for book, chapter, verse, verse_end, offset in references))
+            if commit:
+                self.conn.commit()
+
+    def add(self, year, item, text, signature=None, commit=True):
+        self.replace(year, item, extract_references(text), signature, commit)
+
+    def on_transcript_saved(self, year, item, text):
+        self.add(year, item, text)
+
+    def commit(self):
+        with self.lock:
+            self.conn.commit()
+
+    def lookup(self, book, chapter, verse=0, verse_end=0, start_year=None, end_year=None):
+        # Không có verse: mọi tham chiếu tới chương. Có verse: tham chiếu giao với khoảng câu,
+        # cộng với tham chiếu tới cả chương. Trả về [(year, item, [(offset, reference)])]
+        sql = ("SELECT d.year, d.item, r.offset, r.verse_start, r.verse_end FROM refs r "
+               "JOIN docs d ON d.doc_id = r.doc_id WHERE r.book = ? AND r.chapter = ?")
+        params = [book, chapter]
+        if verse:
+            sql += " AND (r.verse_start = 0 OR (r.verse_start <= ? AND r.verse_end >= ?))"
+            params += [verse_end or verse, verse]
+        if start_year is not None:
+            sql += " AND CAST(d.year AS INTEGER) >= ?"
+            params.append(start_year)
+        if end_year is not None:
+            sql += " AND CAST(d.year AS INTEGER) <= ?"
+            params.append(end_year)
+        results = {}
+        with self.lock:
+            for year, item, offset, start, end in self.conn.execute(sql, params):
+                results.setdefault((year, item), []).append((offset, format_reference(book, chapter, start, end)))
+        return [(year, item, sorted(hits)) for (year, item), hits in sorted(results.items())]
+
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
+
+
+def _extract_file(task):
+    year, item, path, signature = task
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        return year, item, signature, extract_references(f.read())
+
+
+_pack_reader = None
+
+
+def _open_pack(pack_file):
+    global _pack_reader
+    from corpus_pack import CorpusPackReader
+    _pack_reader = CorpusPackReader(pack_file)
+
+
+def _extract_pack_entry(task):
+    year, item, signature = task
+    return year, item, signature, extract_references(_pack_reader.get(year, item))
+
+
+def _store(index, results):
+    count = 0
+    for year, item, signature, references in results:
+        index.replace(year, item, references, signature, commit=False)
+        count += 1
+        if count % 500 == 0:
+            index.commit()
+    index.commit()
+    return count
+
+
+def build_from_directory(index, text_dir, workers=None):
+    # Chỉ xử lý lại các file có (size, mtime) khác với lần lập chỉ mục trước
+    known = index.signatures()
+    tasks = []
+    for year in sorted(os.listdir(text_dir)):
+        year_dir = os.path.join(text_dir, year)
+        if not year.isdigit() or not os.path.isdir(year_dir):
+            continue
+        with os.scandir(year_dir) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith('.txt'):
+                    stat = entry.stat()
+                    signature = f"{stat.st_size}:{stat.st_mtime_ns}"
+                    item = entry.name[:-4]
+                    if known.get((year, item)) != signature:
+                        tasks.append((year, item, entry.path, signature))
+    if not tasks:
+        return 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return _store(index, executor.map(_extract_file, tasks, chunksize=64))
+
+
+def build_from_pack(index, pack_file, workers=None):
+    from corpus_pack import CorpusPackReader
+    known = index.signatures()
+    with CorpusPackReader(pack_file) as reader:
+        tasks = []
+        for key, (offset, length, _) in sorted(reader.entries.items(), key=lambda x: x[1][0]):
+            year, item = key.split('/', 1)
+            signature = f"pack:{offset}:{length}"
+            if known.get((year, item)) != signature:
+                tasks.append((year, item, signature))
+    if not tasks:
+        return 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_open_pack, initargs=(pack_file,)) as executor:
+        return _store(index, executor.map(_extract_pack_entry, tasks, chunksize=64))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scripture reference extraction and verse-to-sermon index")
+    parser.add_argument("--db", default="gty_scripture_index.sqlite", help="Verse index database file")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="Index a <year>/<item>.txt tree or a corpus pack (incremental)")
+    build.add_argument("source", help="Text directory or .pack file")
+    build.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+    lookup = subparsers.add_parser("lookup", help='Find sermons citing a passage, e.g. "Romans 8" or "Matthew 7:21"')
+    lookup.add_argument("reference")
+    lookup.add_argument("--start-year", type=int)
+    lookup.add_argument("--end-year", type=int)
+    extract = subparsers.add_parser("extract", help="Print the references found in one transcript file")
+    extract.add_argument("file")
+    args = parser.parse_args()
+
+    if args.command == "extract":
+        with open(args.file, 'r', encoding='utf-8', newline='') as f:
+            for book, chapter, verse, verse_end, offset in extract_references(f.read()):
+                print(f"{offset}\t{format_reference(book, chapter, verse, verse_end)}")
+        return 0
+
+    index = ScriptureIndex(args.db)
+    try:
+        if args.command == "build":
+            start = time.perf_counter()
+            if os.path.isdir(args.source):
+                count = build_from_directory(index, args.source, args.workers)
+            else:
+                count = build_from_pack(index, args.source, args.workers)
+            print(f"Đã cập nhật {count} transcript ({time.perf_counter() - start:.1f} s)")
+        else:
+            try:
+                reference = parse_reference(args.reference)
+            except ValueError as e:
+                print(str(e), file=sys.stderr)
+                return 1
+            start = time.perf_counter()
+            results = index.lookup(*reference, start_year=args.start_year, end_year=args.end_year)
+            elapsed = (time.perf_counter() - start) * 1000
+            for year, item, hits in results:
+                print(f"{year}/{item}\t" + ", ".join(sorted({reference for _, reference in hits})))
+            print(f"{len(results)} bài giảng ({elapsed:.1f} ms)", file=sys.stderr)
+    finally:
+        index.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+import time
+from contextlib import ExitStack
+
+from adaptive_scheduler import AdaptiveScheduler, ByteBucket
+
+
+def _close_window(scheduler, seconds=1.0):
+    # Giả lập cửa sổ đo đã kéo dài `seconds` rồi cho scheduler điều chỉnh
+    with scheduler.cond:
+        interval, scheduler.interval = scheduler.interval, seconds
+        scheduler.window_start = time.monotonic() - seconds
+        scheduler._maybe_adjust()
+        scheduler.interval = interval
+
+
+def _run(scheduler, outcomes, amount=1024 * 1024):
+    # outcomes: 'ok', 'error' (lỗi tạm thời) hoặc 'missing' (404, MP3 hỏng)
+    for outcome in outcomes:
+        with scheduler.slot() as transfer:
+            transfer.add_bytes(amount if outcome == 'ok' else 0)
+            transfer.success = outcome == 'ok'
+            if outcome == 'error':
+                transfer.mark_error()
+
+
+def test_limit_grows_while_throughput_grows():
+    scheduler = AdaptiveScheduler(min_workers=1, max_workers=8, initial_workers=2, interval=3600)
+    with ExitStack() as stack:
+        for _ in range(2):
+            stack.enter_context(scheduler.slot()).add_bytes(1024 * 1024)
+    _close_window(scheduler)
+    assert scheduler.limit == 3
+
+
+def test_limit_shrinks_when_throughput_drops():
+    scheduler = AdaptiveScheduler(min_workers=1, max_workers=8, initial_workers=4, interval=3600)
+    scheduler.last_throughput = 10 * 1024 * 1024
+    _run(scheduler, ['ok'] * 2)
+    _close_window(scheduler)
+    assert scheduler.limit == 3
+
+
+def test_transient_errors_halve_limit():
+    scheduler = AdaptiveScheduler(min_workers=1, max_workers=16, initial_workers=8, interval=3600)
+    _run(scheduler, ['ok', 'error', 'error'])
+    _close_window(scheduler)
+    assert scheduler.limit == 4
+    _run(scheduler, ['error'] * 3)
+    _close_window(scheduler)
+    assert scheduler.limit == 2
+
+
+def test_permanent_failures_do_not_count_as_errors():
+    scheduler = AdaptiveScheduler(min_workers=1, max_workers=16, initial_workers=8, interval=3600)
+    scheduler.last_throughput = 1024 * 1024
+    _run(scheduler, ['ok'] + ['missing'] * 9)
+    _close_window(scheduler)
+    assert scheduler.limit == 8
+
+
+def test_byte_bucket_paces_to_rate():
+    bucket = ByteBucket(rate=1024 * 1024, burst=100 * 1024)
+    start = time.monotonic()
+    for _ in range(3):
+        bucket.consume(100 * 1024)
+    elapsed = time.monotonic() - start
+    # Lần đầu dùng burst, hai lần sau phải chờ 200 KB / (1 MB/s) ≈ 0.2 s
+    assert 0.18 <= elapsed < 1.0
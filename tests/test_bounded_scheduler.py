@@ -0,0 +1,40 @@
+import os
+import signal
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCRIPT = """
+import sys, time
+from bounded_scheduler import BoundedScheduler
+
+def abort():
+    with open(sys.argv[1], 'w') as f:
+        f.write('flushed')
+
+with BoundedScheduler(2, on_abort=abort) as scheduler:
+    print('ready', flush=True)
+    for item, future in scheduler.map(lambda item: time.sleep(30), range(4)):
+        pass
+"""
+
+
+def test_second_sigint_exits_without_waiting_for_workers(tmp_path):
+    marker = tmp_path / "aborted"
+    process = subprocess.Popen([sys.executable, "-c", SCRIPT, str(marker)], cwd=ROOT,
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    try:
+        assert process.stdout.readline().strip() == 'ready'
+        time.sleep(0.2)
+        start = time.monotonic()
+        process.send_signal(signal.SIGINT)
+        time.sleep(0.2)
+        process.send_signal(signal.SIGINT)
+        assert process.wait(timeout=10) == 130
+        assert time.monotonic() - start < 10
+        assert marker.read_text() == 'flushed'
+    finally:
+        process.kill()
+        process.stdout.close()
@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+from corpus_pack import CorpusPackReader, CorpusPackWriter
+
+
+def _crash(writer):
+    # Dừng đột ngột: file đóng nhưng index không được lưu lại
+    writer.file.close()
+
+
+@pytest.mark.parametrize("codec", ["zlib", "zstd"])
+def test_items_added_after_last_index_save_survive_crash(tmp_path, codec):
+    if codec == "zstd":
+        pytest.importorskip("zstandard")
+    pack_file = str(tmp_path / "gty.pack")
+    writer = CorpusPackWriter(pack_file, codec, save_every=200)
+    for number in range(5):
+        writer.add("1969", f"{number}", f"transcript {number} " * 50)
+    _crash(writer)
+    with open(pack_file, 'ab') as f:
+        f.write(b'GR\x05\x00torn')
+
+    writer = CorpusPackWriter(pack_file, save_every=200)
+    assert writer.codec == codec
+    assert all(writer.contains("1969", f"{number}") for number in range(5))
+    writer.add("1970", "new", "after restart")
+    writer.close()
+
+    with CorpusPackReader(pack_file) as reader:
+        assert len(reader) == 6
+        assert reader.get("1969", "3") == "transcript 3 " * 50
+        assert reader.get("1970", "new") == "after restart"
+
+
+def test_rebuilds_lost_index(tmp_path):
+    pack_file = str(tmp_path / "gty.pack")
+    writer = CorpusPackWriter(pack_file, "zlib")
+    writer.add("1969", "1316A", "first")
+    writer.add("1969", "1316A", "second")
+    _crash(writer)
+    os.remove(pack_file + '.idx.json')
+
+    CorpusPackWriter(pack_file).close()
+    with CorpusPackReader(pack_file) as reader:
+        assert reader.keys() == [("1969", "1316A")]
+        assert reader.get("1969", "1316A") == "second"
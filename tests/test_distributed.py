@@ -0,0 +1,50 @@
+import time
+
+import distributed
+from distributed import LeaseStore
+
+URLS = [(f"https://www.gty.org/library/sermons-library/{item}", "1969", item) for item in ("1316A", "1316B", "1317A")]
+
+
+def test_complete_ignores_reclaimed_lease(tmp_path):
+    db_file = str(tmp_path / "tasks.sqlite")
+    first = LeaseStore(db_file, node_id="a", lease_seconds=0.05)
+    second = LeaseStore(db_file, node_id="b", lease_seconds=60)
+    try:
+        first.seed("text", URLS[:1])
+        assert first.claim("text") == URLS[:1]
+        time.sleep(0.1)
+        assert second.claim("text") == URLS[:1]
+        assert first.complete("text", "1969", "1316A", False) is False
+        assert second.status() == [("text", "leased", 1)]
+        assert second.complete("text", "1969", "1316A", True) is True
+        assert second.status() == [("text", "done", 1)]
+    finally:
+        first.close()
+        second.close()
+
+
+def test_queued_items_keep_their_lease(tmp_path, monkeypatch):
+    db_file = str(tmp_path / "tasks.sqlite")
+    store = LeaseStore(db_file, node_id="a", lease_seconds=0.3)
+    other = LeaseStore(db_file, node_id="b", lease_seconds=60)
+    stolen = []
+
+    def make_processor(kind, output_dir, tracker, session, segments):
+        def process(url_info):
+            # Mỗi item chạy lâu hơn nửa lease: item cuối trong batch chờ quá lease_seconds
+            time.sleep(0.2)
+            stolen.extend(other.claim("text"))
+            return (True,)
+        return process
+
+    monkeypatch.setattr(distributed, '_make_processor', make_processor)
+    try:
+        store.seed("text", URLS)
+        completed = distributed.run_worker(store, "text", str(tmp_path / "nodes"), rps=1000, workers=1, batch=3)
+        assert stolen == []
+        assert completed == 3
+        assert store.status() == [("text", "done", 3)]
+    finally:
+        store.close()
+        other.close()
@@ -0,0 +1,64 @@
+import glob
+import os
+
+import pytest
+
+from extractors import extract_bs4, extract_lxml, extract_targeted, lxml_available
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES_DIR = os.path.join(ROOT, "fixtures", "html")
+FIXTURES = sorted(glob.glob(os.path.join(FIXTURES_DIR, "*.html")))
+# Trang thật tải bằng: python extractors.py --fetch https://www.gty.org/library/sermons-library/<item>
+REAL_FIXTURES = [path for path in FIXTURES if not os.path.basename(path).startswith("synthetic_")]
+
+EXTRACTORS = [pytest.param(extract_targeted, id="targeted"),
+              pytest.param(extract_lxml, id="lxml",
+                           marks=pytest.mark.skipif(not lxml_available(), reason="lxml is not installed"))]
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def _saved_transcript(fixture):
+    # Transcript mà scraper gốc (BeautifulSoup) đã lưu cho cùng item, vd. gty_sermons_text/1969/1316A.txt
+    item = os.path.splitext(os.path.basename(fixture))[0]
+    for path in glob.glob(os.path.join(ROOT, "gty_sermons_text", "*", f"{item}.txt")):
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            return f.read()
+    return None
+
+
+@pytest.mark.parametrize("fixture", FIXTURES, ids=os.path.basename)
+@pytest.mark.parametrize("extract", EXTRACTORS)
+def test_matches_bs4(extract, fixture):
+    content = _read(fixture)
+    assert extract(content) == extract_bs4(content)
+
+
+def test_missing_section_returns_none():
+    content = _read(os.path.join(FIXTURES_DIR, "synthetic_missing.html"))
+    assert extract_bs4(content) is None
+    assert extract_targeted(content) is None
+
+
+@pytest.mark.parametrize("extract", EXTRACTORS)
+def test_utf8_without_meta_charset(extract):
+    # Không có <meta charset>: bytes phải được đọc là UTF-8, không phải Latin-1
+    content = _read(os.path.join(FIXTURES_DIR, "synthetic_no_charset.html"))
+    assert extract(content).startswith("Café “quoted” — naïve résumé of the Lord’s grace.")
+
+
+@pytest.mark.skipif(not REAL_FIXTURES, reason="no saved gty.org page in fixtures/html (see extractors.py --fetch)")
+@pytest.mark.parametrize("fixture", REAL_FIXTURES, ids=os.path.basename)
+def test_real_page_matches_saved_transcript(fixture):
+    content = _read(fixture)
+    expected = extract_bs4(content)
+    assert expected
+    saved = _saved_transcript(fixture)
+    if saved is not None:
+        assert expected == saved
+    assert extract_targeted(content) == expected
+    if lxml_available():
+        assert extract_lxml(content) == expected
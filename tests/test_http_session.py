@@ -0,0 +1,131 @@
+import sys
+import time
+
+import pytest
+import requests
+
+import http_session
+from mock_gty_server import MockGTYServer, ServerConfig
+
+
+class ScriptedConfig(ServerConfig):
+    # Trả lần lượt các mã lỗi trong `statuses`, sau đó phục vụ bình thường
+    def __init__(self, statuses=()):
+        super().__init__(page_kb=1)
+        self.statuses = list(statuses)
+
+    def admit(self):
+        with self.lock:
+            self.stats['requests'] += 1
+            if self.statuses:
+                return self.statuses.pop(0)
+        return None
+
+
+class CountingServer(MockGTYServer):
+    def __init__(self, config):
+        super().__init__(config=config)
+        self.connections = 0
+
+    def get_request(self):
+        self.connections += 1
+        return super().get_request()
+
+
+@pytest.fixture
+def server():
+    servers = []
+
+    def start(statuses=()):
+        instance = CountingServer(ScriptedConfig(statuses))
+        instance.start()
+        servers.append(instance)
+        return instance
+
+    yield start
+    for instance in servers:
+        instance.shutdown()
+        instance.server_close()
+
+
+def test_retries_503_then_succeeds(server):
+    mock = server([503, 503])
+    session = http_session.create_session(pool_size=1, backoff_factor=0.01, backoff_jitter=0)
+    try:
+        response = session.get(mock.page_url('1316A'), timeout=10)
+    finally:
+        session.close()
+    assert response.status_code == 200
+    assert mock.config.stats['requests'] == 3
+
+
+def test_429_honours_retry_after(server):
+    mock = server([429])
+    session = http_session.create_session(pool_size=1, backoff_factor=0.01, backoff_jitter=0)
+    start = time.monotonic()
+    try:
+        response = session.get(mock.page_url('1316A'), timeout=10)
+    finally:
+        session.close()
+    assert response.status_code == 200
+    assert time.monotonic() - start >= 1.0
+    assert mock.config.stats['requests'] == 2
+
+
+def test_gives_up_after_retries(server):
+    mock = server([503] * 10)
+    session = http_session.create_session(pool_size=1, retries=2, backoff_factor=0.01, backoff_jitter=0)
+    try:
+        response = session.get(mock.page_url('1316A'), timeout=10)
+    finally:
+        session.close()
+    assert response.status_code == 503
+    assert mock.config.stats['requests'] == 3
+
+
+def test_session_reuses_connection(server):
+    mock = server()
+    session = http_session.create_session(pool_size=2)
+    try:
+        for item in ('1316A', '1316B', '1317A', '1317B', '1200'):
+            assert session.get(mock.page_url(item), timeout=10).status_code == 200
+    finally:
+        session.close()
+    assert mock.connections == 1
+
+
+def test_http2_falls_back_without_httpx(monkeypatch):
+    monkeypatch.setattr(http_session, 'httpx', None)
+    session = http_session.create_session(http2=True)
+    try:
+        assert isinstance(session, requests.Session)
+    finally:
+        session.close()
+
+
+def test_http2_falls_back_without_h2(monkeypatch):
+    monkeypatch.setattr(http_session, 'httpx', object())
+    monkeypatch.setitem(sys.modules, 'h2', None)
+    assert http_session.create_http2_client(4) is None
+    session = http_session.create_session(http2=True)
+    try:
+        assert isinstance(session, requests.Session)
+    finally:
+        session.close()
+
+
+def test_permanent_errors_are_not_retried(server, tmp_path):
+    import main
+    mock = server([503])
+    tracker = main.ProgressTracker(str(tmp_path / "progress.json"), 2)
+    session = http_session.create_session(pool_size=1, retries=0)
+    try:
+        missing = (f"{mock.base_url}/no-such-page", "1969", "9999")
+        assert main.process_url(missing, str(tmp_path), tracker, session, delay=0) == (False, None)
+        busy = (mock.page_url('1316A'), "1969", "1316A")
+        success, filename = main.process_url(busy, str(tmp_path), tracker, session, delay=0)
+        assert not success and filename is not None
+        assert main.process_url(busy, str(tmp_path), tracker, session, delay=0)[0]
+    finally:
+        session.close()
+        tracker.close()
@@ -0,0 +1,76 @@
+import os
+
+from manifest import DirectoryManifest
+
+
+def _write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'w') as f:
+        f.write(text)
+    os.replace(path + '.tmp', path)
+
+
+def _scanned_years(manifest, monkeypatch):
+    scanned = []
+    original = manifest._scan_year
+
+    def scan(year, year_path, mtime_ns):
+        scanned.append(year)
+        original(year, year_path, mtime_ns)
+
+    monkeypatch.setattr(manifest, '_scan_year', scan)
+    return scanned
+
+
+def test_recorded_years_are_not_rescanned(tmp_path, monkeypatch):
+    base = str(tmp_path / "gty_sermons")
+    manifest = DirectoryManifest(base, '.txt')
+    manifest.refresh()
+    for year, item in (("1969", "1316A"), ("1969", "1316B"), ("1970", "1200")):
+        path = os.path.join(base, year, f"{item}.txt")
+        _write(path, item)
+        manifest.record(path)
+    manifest.close()
+
+    reopened = DirectoryManifest(base, '.txt')
+    scanned = _scanned_years(reopened, monkeypatch)
+    reopened.refresh()
+    assert scanned == []
+    assert set(reopened.items()) == {("1969", "1316A"), ("1969", "1316B"), ("1970", "1200")}
+
+
+def test_other_changes_still_trigger_rescan(tmp_path, monkeypatch):
+    base = str(tmp_path / "gty_sermons")
+    manifest = DirectoryManifest(base, '.txt')
+    _write(os.path.join(base, "1969", "extern.txt"), "x")
+    path = os.path.join(base, "1969", "1316A.txt")
+    _write(path, "a")
+    manifest.record(path)
+    manifest.close()
+
+    reopened = DirectoryManifest(base, '.txt')
+    scanned = _scanned_years(reopened, monkeypatch)
+    reopened.refresh()
+    assert scanned == ["1969"]
+    assert set(reopened.items()) == {("1969", "1316A"), ("1969", "extern")}
+
+
+def test_record_does_not_list_year_directory(tmp_path, monkeypatch):
+    base = str(tmp_path / "gty_sermons")
+    manifest = DirectoryManifest(base, '.txt', save_every=1000)
+    manifest.refresh()
+    stamped = []
+    original = manifest._stamp_year
+
+    def stamp(year, year_path):
+        stamped.append(year)
+        original(year, year_path)
+
+    monkeypatch.setattr(manifest, '_stamp_year', stamp)
+    for item in ("1316A", "1316B", "1317A"):
+        path = os.path.join(base, "1969", f"{item}.txt")
+        _write(path, item)
+        manifest.record(path)
+    assert stamped == []
+    manifest.close()
+    assert stamped == ["1969"]
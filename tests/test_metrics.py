@@ -0,0 +1,31 @@
+import threading
+
+from metrics import Registry, render_json
+
+
+def test_sharded_metrics_sum_across_threads():
+    registry = Registry()
+    counter = registry.counter('items_total')
+    histogram = registry.histogram('fetch_seconds', buckets=(0.1, 1.0))
+
+    def work():
+        for _ in range(1000):
+            counter.inc()
+            histogram.observe(0.5)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert counter.value() == 4000
+    assert histogram.snapshot() == ([0, 4000, 0], 2000.0, 4000)
+
+
+def test_gauge_reregistration_replaces_function():
+    registry = Registry()
+    first = registry.gauge('queue_depth', function=lambda: 5)
+    second = registry.gauge('queue_depth', function=lambda: 7)
+    assert second is first
+    assert render_json(registry)['metrics']['gty_queue_depth'] == 7
+    assert registry.gauge('queue_depth').value() == 7
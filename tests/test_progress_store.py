@@ -0,0 +1,25 @@
+from progress_store import ProgressJournal
+
+
+def test_replay_skips_corrupt_middle_line(tmp_path):
+    snapshot = tmp_path / "progress.json"
+    journal = tmp_path / "progress.json.journal"
+    journal.write_text('{"y": "1969", "i": "a"}\n{garbage\n{"y": "1969", "i": "b"}\n')
+    successful, progress = ProgressJournal(str(snapshot)).load()
+    assert successful == 2
+    assert progress == {"1969": ["a", "b"]}
+    assert journal.read_text().count("\n") == 3
+
+
+def test_replay_truncates_only_torn_last_line(tmp_path):
+    snapshot = tmp_path / "progress.json"
+    journal = tmp_path / "progress.json.journal"
+    journal.write_text('{"y": "1969", "i": "a"}\n{"y": "1969", "i": "b"}\n{"y": "19')
+    progress_journal = ProgressJournal(str(snapshot))
+    _, progress = progress_journal.load()
+    assert progress == {"1969": ["a", "b"]}
+    assert journal.read_text() == '{"y": "1969", "i": "a"}\n{"y": "1969", "i": "b"}\n'
+    progress_journal.append("1969", "c")
+    progress_journal.close()
+    _, progress = ProgressJournal(str(snapshot)).load()
+    assert progress == {"1969": ["a", "b", "c"]}
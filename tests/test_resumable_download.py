@@ -0,0 +1,93 @@
+import json
+import os
+
+import pytest
+import requests
+
+import resumable_download
+from mock_gty_server import MockGTYServer, ServerConfig, audio_payload, sermon_page
+
+
+class NoHeadServer(MockGTYServer):
+    def __init__(self, config):
+        super().__init__(config=config)
+        self.methods = []
+
+
+@pytest.fixture
+def mock():
+    server = NoHeadServer(ServerConfig(page_kb=4, audio_kb=3 * 1024))
+    original = server.RequestHandlerClass
+
+    class Handler(original):
+        def do_HEAD(self):
+            # CDN từ chối HEAD
+            server.methods.append('HEAD')
+            self._send_error(405)
+
+        def do_GET(self):
+            server.methods.append('GET')
+            super().do_GET()
+
+    server.RequestHandlerClass = Handler
+    server.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_small_file_needs_one_request_and_no_head(mock, tmp_path):
+    target = str(tmp_path / "1969" / "1316A.mp3")
+    with requests.Session() as session:
+        size = resumable_download.download_file(mock.audio_url('1316A'), target, session)
+    expected = audio_payload('1316A', mock.config.audio_size)
+    assert size == len(expected)
+    with open(target, 'rb') as f:
+        assert f.read() == expected
+    assert mock.methods == ['GET']
+    assert not os.path.exists(target + '.part.json')
+
+
+def test_large_file_in_segments_and_resume(mock, tmp_path, monkeypatch):
+    monkeypatch.setattr(resumable_download, 'BLOCK_SIZE', 256 * 1024)
+    monkeypatch.setattr(resumable_download, 'PARALLEL_THRESHOLD', 512 * 1024)
+    expected = audio_payload('1316B', mock.config.audio_size)
+    target = str(tmp_path / "1316B.mp3")
+
+    def interrupted(session, url, fd, state, blocks, on_bytes=None):
+        # Tải được nửa số block thì mất kết nối
+        original(session, url, fd, state, blocks[:len(blocks) // 2], on_bytes)
+        raise resumable_download.DownloadError("ngắt")
+
+    original = resumable_download._fetch_blocks
+    monkeypatch.setattr(resumable_download, '_fetch_blocks', interrupted)
+    with requests.Session() as session:
+        with pytest.raises(resumable_download.DownloadError):
+            resumable_download.download_file(mock.audio_url('1316B'), target, session, segments=1)
+        with open(target + '.part.json') as f:
+            assert len(json.load(f)['blocks']) == 6
+        monkeypatch.setattr(resumable_download, '_fetch_blocks', original)
+        digests = []
+        resumable_download.download_file(mock.audio_url('1316B'), target, session, segments=4,
+                                         on_digest=digests.append)
+    with open(target, 'rb') as f:
+        assert f.read() == expected
+    hasher = resumable_download.BlockHasher()
+    hasher.update(expected)
+    assert digests == [hasher.hexdigest()]
+    assert 'HEAD' not in mock.methods
+
+
+def test_server_ignoring_range_gets_whole_body(mock, tmp_path):
+    # Trang HTML của mock không hỗ trợ Range: response 200 của request đầu được ghi nguyên
+    target = str(tmp_path / "page.html")
+    with requests.Session() as session:
+        size = resumable_download.download_file(mock.page_url('1200'), target, session)
+    assert size == len(sermon_page('1200', mock.config.page_size))
+    assert mock.methods == ['GET']
+
+
+def test_missing_file_raises(mock, tmp_path):
+    with requests.Session() as session:
+        with pytest.raises(requests.HTTPError):
+            resumable_download.download_file(mock.base_url + "/nothing", str(tmp_path / "x.mp3"), session)
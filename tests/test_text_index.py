@@ -0,0 +1,102 @@
+import random
+import sqlite3
+from array import array
+
+import text_index
+from text_index import TranscriptIndex, tokenize
+
+WORDS = ["the"] * 12 + ["of"] * 6 + ["lord"] * 2 + "and in he is you know kingdom god job satan grace".split()
+
+
+def _corpus(count=40, length=600):
+    rng = random.Random(7)
+    return {(str(1965 + i % 20), f"{1000 + i}"): " ".join(rng.choice(WORDS) for _ in range(length))
+            for i in range(count)}
+
+
+def _expected(corpus, phrase, start_year=None, end_year=None):
+    terms = tokenize(phrase)
+    results = []
+    for (year, item), text in corpus.items():
+        if start_year is not None and int(year) < start_year or end_year is not None and int(year) > end_year:
+            continue
+        tokens = tokenize(text)
+        count = sum(tokens[i:i + len(terms)] == terms for i in range(len(tokens)))
+        if count:
+            results.append((year, item, count))
+    return sorted(results)
+
+
+def _build(db_file, corpus):
+    index = TranscriptIndex(db_file)
+    for (year, item), text in corpus.items():
+        index.add(year, item, text, commit=False)
+    index.commit()
+    return index
+
+
+def test_phrases_match_brute_force(tmp_path):
+    corpus = _corpus()
+    index = _build(str(tmp_path / "index.sqlite"), corpus)
+    try:
+        for phrase in ("the", "job", "the lord", "of the lord", "the the", "you know god", "satan job grace"):
+            assert index.search(f'"{phrase}"') == _expected(corpus, phrase), phrase
+            assert index.search(f'"{phrase}"', 1970, 1975) == _expected(corpus, phrase, 1970, 1975), phrase
+        assert index.search('"no such words"') == []
+    finally:
+        index.close()
+
+
+def test_positions_use_bitmap_only_when_dense():
+    dense = text_index.encode_positions(array('I', range(0, 700, 3)))
+    sparse = text_index.encode_positions(array('I', [5, 900, 4000]))
+    assert dense[:1] == text_index.BITMAP
+    assert sparse[:1] == text_index.ARRAY
+    assert text_index._count(dense) == len(range(0, 700, 3))
+    assert text_index._count(sparse) == 3
+
+
+def test_readd_replaces_document(tmp_path):
+    index = TranscriptIndex(str(tmp_path / "index.sqlite"))
+    try:
+        index.add("1969", "1316A", "the kingdom of God is near")
+        index.add("1970", "1200", "the kingdom of heaven")
+        assert index.search('"kingdom of God"') == [("1969", "1316A", 1)]
+        index.add("1969", "1316A", "grace and truth")
+        assert index.search('"kingdom of God"') == []
+        assert index.search("kingdom") == [("1970", "1200", 1)]
+        assert index.conn.execute("SELECT df FROM terms WHERE term = 'god'").fetchone() == (0,)
+    finally:
+        index.close()
+
+
+def test_migrates_array_postings(tmp_path):
+    # Chỉ mục do phiên bản trước tạo: vị trí là array uint32 trần, không có bảng terms
+    db_file = str(tmp_path / "old.sqlite")
+    corpus = _corpus(count=10)
+    conn = sqlite3.connect(db_file)
+    conn.executescript("""
+        CREATE TABLE docs (doc_id INTEGER PRIMARY KEY, year TEXT NOT NULL, item TEXT NOT NULL,
+                           length INTEGER NOT NULL, UNIQUE (year, item));
+        CREATE TABLE postings (term TEXT NOT NULL, doc_id INTEGER NOT NULL, positions BLOB NOT NULL,
+                               PRIMARY KEY (term, doc_id)) WITHOUT ROWID;
+        CREATE INDEX postings_doc ON postings (doc_id);
+    """)
+    for (year, item), text in corpus.items():
+        tokens = tokenize(text)
+        doc_id = conn.execute("INSERT INTO docs (year, item, length) VALUES (?, ?, ?)",
+                              (year, item, len(tokens))).lastrowid
+        positions = {}
+        for position, token in enumerate(tokens):
+            positions.setdefault(token, array('I')).append(position)
+        conn.executemany("INSERT INTO postings VALUES (?, ?, ?)",
+                         ((term, doc_id, values.tobytes()) for term, values in positions.items()))
+    conn.commit()
+    conn.close()
+
+    index = TranscriptIndex(db_file)
+    try:
+        assert index.search('"of the lord"') == _expected(corpus, "of the lord")
+        assert index.search('"job"') == _expected(corpus, "job")
+    finally:
+        index.close()
@@ -0,0 +1,13 @@
+from transcript_normalizer import split_sentences
+
+
+def test_closing_quotes_and_brackets_stay_with_sentence():
+    assert split_sentences('He said, "Go home." Then he left. (See verse 3.) And so on.') == [
+        'He said, "Go home."', 'Then he left.', '(See verse 3.)', 'And so on.']
+    assert split_sentences("[Applause.] 'Amen!' \"Is it?\") Yes.") == [
+        '[Applause.]', "'Amen!'", '"Is it?")', 'Yes.']
+
+
+def test_abbreviations_do_not_end_sentences():
+    assert split_sentences('Turn to Rom. 8:28 with Dr. Smith. "Look at v. 29." We read it.') == [
+        'Turn to Rom. 8:28 with Dr. Smith.', '"Look at v. 29."', 'We read it.']
@@ -0,0 +1,300 @@
+import os
+import re
+import sys
+import time
+import sqlite3
+import argparse
+import threading
+from array import array
+
+TOKEN_PATTERN = re.compile(r"\w+")
+QUERY_PATTERN = re.compile(r'"([^"]+)"|(\S+)')
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower().replace('_', ' '))
+
+
+SCHEMA_VERSION = 2
+# Danh sách vị trí của một term trong một bài: b'A' + array uint32 khi thưa, b'M' + bitmap (bit i = vị trí i)
+# khi dày. Với bitmap, khớp cụm từ giữa các từ phổ biến ("and the", "in the") chỉ là vài phép AND/dịch bit
+# trên số nguyên lớn thay vì duyệt từng vị trí trong Python.
+ARRAY = b'A'
+BITMAP = b'M'
+DENSE_RATIO = 16
+
+
+def encode_positions(positions):
+    bitmap_size = positions[-1] // 8 + 1
+    if bitmap_size <= len(positions) * DENSE_RATIO:
+        bits = bytearray(bitmap_size)
+        for position in positions:
+            bits[position >> 3] |= 1 << (position & 7)
+        return BITMAP + bytes(bits)
+    return ARRAY + positions.tobytes()
+
+
+def _count(blob):
+    if blob[:1] == BITMAP:
+        return int.from_bytes(blob[1:], 'little').bit_count()
+    return (len(blob) - 1) // 4
+
+
+def _positions(blob):
+    positions = array('I')
+    positions.frombytes(blob[1:])
+    return positions
+
+
+def _bitmap(blob):
+    if blob[:1] == BITMAP:
+        return int.from_bytes(blob[1:], 'little')
+    positions = _positions(blob)
+    bits = bytearray(positions[-1] // 8 + 1)
+    for position in positions:
+        bits[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def _phrase_count(steps, doc_id):
+    # steps: [(posting của term theo doc_id, các vị trí của term trong cụm từ)], term ít vị trí nhất đứng trước.
+    # Bitmap dịch phải theo vị trí trong cụm từ chỉ còn bit ở những vị trí bắt đầu mà term nằm đúng chỗ;
+    # AND tất cả rồi đếm bit, dừng ngay khi kết quả rỗng để khỏi giải mã bitmap của các từ phổ biến
+    match = -1
+    for postings, offsets in steps:
+        bitmap = _bitmap(postings[doc_id])
+        for offset in offsets:
+            match &= bitmap >> offset
+        if not match:
+            return 0
+    return match.bit_count()
+
+
+class TranscriptIndex:
+    # Chỉ mục ngược lưu trong SQLite: term -> (doc_id, danh sách vị trí), cộng bảng terms: term -> số bài chứa term
+    # để truy vấn đọc term hiếm nhất trước và chỉ đọc các term còn lại trong những bài còn ứng viên.
+    def __init__(self, db_file="gty_text_index.sqlite"):
+        self.db_file = db_file
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS docs (
+                doc_id INTEGER PRIMARY KEY,
+                year TEXT NOT NULL,
+                item TEXT NOT NULL,
+                length INTEGER NOT NULL,
+                UNIQUE (year, item)
+            );
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                doc_id INTEGER NOT NULL,
+                positions BLOB NOT NULL,
+                PRIMARY KEY (term, doc_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS postings_doc ON postings (doc_id);
+            CREATE TABLE IF NOT EXISTS terms (
+                term TEXT PRIMARY KEY,
+                df INTEGER NOT NULL
+            ) WITHOUT ROWID;
+        """)
+        if version < SCHEMA_VERSION:
+            self._migrate()
+
+    def _migrate(self):
+        # Chỉ mục tạo bởi phiên bản trước: vị trí là array uint32 không có tiền tố, chưa có bảng terms.
+        # Chép sang bảng mới theo luồng để không phải nạp cả chỉ mục vào bộ nhớ
+        if self.conn.execute("SELECT 1 FROM postings LIMIT 1").fetchone():
+            print(f"Đang chuyển chỉ mục {self.db_file} sang định dạng mới...", file=sys.stderr)
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE postings_new (
+                    term TEXT NOT NULL,
+                    doc_id INTEGER NOT NULL,
+                    positions BLOB NOT NULL,
+                    PRIMARY KEY (term, doc_id)
+                ) WITHOUT ROWID
+            """)
+            rows = self.conn.execute("SELECT term, doc_id, positions FROM postings")
+            self.conn.executemany("INSERT INTO postings_new (term, doc_id, positions) VALUES (?, ?, ?)",
+                                  ((term, doc_id, encode_positions(_positions(ARRAY + blob))) for term, doc_id, blob in rows))
+            self.conn.execute("DROP TABLE postings")
+            self.conn.execute("ALTER TABLE postings_new RENAME TO postings")
+            self.conn.execute("CREATE INDEX postings_doc ON postings (doc_id)")
+            self.conn.execute("DELETE FROM terms")
+            self.conn.execute("INSERT INTO terms (term, df) SELECT term, COUNT(*) FROM postings GROUP BY term")
+            self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.conn.execute("VACUUM")
+
+    def add(self, year, item, text, commit=True):
+        positions = {}
+        tokens = tokenize(text)
+        for position, token in enumerate(tokens):
+            positions.setdefault(token, array('I')).append(position)
+        with self.lock:
+            row = self.conn.execute("SELECT doc_id FROM docs WHERE year = ? AND item = ?", (year, item)).fetchone()
+            if row:
+                doc_id = row[0]
+                self.conn.execute("UPDATE terms SET df = df - 1 WHERE term IN (SELECT term FROM postings WHERE doc_id = ?)",
+                                  (doc_id,))
+                self.conn.execute("DELETE FROM postings WHERE doc_id = ?", (doc_id,))
+                self.conn.execute("UPDATE docs SET length = ? WHERE doc_id = ?", (len(tokens), doc_id))
+            else:
+                doc_id = self.conn.execute("INSERT INTO docs (year, item, length) VALUES (?, ?, ?)",
+                                           (year, item, len(tokens))).lastrowid
+            self.conn.executemany("INSERT INTO postings (term, doc_id, positions) VALUES (?, ?, ?)",
+                                  ((term, doc_id, encode_positions(values)) for term, values in positions.items()))
+            self.conn.executemany("INSERT INTO terms (term, df) VALUES (?, 1) ON CONFLICT (term) DO UPDATE SET df = df + 1",
+                                  ((term,) for term in positions))
+            if commit:
+                self.conn.commit()
+
+    def on_transcript_saved(self, year, item, text):
+        self.add(year, item, text)
+
+    def commit(self):
+        with self.lock:
+            self.conn.commit()
+
+    def _year_documents(self, start_year, end_year):
+        sql = "SELECT doc_id FROM docs WHERE 1"
+        params = []
+        if start_year is not None:
+            sql += " AND CAST(year AS INTEGER) >= ?"
+            params.append(start_year)
+        if end_year is not None:
+            sql += " AND CAST(year AS INTEGER) <= ?"
+            params.append(end_year)
+        return {row[0] for row in self.conn.execute(sql, params)}
+
+    def _postings(self, term, df, doc_ids):
+        # Ít ứng viên: tra từng (term, doc_id) theo khoá chính; nhiều ứng viên: quét cả dải của term
+        # (có thể trả thừa bài ngoài doc_ids, caller tự giao lại)
+        if doc_ids is None or len(doc_ids) * 8 > df:
+            return dict(self.conn.execute("SELECT doc_id, positions FROM postings WHERE term = ?", (term,)))
+        result = {}
+        doc_ids = sorted(doc_ids)
+        for i in range(0, len(doc_ids), 500):
+            chunk = doc_ids[i:i + 500]
+            result.update(self.conn.execute(
+                f"SELECT doc_id, positions FROM postings WHERE term = ? AND doc_id IN ({','.join('?' * len(chunk))})",
+                [term] + chunk))
+        return result
+
+    def _match_phrase(self, terms, candidates):
+        unique_terms = list(dict.fromkeys(terms))
+        frequencies = dict(self.conn.execute(
+            f"SELECT term, df FROM terms WHERE term IN ({','.join('?' * len(unique_terms))}) AND df > 0", unique_terms))
+        if len(frequencies) < len(unique_terms):
+            return {}
+        # Đọc từ term hiếm đến phổ biến; mỗi bước chỉ đọc posting của các bài còn lại
+        postings = {}
+        doc_ids = candidates
+        for term in sorted(unique_terms, key=frequencies.get):
+            postings[term] = self._postings(term, frequencies[term], doc_ids)
+            doc_ids = set(postings[term]) if doc_ids is None else doc_ids.intersection(postings[term])
+            if not doc_ids:
+                return {}
+        if len(terms) == 1:
+            return {doc_id: _count(postings[terms[0]][doc_id]) for doc_id in doc_ids}
+        steps = [(postings[term], [offset for offset, other in enumerate(terms) if other == term])
+                 for term in sorted(unique_terms, key=lambda term: sum(map(len, postings[term].values())))]
+        matches = {}
+        for doc_id in doc_ids:
+            count = _phrase_count(steps, doc_id)
+            if count:
+                matches[doc_id] = count
+        return matches
+
+    def search(self, query, start_year=None, end_year=None):
+        # Cú pháp: "cụm từ chính xác" và các từ đơn, tất cả đều phải xuất hiện (AND).
+        # Trả về [(year, item, số lần khớp)]
+        with self.lock:
+            candidates = None
+            if start_year is not None or end_year is not None:
+                candidates = self._year_documents(start_year, end_year)
+            hits = {}
+            for phrase, word in QUERY_PATTERN.findall(query):
+                terms = tokenize(phrase or word)
+                if not terms:
+                    continue
+                matches = self._match_phrase(terms, candidates)
+                candidates = set(matches)
+                hits = {doc_id: hits.get(doc_id, 0) + matches[doc_id] for doc_id in candidates}
+                if not candidates:
+                    return []
+            if not hits:
+                return []
+            rows = self.conn.execute(
+                f"SELECT doc_id, year, item FROM docs WHERE doc_id IN ({','.join('?' * len(hits))})",
+                list(hits)).fetchall()
+            return sorted((year, item, hits[doc_id]) for doc_id, year, item in rows)
+
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
+
+
+def build_from_directory(index, text_dir):
+    count = 0
+    for year in sorted(os.listdir(text_dir)):
+        year_dir = os.path.join(text_dir, year)
+        if not year.isdigit() or not os.path.isdir(year_dir):
+            continue
+        for file in sorted(os.listdir(year_dir)):
+            if file.endswith('.txt'):
+                with open(os.path.join(year_dir, file), 'r', encoding='utf-8') as f:
+                    index.add(year, file[:-4], f.read(), commit=False)
+                count += 1
+    index.commit()
+    return count
+
+
+def build_from_pack(index, pack_file):
+    from corpus_pack import CorpusPackReader
+    count = 0
+    with CorpusPackReader(pack_file) as reader:
+        for year, item, text in reader:
+            index.add(year, item, text, commit=False)
+            count += 1
+    index.commit()
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Full-text index over scraped transcripts")
+    parser.add_argument("--db", default="gty_text_index.sqlite", help="Index database file")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="Index a <year>/<item>.txt tree or a corpus pack")
+    build.add_argument("source", help="Text directory or .pack file")
+    query = subparsers.add_parser("query", help='Search, e.g. \'"Matthew 7:21" kingdom\'')
+    query.add_argument("query")
+    query.add_argument("--start-year", type=int)
+    query.add_argument("--end-year", type=int)
+    args = parser.parse_args()
+
+    index = TranscriptIndex(args.db)
+    try:
+        if args.command == "build":
+            if os.path.isdir(args.source):
+                count = build_from_directory(index, args.source)
+            else:
+                count = build_from_pack(index, args.source)
+            print(f"Đã lập chỉ mục {count} transcript")
+        else:
+            start = time.perf_counter()
+            results = index.search(args.query, args.start_year, args.end_year)
+            elapsed = (time.perf_counter() - start) * 1000
+            for year, item, count in results:
+                print(f"{year}/{item}\t{count} kết quả")
+            print(f"{len(results)} bài giảng ({elapsed:.1f} ms)", file=sys.stderr)
+    finally:
+        index.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
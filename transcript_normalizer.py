@@ -0,0 +1,271 @@
+import os
+import re
+import sys
+import time
+import sqlite3
+import hashlib
+import logging
+import argparse
+import threading
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+
+# Tăng số này mỗi khi đổi quy tắc: lần chạy sau sẽ chuẩn hoá lại toàn bộ corpus (song song theo số core)
+RULES_VERSION = "2"
+
+CHARACTER_MAP = str.maketrans({
+    '\u2018': "'", '\u2019': "'", '\u201a': "'", '\u201b': "'", '\u2032': "'",
+    '\u201c': '"', '\u201d': '"', '\u201e': '"', '\u201f': '"', '\u2033': '"',
+    '\u2010': '-', '\u2011': '-', '\u2012': '-', '\u2212': '-',
+    '\u2013': '\u2014', '\u2015': '\u2014',
+    '\u00ad': None, '\u200b': None, '\u200c': None, '\u200d': None, '\u2060': None, '\ufeff': None,
+    '\r': '\n', '\t': ' ', '\u2028': '\n', '\u2029': '\n',
+})
+
+# Dòng rác của trang web lọt vào transcript (nút Smart Transcript, chân trang, thông báo bản quyền)
+BOILERPLATE = re.compile(
+    r'^\s*(?:To enable Smart Transcript\b.*'
+    r'|Available online at:?\s.*'
+    r'|COPYRIGHT\s*(?:\(C\)|©)?\s*\d{4}.*Grace to You.*'
+    r'|You may reproduce this Grace to You content\b.*'
+    r'|This sermon series includes the following messages:?.*'
+    r'|Please contact Grace to You\b.*)\s*$', re.IGNORECASE)
+# Nhãn người nói viết hoa ở đầu đoạn: "JOHN:", "QUESTION:", "JOHN MACARTHUR:"
+SPEAKER_LABEL = re.compile(r"^(?:[A-Z][A-Z.'-]*(?: [A-Z][A-Z.'-]*){0,2}):\s+")
+STAGE_DIRECTION = re.compile(
+    r'\s*[(\[](?:applause|laughter|laughs|inaudible|unintelligible|pause|music|singing|silence|crosstalk'
+    r'|audience [^)\]]{0,40}|end of (?:tape|side|recording)[^)\]]{0,20})[)\]]', re.IGNORECASE)
+# Đoạn bị dính liền khi trích HTML: "...about Satan.I think..." (câu kết thúc, ngay sau là chữ hoa)
+GLUED_PARAGRAPH = re.compile(r'(?<=[a-z0-9)"\'][.!?])(["\']?)(?=[A-Z][a-z\' ])')
+EN_DASH_RANGE = re.compile(r'(?<=\d)\u2013(?=\d)')
+SPACES = re.compile(r'[ \u00a0\u2000-\u200a\u202f\u205f\u3000]+')
+SPACE_BEFORE_PUNCTUATION = re.compile(r' +([,.;:!?])(?=\s|$)')
+
+ABBREVIATIONS = {'mr', 'mrs', 'ms', 'dr', 'st', 'jr', 'sr', 'rev', 'prof', 'vs', 'etc', 'cf', 'ch', 'chap', 'v', 'vv',
+                 'no', 'vol', 'p', 'pp', 'ca', 'e.g', 'i.e', 'a.m', 'p.m', 'b.c', 'a.d', 'u.s'}
+# Nhóm 1: dấu đóng ngoặc/nháy sau dấu kết câu, thuộc về câu trước ('..."Go home." Then...')
+SENTENCE_END = re.compile(r'(?<=[.!?])(["\')\]]*)\s+(?=["\'(\[]?[A-Z0-9])')
+
+
+def _abbreviations():
+    # Tên sách Kinh Thánh viết tắt ("Rom. 8:28", "1 Cor. 13") không phải là hết câu;
+    # tên đầy đủ thì có thể ("...the book of Job. I decided...")
+    from bible_data import BOOKS
+    names = {alias.split()[-1].lower() for name, _, aliases in BOOKS.values() for alias in aliases
+             if alias.split()[-1] != name.split()[-1]}
+    return ABBREVIATIONS | names
+
+
+_ABBREVIATIONS = None
+
+
+def split_sentences(paragraph):
+    global _ABBREVIATIONS
+    if _ABBREVIATIONS is None:
+        _ABBREVIATIONS = _abbreviations()
+    sentences = []
+    start = 0
+    for match in SENTENCE_END.finditer(paragraph):
+        words = paragraph[start:match.start()].rstrip('"\')]').split()
+        last_word = words[-1].rstrip('.!?').lower() if words else ''
+        initial = len(last_word) == 1 and words[-1][0].isupper() and words[-1][0] != 'I'
+        if paragraph[match.start() - 1] == '.' and (last_word in _ABBREVIATIONS or initial):
+            continue
+        sentences.append(paragraph[start:match.end(1)].strip())
+        start = match.end()
+    tail = paragraph[start:].strip()
+    if tail:
+        sentences.append(tail)
+    return sentences
+
+
+def normalize_paragraph(paragraph):
+    paragraph = STAGE_DIRECTION.sub('', paragraph)
+    paragraph = SPEAKER_LABEL.sub('', paragraph)
+    paragraph = SPACES.sub(' ', paragraph)
+    paragraph = SPACE_BEFORE_PUNCTUATION.sub(r'\1', paragraph)
+    return paragraph.strip()
+
+
+def normalize(text):
+    # Trả về list đoạn văn đã chuẩn hoá
+    text = unicodedata.normalize('NFKC', text)
+    text = EN_DASH_RANGE.sub('-', text)
+    text = text.translate(CHARACTER_MAP)
+    text = ''.join(c for c in text if c == '\n' or unicodedata.category(c)[0] != 'C')
+    text = GLUED_PARAGRAPH.sub(r'\1\n', text)
+    paragraphs = []
+    for line in text.split('\n'):
+        if BOILERPLATE.match(line):
+            continue
+        paragraph = normalize_paragraph(line)
+        if paragraph:
+            paragraphs.append(paragraph)
+    return paragraphs
+
+
+def render(paragraphs, sentences=False):
+    # Đoạn cách nhau một dòng trống; với sentences=True mỗi câu một dòng
+    if sentences:
+        return '\n\n'.join('\n'.join(split_sentences(paragraph)) for paragraph in paragraphs) + '\n'
+    return '\n\n'.join(paragraphs) + '\n'
+
+
+def normalize_text(text, sentences=False):
+    return render(normalize(text), sentences)
+
+
+def _write(target, text):
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    temp_file = target + '.tmp'
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(temp_file, target)
+
+
+def _normalize_job(job):
+    # Chạy trong process con: đọc nguồn, bỏ qua nếu hash không đổi, ngược lại chuẩn hoá và ghi đích
+    source, target, known_hash, sentences = job
+    with open(source, 'rb') as f:
+        data = f.read()
+    stat = os.stat(source)
+    source_hash = hashlib.sha256(data).hexdigest()
+    if source_hash == known_hash and os.path.exists(target):
+        return source_hash, stat.st_size, stat.st_mtime_ns, False
+    _write(target, normalize_text(data.decode('utf-8', errors='replace'), sentences))
+    return source_hash, stat.st_size, stat.st_mtime_ns, True
+
+
+class TranscriptNormalizer:
+    # <output_dir>/<year>/<item>.txt + chỉ mục <output_dir>.index.sqlite:
+    # (year, item) -> sha256 nguồn, phiên bản quy tắc, size/mtime nguồn.
+    # Nguồn không đổi (cùng hash, cùng RULES_VERSION) thì không chuẩn hoá lại.
+    # Cũng là hook cho main.py: on_transcript_saved chuẩn hoá ngay transcript vừa tải.
+    def __init__(self, output_dir="gty_sermons_normalized", sentences=False):
+        self.output_dir = output_dir
+        self.sentences = sentences
+        self.rules = RULES_VERSION + ('s' if sentences else '')
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.normpath(output_dir) + '.index.sqlite', check_same_thread=False)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS normalized (
+                year TEXT NOT NULL,
+                item TEXT NOT NULL,
+                source_hash TEXT NOT NULL,
+                rules TEXT NOT NULL,
+                size INTEGER,
+                mtime_ns INTEGER,
+                PRIMARY KEY (year, item)
+            ) WITHOUT ROWID;
+        """)
+
+    def target(self, year, item):
+        return os.path.join(self.output_dir, year, f"{item}.txt")
+
+    def _record(self, year, item, source_hash, size=None, mtime_ns=None):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO normalized (year, item, source_hash, rules, size, mtime_ns) "
+                              "VALUES (?, ?, ?, ?, ?, ?)", (year, item, source_hash, self.rules, size, mtime_ns))
+
+    def on_transcript_saved(self, year, item, text):
+        source_hash = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        with self.lock:
+            row = self.conn.execute("SELECT source_hash, rules FROM normalized WHERE year = ? AND item = ?",
+                                    (year, item)).fetchone()
+        if row == (source_hash, self.rules) and os.path.exists(self.target(year, item)):
+            return
+        _write(self.target(year, item), normalize_text(text, self.sentences))
+        # size/mtime để trống: lần chạy hàng loạt sau sẽ hash file nguồn một lần, thấy trùng và bỏ qua
+        self._record(year, item, source_hash)
+        self.commit()
+
+    def run(self, source_files, workers=None, force=False):
+        # source_files: {(year, item): path}. Trả về (số file chuẩn hoá lại, số file giữ nguyên)
+        with self.lock:
+            known = {(year, item): (source_hash, rules, size, mtime_ns) for year, item, source_hash, rules, size, mtime_ns
+                     in self.conn.execute("SELECT year, item, source_hash, rules, size, mtime_ns FROM normalized")}
+        jobs = []
+        unchanged = 0
+        for key, path in source_files.items():
+            entry = known.get(key)
+            current = entry is not None and entry[1] == self.rules and not force
+            if current:
+                stat = os.stat(path)
+                if entry[2] == stat.st_size and entry[3] == stat.st_mtime_ns and os.path.exists(self.target(*key)):
+                    unchanged += 1
+                    continue
+            jobs.append((key, (path, self.target(*key), entry[0] if current else None, self.sentences)))
+        if not jobs:
+            return 0, unchanged
+        normalized = 0
+        workers = workers or os.cpu_count() or 1
+        chunksize = max(1, min(64, len(jobs) // (workers * 4)))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(_normalize_job, [job for _, job in jobs], chunksize=chunksize)
+            for count, (((year, item), _), (source_hash, size, mtime_ns, changed)) in enumerate(zip(jobs, results), 1):
+                self._record(year, item, source_hash, size, mtime_ns)
+                if changed:
+                    normalized += 1
+                else:
+                    unchanged += 1
+                if count % 500 == 0:
+                    self.commit()
+        self.commit()
+        return normalized, unchanged
+
+    def commit(self):
+        with self.lock:
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
+
+
+def source_files_in(text_dir):
+    from manifest import DirectoryManifest
+    manifest = DirectoryManifest(text_dir, '.txt')
+    manifest.refresh()
+    files = manifest.items()
+    manifest.close()
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Normalize transcripts (Unicode, paragraphs, boilerplate) into a parallel text tree")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run = subparsers.add_parser("run", help="Normalize a <year>/<item>.txt tree; unchanged sources are skipped")
+    run.add_argument("--source", default="gty_sermons", help="Raw transcript directory")
+    run.add_argument("--output", default="gty_sermons_normalized", help="Normalized transcript directory")
+    run.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+    run.add_argument("--sentences", action="store_true", help="Write one sentence per line")
+    run.add_argument("--force", action="store_true", help="Re-normalize everything")
+
+    show = subparsers.add_parser("file", help="Print the normalized form of one transcript")
+    show.add_argument("path")
+    show.add_argument("--sentences", action="store_true")
+    args = parser.parse_args()
+
+    if args.command == "file":
+        with open(args.path, 'r', encoding='utf-8') as f:
+            sys.stdout.write(normalize_text(f.read(), args.sentences))
+        return 0
+
+    logging.basicConfig(filename="gty_normalize.log", level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    start = time.time()
+    normalizer = TranscriptNormalizer(args.output, args.sentences)
+    try:
+        normalized, unchanged = normalizer.run(source_files_in(args.source), args.workers, args.force)
+    finally:
+        normalizer.close()
+    message = f"Đã chuẩn hoá {normalized} transcript, {unchanged} không đổi ({time.time() - start:.1f}s)"
+    logging.info(message)
+    print(message)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
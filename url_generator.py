@@ -1,21 +1,7 @@
 # url_generator.py
 
-import json
+from catalog import CATALOG_FILE, generate_urls as _generate_urls
 
 def generate_urls():
-    file_path = 'combined_gty_sermons.json'
-    base_url = "https://www.gty.org/library/sermons-library/{}"
-    urls = []
-
-    # Đọc file JSON
-    with open(file_path, 'r', encoding='utf-8') as file:
-        data = json.load(file)
-    
-    # Lặp qua từng năm và các mục trong năm đó để tạo URL
-    for year, details in data.items():
-        items = details.get("items", [])
-        for item in items:
-            url = base_url.format(item)
-            urls.append((url, year, item))
-    
-    return urls
\ No newline at end of file
+    # Giữ lại cho các script cũ; danh sách URL nay lấy từ index đã biên dịch trong catalog.py
+    return _generate_urls(CATALOG_FILE, 'text')